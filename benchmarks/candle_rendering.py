@@ -0,0 +1,115 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+# Measures drawing candle charts, comparing the CandleRenderer against building a matrix
+# cell by cell and writing every cell separately, which is how the candles command used
+# to do it. Output goes to a stream that counts the writes. Run with:
+#
+#   python -m benchmarks.candle_rendering
+
+import timeit
+from ces.models import CandleSeries, CandleTicks
+from ces.candle_renderer import *
+
+WIDTH = 160
+HEIGHT = 24
+
+class CountingStream:
+    def __init__(self):
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+
+    def flush(self):
+        pass
+
+def make_candles(count):
+    candles = CandleSeries()
+    candles.add_candles(
+        (i * 60, 100 + i % 17, 103 + i % 17, 98 + i % 13, 101 + i % 11, 1)
+        for i in range(count)
+    )
+    return candles
+
+# How the chart used to be drawn
+def render_by_cell(candles, stream):
+    lowest, highest = candles.get_lowest_price(), candles.get_highest_price()
+    normalize = lambda v: (v - lowest) / (highest - lowest)
+    matrix = []
+    for i in candles:
+        open_value = normalize(i.open_price)
+        close_value = normalize(i.close_price)
+        low_value = normalize(i.lowest_price)
+        high_value = normalize(i.highest_price)
+        top = max(open_value, close_value)
+        bottom = min(open_value, close_value)
+        column = []
+        for j in range(HEIGHT):
+            value = j / float(HEIGHT)
+            if value >= bottom and value <= top:
+                column.append(UP_CANDLE if close_value > open_value else DOWN_CANDLE)
+            elif value > low_value and value < high_value:
+                column.append(STICK_POS if close_value > open_value else STICK_NEG)
+            else:
+                column.append(' ')
+        column.reverse()
+        matrix.append(column)
+    for j in range(HEIGHT):
+        stream.write('{0} | '.format(j))
+        for column in matrix:
+            stream.write(column[j] + " ")
+        stream.write('\n')
+
+def measure(functor, number=3):
+    return min(timeit.repeat(functor, number=number, repeat=3)) / number
+
+def main():
+    renderer = CandleRenderer(WIDTH, HEIGHT)
+    print '{0:>8} | {1:>14} | {2:>8} | {3:>14} | {4:>8}'.format(
+        'candles',
+        'renderer',
+        'writes',
+        'cell by cell',
+        'writes'
+    )
+    for count in [50, 500, 5000, 50000]:
+        candles = make_candles(count)
+        renderer_stream = CountingStream()
+        cell_stream = CountingStream()
+        renderer.display(candles, CandleTicks.one_minute, stream=renderer_stream)
+        render_by_cell(candles, cell_stream)
+        print '{0:>8} | {1:>11.3f} ms | {2:>8} | {3:>11.3f} ms | {4:>8}'.format(
+            count,
+            measure(lambda: renderer.render(candles, CandleTicks.one_minute)) * 1000,
+            renderer_stream.writes,
+            measure(lambda: render_by_cell(candles, CountingStream())) * 1000,
+            cell_stream.writes
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+# Measures how long it takes to extract the coins out of coinmarketcap's "all coins" page.
+# A saved copy of the page can be used by passing its path, otherwise a page with the same
+# markup is generated. Run with:
+#
+#   python -m benchmarks.coin_table_parsing [path/to/page.html]
+
+import re
+import sys
+import timeit
+from ces.coin_table_parser import CoinTableParser
+
+CHUNK_SIZE = 64 * 1024
+
+ROW_TEMPLATE = '''<tr id="id-coin-{0}" class="">
+<td class="text-center">
+{0}
+</td>
+<td class="no-wrap currency-name" data-sort="Coin {0}">
+<img src="https://s2.coinmarketcap.com/static/img/coins/16x16/{0}.png" class="logo-sprite" alt="Coin {0}" height="16" width="16">
+<span class="currency-symbol"><a href="/currencies/coin-{0}/">C{0}</a></span>
+<br>
+<a class="currency-name-container" href="/currencies/coin-{0}/">Coin {0}</a>
+</td>
+<td class="text-left col-symbol">C{0}</td>
+<td class="no-wrap market-cap text-right" data-usd="{1}" data-btc="{1}" data-sort="{1}">
+${1:,.0f}
+</td>
+<td class="no-wrap text-right" data-sort="{2}">
+<a href="/currencies/coin-{0}/#markets" class="price" data-usd="{2}" data-btc="{2}">${2}</a>
+</td>
+<td class="no-wrap text-right circulating-supply" data-sort="{3}">
+<a href="https://coinmarketcap.com/currencies/coin-{0}/"><span data-supply="{3}">{3:,.0f}</span></a>
+</td>
+<td class="no-wrap text-right " data-sort="{1}">
+<a href="/currencies/coin-{0}/#markets" class="volume" data-usd="{1}" data-btc="{1}">${1:,.0f}</a>
+</td>
+<td class="no-wrap percent-change  text-right positive_change" data-timespan="1h" data-percentusd="0.5" data-symbol="C{0}" data-sort="0.5">0.5%</td>
+<td class="no-wrap percent-change  text-right negative_change" data-timespan="24h" data-percentusd="-1.25" data-symbol="C{0}" data-sort="-1.25">-1.25%</td>
+<td class="no-wrap percent-change  text-right positive_change" data-timespan="7d" data-percentusd="12.1" data-symbol="C{0}" data-sort="12.1">12.1%</td>
+<td class="text-right">
+<div class="dropdown pointer">
+<button class="btn btn-transparent" type="button" data-toggle="dropdown">...</button>
+</div>
+</td>
+</tr>
+'''
+
+def make_page(coin_count):
+    rows = [
+        ROW_TEMPLATE.format(i, 1000000.0 * (coin_count - i), 1.5 * i, 1000.0 * i)
+        for i in range(1, coin_count + 1)
+    ]
+    header = '<html><head><script>var a = 1 < 2;</script></head><body>' \
+             '<table class="table" id="currencies-all"><thead><tr><th>#</th></tr></thead>' \
+             '<tbody>'
+    return header + ''.join(rows) + '</tbody></table><div>footer</div></body></html>'
+
+# The parsing logic used before the streaming parser existed
+def legacy_parse(data):
+    table_start = data.find('id="currencies-all"')
+    table_end = data.find('</table>', table_start)
+    table = data[table_start:table_end]
+    attribute_keys = {
+        'class="text-center">' : 'rank',
+        'currency-name-container' : 'name',
+        'col-symbol' : 'code',
+        'market-cap' : 'market-cap',
+        'class="price"' : 'price',
+        'circulating-supply' : 'circulating-supply',
+        'class="volume"' : 'volume',
+        'data-timespan="1h"' : 'change-1h',
+        'data-timespan="24h"' : 'change-24h',
+        'data-timespan="7d"' : 'change-7d',
+    }
+    rows = []
+    for entry in table.split('<tr ')[1:]:
+        attributes = {}
+        for column in entry.split('<td '):
+            for key, value in attribute_keys.items():
+                if key in column:
+                    index = column.find(key)
+                    match = re.findall('>([^<]+)<', column[index:], re.MULTILINE)
+                    match = map(lambda i: i.strip(), match)
+                    match = filter(lambda i: len(i) > 0, match)
+                    if len(match) > 0:
+                        attributes[value] = match[0].strip()
+                    else:
+                        attributes[value] = None
+        rows.append(attributes)
+    return rows
+
+def streaming_parse(data):
+    parser = CoinTableParser()
+    rows = []
+    for i in range(0, len(data), CHUNK_SIZE):
+        rows += parser.feed(data[i:i + CHUNK_SIZE])
+        if parser.done:
+            break
+    return rows
+
+def measure(functor, data):
+    return min(timeit.repeat(lambda: functor(data), number=1, repeat=3))
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as input_file:
+            pages = [('saved', input_file.read())]
+    else:
+        pages = [(str(i), make_page(i)) for i in [500, 1500, 3000]]
+    print '{0:>10} | {1:>8} | {2:>14} | {3:>14}'.format(
+        'coins',
+        'rows',
+        'streaming (ms)',
+        'legacy (ms)'
+    )
+    for name, data in pages:
+        rows = streaming_parse(data)
+        if rows != legacy_parse(data):
+            print 'Warning: both parsers disagree on the "{0}" page'.format(name)
+        print '{0:>10} | {1:>8} | {2:>14.1f} | {3:>14.1f}'.format(
+            name,
+            len(rows),
+            measure(streaming_parse, data) * 1000,
+            measure(legacy_parse, data) * 1000
+        )
+
+if __name__ == "__main__":
+    main()
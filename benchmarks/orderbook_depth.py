@@ -0,0 +1,91 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+# Measures building an order book side and querying the price needed to fill a given
+# quantity, comparing the array backed Orderbook against a list of Order objects
+# walked linearly. Run with:
+#
+#   python -m benchmarks.orderbook_depth
+
+import timeit
+from ces.models import Order, Orderbook
+
+QUERIES_PER_RUN = 200
+
+# How fill prices were computed when the order book was a list of Order objects
+def linear_fill_price(orders, quantity):
+    remaining = quantity
+    notional = 0.0
+    for order in orders:
+        taken = min(remaining, order.quantity)
+        notional += taken * order.rate
+        remaining -= taken
+        if remaining <= 0:
+            return (notional / quantity, order.rate)
+    return None
+
+def make_levels(level_count):
+    return [(100.0 - i * 0.01, 1.0 + (i % 7)) for i in range(level_count)]
+
+def build_orderbook(levels):
+    orderbook = Orderbook()
+    orderbook.add_levels(levels)
+    return orderbook
+
+def build_order_list(levels):
+    return [Order(price, quantity) for price, quantity in levels]
+
+def measure(functor, number):
+    return min(timeit.repeat(functor, number=number, repeat=3)) / number
+
+def main():
+    print '{0:>8} | {1:>14} | {2:>14} | {3:>15} | {4:>15}'.format(
+        'levels',
+        'build arrays',
+        'build objects',
+        'fill (bisect)',
+        'fill (linear)'
+    )
+    for level_count in [100, 1000, 5000, 20000]:
+        levels = make_levels(level_count)
+        orderbook = build_orderbook(levels)
+        orders = build_order_list(levels)
+        total = orderbook.cumulative_quantities[-1]
+        # Quantities spread across the whole book
+        quantities = [total * (i + 1) / (QUERIES_PER_RUN + 1) for i in range(QUERIES_PER_RUN)]
+        bisect_time = measure(lambda: [orderbook.get_fill_price(q) for q in quantities], 1)
+        linear_time = measure(lambda: [linear_fill_price(orders, q) for q in quantities], 1)
+        print '{0:>8} | {1:>11.3f} ms | {2:>11.3f} ms | {3:>12.3f} us | {4:>12.3f} us'.format(
+            level_count,
+            measure(lambda: build_orderbook(levels), 5) * 1000,
+            measure(lambda: build_order_list(levels), 5) * 1000,
+            bisect_time / QUERIES_PER_RUN * 1000000,
+            linear_time / QUERIES_PER_RUN * 1000000
+        )
+
+if __name__ == "__main__":
+    main()
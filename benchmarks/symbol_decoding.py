@@ -0,0 +1,78 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+# Measures how long it takes to decode exchange symbols back into (base, market)
+# pairs as the number of markets grows. Run with:
+#
+#   python -m benchmarks.symbol_decoding
+
+import timeit
+from ces.exchanges.base_exchange_wrapper import BaseExchangeWrapper
+
+BASE_CURRENCIES = ['BTC', 'ETH', 'BNB', 'USDT']
+DECODES_PER_RUN = 500
+
+# The decoding logic used before the symbol index existed
+def linear_split_symbol(markets, symbol):
+    for base_code, market_codes in markets.items():
+        for market_code in market_codes:
+            if market_code + base_code == symbol:
+                return (base_code, market_code)
+    return None
+
+def make_wrapper(symbol_count):
+    wrapper = BaseExchangeWrapper()
+    symbols = []
+    for i in range(symbol_count):
+        base_code = BASE_CURRENCIES[i % len(BASE_CURRENCIES)]
+        market_code = 'C{0:05d}'.format(i)
+        symbol = market_code + base_code
+        wrapper.add_market(base_code, market_code, symbol)
+        symbols.append(symbol)
+    return (wrapper, symbols)
+
+def measure(functor, symbols):
+    # Pick symbols spread across the whole market list
+    step = max(1, len(symbols) / DECODES_PER_RUN)
+    targets = (symbols[::step] * DECODES_PER_RUN)[:DECODES_PER_RUN]
+    run = lambda: [functor(symbol) for symbol in targets]
+    return min(timeit.repeat(run, number=1, repeat=3)) / DECODES_PER_RUN
+
+def main():
+    print '{0:>10} | {1:>18} | {2:>18}'.format('symbols', 'index (us/decode)', 'linear (us/decode)')
+    for symbol_count in [100, 500, 1500, 5000]:
+        wrapper, symbols = make_wrapper(symbol_count)
+        indexed = measure(wrapper._split_symbol, symbols)
+        linear = measure(lambda symbol: linear_split_symbol(wrapper._markets, symbol), symbols)
+        print '{0:>10} | {1:>18.3f} | {2:>18.3f}'.format(
+            symbol_count,
+            indexed * 1000000,
+            linear * 1000000
+        )
+
+if __name__ == "__main__":
+    main()
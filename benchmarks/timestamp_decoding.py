@@ -0,0 +1,89 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+# Measures decoding 100k candle timestamps, both as epoch milliseconds (Binance, Kucoin)
+# and as ISO-8601 strings (Bittrex), comparing the timestamps module against dateparser.
+# dateparser is only run over a sample of them as it's too slow to go through all of
+# them. Run with:
+#
+#   python -m benchmarks.timestamp_decoding
+
+import datetime
+import time
+import dateparser
+import ces.timestamps as timestamps
+
+TIMESTAMP_COUNT = 100000
+DATEPARSER_SAMPLE = 2000
+START_TIME = 1514764800
+
+def make_epoch_milliseconds():
+    return [(START_TIME + i * 60) * 1000 for i in range(TIMESTAMP_COUNT)]
+
+def make_iso_8601():
+    start = datetime.datetime.utcfromtimestamp(START_TIME)
+    return [
+        (start + datetime.timedelta(minutes=i)).strftime('%Y-%m-%dT%H:%M:%S')
+        for i in range(TIMESTAMP_COUNT)
+    ]
+
+# Returns the time it takes to decode all of the values, extrapolated from the first
+# sample_size of them
+def measure(functor, values, sample_size=TIMESTAMP_COUNT):
+    sample = values[:sample_size]
+    start = time.time()
+    for i in sample:
+        functor(i)
+    return (time.time() - start) * len(values) / len(sample)
+
+def main():
+    print '{0:>18} | {1:>12} | {2:>12} | {3:>8}'.format(
+        'format',
+        'timestamps',
+        'dateparser',
+        'speedup'
+    )
+    rows = [
+        ('epoch ms', make_epoch_milliseconds(), timestamps.from_epoch,
+         lambda i: dateparser.parse(str(i))),
+        ('epoch ms (series)', make_epoch_milliseconds(), timestamps.to_epoch_seconds,
+         lambda i: dateparser.parse(str(i))),
+        ('ISO-8601', make_iso_8601(), timestamps.from_utc_time,
+         lambda i: dateparser.parse(i)),
+    ]
+    for name, values, fast_functor, slow_functor in rows:
+        fast_time = measure(fast_functor, values)
+        slow_time = measure(slow_functor, values, DATEPARSER_SAMPLE)
+        print '{0:>18} | {1:>10.3f} s | {2:>10.3f} s | {3:>7.1f}x'.format(
+            name,
+            fast_time,
+            slow_time,
+            slow_time / fast_time
+        )
+
+if __name__ == "__main__":
+    main()
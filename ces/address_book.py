@@ -28,10 +28,12 @@
 from models import CryptoAddress, AddressBookEntry
 from exceptions import *
 
+# Currencies are validated against every exchange in the session so entries don't depend
+# on which one is active
 class AddressBook:
-    def __init__(self, storage, exchange_handle):
+    def __init__(self, storage, exchange_session):
         self._storage = storage
-        self._exchange_handle = exchange_handle
+        self._exchange_session = exchange_session
         self._entries = {}
         self.load()
 
@@ -40,7 +42,7 @@ class AddressBook:
         for name, values in self._storage.load_address_book().items():
             try:
                 self._entries[name] = CryptoAddress(
-                    self._exchange_handle.get_currency(values['currency']),
+                    self._exchange_session.get_currency(values['currency']),
                     values['address']
                 )
             except UnknownCurrencyException as ex:
@@ -49,7 +51,7 @@ class AddressBook:
     def add_entry(self, name, currency_code, address):
         self._storage.add_address_book(name, currency_code, address)
         self._entries[name] = CryptoAddress(
-            self._exchange_handle.get_currency(currency_code),
+            self._exchange_session.get_currency(currency_code),
             address
         )
 
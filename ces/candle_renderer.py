@@ -0,0 +1,163 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+import math
+import sys
+import utils
+from models import CandleTicks, CANDLE_TICK_SECONDS
+
+COLOR_HEAD = lambda x: '\033[' + str(x) + 'm'
+COLOR_TAIL = '\033[0m'
+
+RED = 31
+GREEN = 32
+
+CANDLE_BODY = u'\u2588'
+CANDLE_TAIL = u'\u2502'
+
+UP_CANDLE = COLOR_HEAD(GREEN) + CANDLE_BODY + COLOR_TAIL
+DOWN_CANDLE=COLOR_HEAD(RED) + CANDLE_BODY + COLOR_TAIL
+
+STICK_POS = COLOR_HEAD(GREEN) + CANDLE_TAIL + COLOR_TAIL
+STICK_NEG = COLOR_HEAD(RED) + CANDLE_TAIL + COLOR_TAIL
+STICK_STABLE = CANDLE_TAIL
+
+# Draws candles as a chart that fits in the terminal. If there's more candles than
+# columns available, consecutive ones are merged together
+class CandleRenderer:
+    MAX_HEIGHT = 24
+    MIN_HEIGHT = 8
+    MIN_WIDTH = 40
+    # Lines used by the title, the x axis, its labels and the prompt
+    RESERVED_LINES = 4
+    # Every candle uses a column plus a space
+    CANDLE_WIDTH = 2
+    # There's a label every this many candles
+    LABEL_STEP = 4
+
+    # If width or height are None, the terminal's size is used
+    def __init__(self, width=None, height=None):
+        self.width = width
+        self.height = height
+
+    def _get_size(self):
+        columns, lines = utils.get_terminal_size()
+        width = self.width or max(columns, CandleRenderer.MIN_WIDTH)
+        height = self.height or max(
+            CandleRenderer.MIN_HEIGHT,
+            min(CandleRenderer.MAX_HEIGHT, lines - CandleRenderer.RESERVED_LINES)
+        )
+        return (width, height)
+
+    # Formats a number of seconds as e.g. "90m" or "2h" using the largest exact unit
+    @classmethod
+    def _format_span(cls, seconds):
+        for unit, unit_seconds in [('d', 60 * 60 * 24), ('h', 60 * 60), ('m', 60)]:
+            if seconds % unit_seconds == 0:
+                return '{0}{1}'.format(seconds / unit_seconds, unit)
+        return '{0}s'.format(seconds)
+
+    # Returns the rows (top to bottom) of a single candle's column
+    @classmethod
+    def _build_column(cls, open_value, close_value, low_value, high_value, height):
+        column = [' '] * height
+        rising = close_value > open_value
+        # Rows strictly between the lowest and highest values
+        first = max(0, int(math.floor(low_value * height)) + 1)
+        last = min(height - 1, int(math.ceil(high_value * height)) - 1)
+        written = max(0, last - first + 1)
+        column[first:last + 1] = [STICK_POS if rising else STICK_NEG] * written
+        # Rows between the open and close values, both included
+        first = max(0, int(math.ceil(min(open_value, close_value) * height)))
+        last = min(height - 1, int(math.floor(max(open_value, close_value) * height)))
+        if last >= first:
+            column[first:last + 1] = [UP_CANDLE if rising else DOWN_CANDLE] * (last - first + 1)
+            written += last - first + 1
+        if written == 0:
+            column[int(high_value * (height - 1))] = STICK_STABLE
+        column.reverse()
+        return column
+
+    # Returns the whole chart as a single string. The title line shows how long each
+    # drawn candle spans, which is longer than the interval if candles were merged
+    def render(self, candles, interval, title=None):
+        width, height = self._get_size()
+        lowest, highest = candles.get_lowest_price(), candles.get_highest_price()
+        y_values = map(
+            lambda i: lowest + (i / float(height)) * (highest - lowest),
+            range(height)
+        )
+        y_values.reverse()
+        y_fmt_string = utils.make_appropriate_float_format_string(max(y_values))
+        top_y_length = len(y_fmt_string.format(y_values[0]))
+
+        max_candles = max(1, (width - top_y_length - 3) / CandleRenderer.CANDLE_WIDTH)
+        group_size = int(math.ceil(len(candles) / float(max_candles)))
+        if group_size > 1:
+            candles = candles.group(group_size)
+        normalized = candles.normalize(lowest, highest)
+        columns = [
+            self._build_column(open_value, close_value, low_value, high_value, height)
+            for open_value, close_value, low_value, high_value in zip(
+                normalized.open_prices,
+                normalized.close_prices,
+                normalized.lowest_prices,
+                normalized.highest_prices
+            )
+        ]
+
+        span = group_size * CANDLE_TICK_SECONDS[interval]
+        header = u'{0} candles'.format(self._format_span(span))
+        if group_size > 1:
+            header += u' ({0} {1} candles merged into each)'.format(group_size, interval.name)
+        if title:
+            header = u'{0}, {1}'.format(title, header)
+        lines = [header]
+        for y_value, row in zip(y_values, zip(*columns)):
+            y_label = y_fmt_string.format(y_value)
+            # Append enough spaces to padd the length difference with the top label
+            lines.append(u'{0}{1} | {2} '.format(
+                y_label,
+                (top_y_length - len(y_label)) * ' ',
+                ' '.join(row)
+            ))
+        lines.append(u'\u2015' * (len(candles) * CandleRenderer.CANDLE_WIDTH + top_y_length + 2))
+        # Merged candles may span several days so label them using what they span
+        interval = max(
+            filter(lambda i: CANDLE_TICK_SECONDS[i] <= span, CandleTicks),
+            key=lambda i: CANDLE_TICK_SECONDS[i]
+        )
+        x_labels = []
+        for i in range(len(candles) - 1, 0, -CandleRenderer.LABEL_STEP):
+            x_labels.append(utils.make_candle_label(candles.get_datetime(i), interval))
+        x_labels.reverse()
+        lines.append(' ' * top_y_length + '   ' + '   '.join(x_labels))
+        return u'\n'.join(lines) + u'\n'
+
+    def display(self, candles, interval, title=None, stream=sys.stdout):
+        stream.write(self.render(candles, interval, title))
+        stream.flush()
@@ -25,14 +25,22 @@
 # of the authors and should not be interpreted as representing official policies,
 # either expressed or implied, of the FreeBSD Project.
 
-import requests
-import threading
+import copy
 import json
-import re
+import threading
+import time
 from exceptions import *
 from utils import CoinPrice
+from transport import get_transport
+from coin_table_parser import CoinTableParser
 
 class CoinMetadata:
+    # The order in which attributes are stored in snapshots
+    ATTRIBUTES = [
+        'code', 'name', 'price', 'rank', 'volume_24h', 'market_cap', 'available_supply',
+        'total_supply', 'max_supply', 'change_1h', 'change_24h', 'change_7d'
+    ]
+
     def __init__(self, code, name, price, rank, volume_24h, market_cap, available_supply,
                  total_supply, max_supply, change_1h, change_24h, change_7d):
         self.code = code
@@ -48,25 +56,49 @@ class CoinMetadata:
         self.change_24h = change_24h
         self.change_7d = change_7d
 
+    def to_list(self):
+        return [getattr(self, i) for i in CoinMetadata.ATTRIBUTES]
+
+# The coins known at some point in time. Snapshots are never modified once they're
+# published, a new one replaces them instead
+class MetadataSnapshot:
+    def __init__(self, coins, timestamp):
+        # Code -> CoinMetadata
+        self.coins = coins
+        # When the data was fetched
+        self.timestamp = timestamp
+
 class CoinDatabase:
     API_URL = 'https://api.coinmarketcap.com/v1/ticker/?convert={0}'
     WEB_URL = 'https://coinmarketcap.com/all/views/all/'
+    WEB_CHUNK_SIZE = 64 * 1024
+    POLL_INTERVAL = 60 * 5
+    # Bump this whenever the format of the snapshot changes
+    SNAPSHOT_VERSION = 1
     VALID_FIAT_CURRENCIES = set([
         'aud', 'brl', 'cad', 'chf', 'clp', 'cny', 'czk', 'dkk', 'eur', 'gbp', 'hkd', 'huf', 'idr',
         'ils', 'inr', 'jpy', 'krw', 'mxn', 'myr', 'nok', 'nzd', 'php', 'pkr', 'pln', 'rub', 'sek',
         'sgd', 'thb', 'try', 'twd', 'zar', 'usd'
     ])
 
-    def __init__(self, fiat_currency):
+    # api_data can be a SharedDownload of the API ticker which will be used in the
+    # first poll rather than downloading it again. If a storage is provided, the last data
+    # fetched is kept there and used right away the next time the database is created
+    def __init__(self, fiat_currency, api_data=None, storage=None):
         self.fiat_currency = fiat_currency.lower()
         if self.fiat_currency not in CoinDatabase.VALID_FIAT_CURRENCIES:
             raise ConfigException('Unknown fiat currency "{0}"'.format(fiat_currency))
         self._running = True
-        self._metadata = {}
+        # Readers just grab whichever snapshot is current, this is only used to wait for
+        # the first one
+        self._snapshot = MetadataSnapshot({}, None)
         self._metadata_condition = threading.Condition()
         self._stop_condition = threading.Condition()
         self._api_url = CoinDatabase.API_URL.format(self.fiat_currency.upper())
         self._web_url = CoinDatabase.WEB_URL
+        self._initial_api_data = api_data
+        self._storage = storage
+        self._load_snapshot()
         self._update_thread = threading.Thread(target=self.poll_data)
         self._update_thread.start()
 
@@ -76,40 +108,82 @@ class CoinDatabase:
             self._stop_condition.notify()
         self._update_thread.join()
 
-    def wait_for_data(self):
+    def wait_for_data(self, timeout=None):
         with self._metadata_condition:
-            if len(self._metadata) == 0:
-                self._metadata_condition.wait()
+            if len(self._snapshot.coins) == 0:
+                self._metadata_condition.wait(timeout)
+
+    # Returns how many seconds old the data is or None if there's none
+    def get_data_age(self):
+        timestamp = self._snapshot.timestamp
+        if timestamp is None:
+            return None
+        return max(0, time.time() - timestamp)
+
+    def _publish_snapshot(self, snapshot):
+        with self._metadata_condition:
+            self._snapshot = snapshot
+            self._metadata_condition.notify_all()
+
+    def _load_snapshot(self):
+        if self._storage is None:
+            return
+        try:
+            row = self._storage.load_coin_metadata(self.fiat_currency)
+            if row is None:
+                return
+            version, timestamp, data = row
+            if version != CoinDatabase.SNAPSHOT_VERSION:
+                return
+            coins = {}
+            for values in json.loads(data):
+                coin = CoinMetadata(*values)
+                coins[coin.code] = coin
+            self._snapshot = MetadataSnapshot(coins, timestamp)
+        except Exception as ex:
+            # The data will be fetched again anyway
+            pass
+
+    def _save_snapshot(self, snapshot):
+        if self._storage is None:
+            return
+        try:
+            self._storage.save_coin_metadata(
+                self.fiat_currency,
+                CoinDatabase.SNAPSHOT_VERSION,
+                snapshot.timestamp,
+                json.dumps([coin.to_list() for coin in snapshot.coins.values()])
+            )
+        except Exception as ex:
+            # The data in memory is still fine, only the next startup will be slower
+            print 'Failed to store coin metadata snapshot: {0}'.format(ex)
 
     def get_currency_price(self, code):
-        if self.has_coin(code):
-            price = self.get_currency_metadata(code).price
-            return CoinPrice(code, price, self.fiat_currency)
+        coin = self._snapshot.coins.get(code)
+        if coin is not None:
+            return CoinPrice(code, coin.price, self.fiat_currency)
         else:
             return CoinPrice(code)
 
     def get_currency_metadata(self, code):
-        with self._metadata_condition:
-            if code in self._metadata:
-                return self._metadata[code]
-            else:
-                raise UnknownCurrencyException(code)
+        coins = self._snapshot.coins
+        if code in coins:
+            return coins[code]
+        else:
+            raise UnknownCurrencyException(code)
 
     def has_coin(self, code):
-        with self._metadata_condition:
-            return code in self._metadata
+        return code in self._snapshot.coins
 
     def get_top_coins(self, top_limit):
         coins = []
-        with self._metadata_condition:
-            for coin in self._metadata.values():
-                if coin.rank is not None and coin.rank <= top_limit:
-                    coins.append(coin)
+        for coin in self._snapshot.coins.values():
+            if coin.rank is not None and coin.rank <= top_limit:
+                coins.append(coin)
         return sorted(coins, key=lambda i: i.rank)
 
     def get_coins(self):
-        with self._metadata_condition:
-            return self._metadata.values()
+        return list(self._snapshot.coins.values())
 
     def _extract_float(self, value):
         return None if value is None else float(value)
@@ -118,9 +192,10 @@ class CoinDatabase:
         if getattr(rhs, attribute) is not None:
             setattr(lhs, attribute, getattr(rhs, attribute))    
 
-    def _add_coin(self, code, coin):
-        if code in self._metadata:
-            stored_coin = self._metadata[code]
+    # Coins in the current snapshot can't be modified so merging uses a copy of them
+    def _add_coin(self, coins, code, coin):
+        if code in coins:
+            stored_coin = copy.copy(coins[code])
             self._merge_attribute(stored_coin, coin, "name")
             self._merge_attribute(stored_coin, coin, "price")
             self._merge_attribute(stored_coin, coin, "rank")
@@ -132,130 +207,128 @@ class CoinDatabase:
             self._merge_attribute(stored_coin, coin, "change_1h")
             self._merge_attribute(stored_coin, coin, "change_24h")
             self._merge_attribute(stored_coin, coin, "change_7d")
+            coins[code] = stored_coin
         else:
-            self._metadata[code] = coin
+            coins[code] = coin
 
-    def _load_from_api(self):
-        result = None
-        try:
-            raw_result = requests.get(self._api_url)
-            result = json.loads(raw_result.text)
-        except Exception as ex:
-            # TODO: somehow log this
-            pass
+    def _fetch_api_data(self):
+        if self._initial_api_data is not None:
+            api_data = self._initial_api_data
+            self._initial_api_data = None
+            return api_data.get()
+        return get_transport().get_json(self._api_url)
+
+    def _load_from_api(self, result):
+        coins = []
         if result is not None:
-            with self._metadata_condition:
-                for entry in result:
-                    try:
-                        coin = CoinMetadata(
+            for entry in result:
+                try:
+                    coin = CoinMetadata(
+                        entry['symbol'],
+                        entry['name'],
+                        self._extract_float(entry['price_' + self.fiat_currency]),
+                        int(entry['rank']),
+                        self._extract_float(entry['24h_volume_' + self.fiat_currency]),
+                        self._extract_float(entry['market_cap_' + self.fiat_currency]),
+                        self._extract_float(entry['available_supply']),
+                        self._extract_float(entry['total_supply']),
+                        self._extract_float(entry['max_supply']),
+                        self._extract_float(entry['percent_change_1h']),
+                        self._extract_float(entry['percent_change_24h']),
+                        self._extract_float(entry['percent_change_7d'])
+                    )
+                    coins.append(coin)
+                except Exception as ex:
+                    if 'symbol' in entry:
+                        print 'Failed to parse metadata for "{0}": {1}'.format(
                             entry['symbol'],
-                            entry['name'],
-                            self._extract_float(entry['price_' + self.fiat_currency]),
-                            int(entry['rank']),
-                            self._extract_float(entry['24h_volume_' + self.fiat_currency]),
-                            self._extract_float(entry['market_cap_' + self.fiat_currency]),
-                            self._extract_float(entry['available_supply']),
-                            self._extract_float(entry['total_supply']),
-                            self._extract_float(entry['max_supply']),
-                            self._extract_float(entry['percent_change_1h']),
-                            self._extract_float(entry['percent_change_24h']),
-                            self._extract_float(entry['percent_change_7d'])
+                            ex
                         )
-                        self._add_coin(entry['symbol'], coin)
-                    except Exception as ex:
-                        if 'symbol' in entry:
-                            print 'Failed to parse metadata for "{0}": {1}'.format(
-                                entry['symbol'],
-                                ex
-                            )
-                        else:
-                            print 'Failed to parse currency metadata: {0}'.format(ex)
-                self._metadata_condition.notify_all()
+                    else:
+                        print 'Failed to parse currency metadata: {0}'.format(ex)
+        return coins
 
-    def _load_from_web(self):
+    def _load_from_web(self, api_data):
         if self.fiat_currency == 'usd':
             conversion_rate = 1.0
         else:
-            data = requests.get(self._api_url).text
-            data = json.loads(data)
             # Find the conversion rate between USD and whatever fiat currency we're using
-            for coin in data:
+            for coin in api_data:
                 if coin['symbol'] == 'BTC':
                     conversion_rate = float(coin['price_' + self.fiat_currency]) / float(coin['price_usd'])
-        data = requests.get(self._web_url).text
-        table_start = data.find('id="currencies-all"')
-        table_end = data.find('</table>', table_start)
-        table = data[table_start:table_end]
-        attribute_keys = {
-            'class="text-center">' : 'rank',
-            'currency-name-container' : 'name',
-            'col-symbol' : 'code',
-            'market-cap' : 'market-cap',
-            'class="price"' : 'price',
-            'circulating-supply' : 'circulating-supply',
-            'class="volume"' : 'volume',
-            'data-timespan="1h"' : 'change-1h',
-            'data-timespan="24h"' : 'change-24h',
-            'data-timespan="7d"' : 'change-7d',
-        }
+        coins = []
+        response = get_transport().get(self._web_url, stream=True)
+        try:
+            parser = CoinTableParser()
+            for chunk in response.iter_content(CoinDatabase.WEB_CHUNK_SIZE, decode_unicode=True):
+                for attributes in parser.feed(chunk):
+                    coin = self._make_web_coin(attributes, conversion_rate)
+                    if coin is not None:
+                        coins.append(coin)
+                # There's no need to download the rest of the page
+                if parser.done:
+                    break
+        finally:
+            response.close()
+        return coins
+
+    def _make_web_coin(self, attributes, conversion_rate):
         price_attributes = ['price', 'market-cap', 'volume']
         number_attributes = price_attributes + ['circulating-supply']
         percentage_attributes = ['change-1h', 'change-24h', 'change-7d']
-        with self._metadata_condition:
-            for entry in table.split('<tr ')[1:]:
-                attributes = {}
-                for column in entry.split('<td '):
-                    for key, value in attribute_keys.items():
-                        if key in column:
-                            index = column.find(key)
-                            match = re.findall('>([^<]+)<', column[index:], re.MULTILINE)
-                            match = map(lambda i: i.strip(), match)
-                            match = filter(lambda i: len(i) > 0, match)
-                            if len(match) > 0:
-                                attributes[value] = match[0].strip()
-                            else:
-                                attributes[value] = None
-                for key in number_attributes:
-                    if attributes.get(key, None):
-                        try:
-                            attributes[key] = float(attributes[key].replace('$', '').replace(',', ''))
-                        except:
-                            attributes[key] = None
-                for key in price_attributes:
-                    if attributes.get(key, None):
-                        attributes[key] *= conversion_rate
-                for key in percentage_attributes:
-                    if attributes.get(key, None):
-                        attributes[key] = float(attributes[key].replace('%', ''))
+        for key in number_attributes:
+            if attributes.get(key, None):
                 try:
-                    coin = CoinMetadata(
-                        attributes['code'],
-                        attributes['name'],
-                        attributes['price'],
-                        int(attributes['rank']),
-                        attributes['volume'],
-                        attributes['market-cap'],
-                        attributes['circulating-supply'],
-                        None,
-                        None,
-                        attributes.get('change-1h', None),
-                        attributes.get('change-24h', None),
-                        attributes.get('change-7d', None)
-                    )
-                    self._add_coin(attributes['code'], coin)
-                except Exception as ex:
-                    pass
+                    attributes[key] = float(attributes[key].replace('$', '').replace(',', ''))
+                except:
+                    attributes[key] = None
+        for key in price_attributes:
+            if attributes.get(key, None):
+                attributes[key] *= conversion_rate
+        for key in percentage_attributes:
+            if attributes.get(key, None):
+                attributes[key] = float(attributes[key].replace('%', ''))
+        try:
+            return CoinMetadata(
+                attributes['code'],
+                attributes['name'],
+                attributes['price'],
+                int(attributes['rank']),
+                attributes['volume'],
+                attributes['market-cap'],
+                attributes['circulating-supply'],
+                None,
+                None,
+                attributes.get('change-1h', None),
+                attributes.get('change-24h', None),
+                attributes.get('change-7d', None)
+            )
+        except Exception as ex:
+            return None
 
     def poll_data(self):
         while self._running:
+            try:
+                api_data = self._fetch_api_data()
+            except Exception as ex:
+                # TODO: somehow log this
+                api_data = None
             # Load all coins by parsing coinmarketcap.com/all/views/all/
             try:
-                self._load_from_web()
+                web_coins = self._load_from_web(api_data)
             except:
-                pass
-            # Now get some better data for the coins that are served through the API
-            self._load_from_api()
+                web_coins = None
+            if web_coins is not None or api_data is not None:
+                # The new snapshot is built while readers keep using the current one
+                coins = dict(self._snapshot.coins)
+                for coin in web_coins or []:
+                    self._add_coin(coins, coin.code, coin)
+                # Now get some better data for the coins that are served through the API
+                for coin in self._load_from_api(api_data):
+                    self._add_coin(coins, coin.code, coin)
+                snapshot = MetadataSnapshot(coins, time.time())
+                self._publish_snapshot(snapshot)
+                self._save_snapshot(snapshot)
             with self._stop_condition:
-                # Sleep for 5 minutes
-                self._stop_condition.wait(60 * 5)
+                self._stop_condition.wait(CoinDatabase.POLL_INTERVAL)
 
@@ -0,0 +1,146 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+import re
+
+# Parses the table of coins in coinmarketcap.com/all/views/all/ as the page is downloaded.
+# Chunks of the page are fed in as they arrive and every row is parsed as soon as it's
+# complete, so only the row being downloaded is kept in memory rather than the whole page
+class CoinTableParser:
+    TABLE_MARKER = 'id="currencies-all"'
+    # Every tag that may identify a cell's contents has a class
+    CLASS_REGEX = re.compile(r' class="([^"]*)"')
+    TIMESPAN_REGEX = re.compile(r'data-timespan="([^"]*)"')
+    TEXT_REGEX = re.compile(r'>([^<]*[^<\s][^<]*)<')
+    # Cells whose class attribute is exactly this
+    CLASS_ATTRIBUTES = {
+        'text-center' : 'rank',
+        'price' : 'price',
+        'volume' : 'volume',
+    }
+    # Cells that have this among their classes
+    CLASS_NAME_ATTRIBUTES = {
+        'currency-name-container' : 'name',
+        'col-symbol' : 'code',
+        'market-cap' : 'market-cap',
+        'circulating-supply' : 'circulating-supply',
+    }
+    # Cells with this class are identified by their data-timespan attribute
+    PERCENT_CHANGE_CLASS = 'percent-change'
+    TIMESPAN_ATTRIBUTES = {
+        '1h' : 'change-1h',
+        '24h' : 'change-24h',
+        '7d' : 'change-7d',
+    }
+
+    def __init__(self):
+        self._buffer = ''
+        self._in_table = False
+        # The same class attributes show up in every row
+        self._class_attributes = {}
+        self.done = False
+
+    # Returns the rows completed within this chunk. Each of them is a dict from attribute
+    # name (e.g. "price") to its text, or None if the cell was empty
+    def feed(self, chunk):
+        if self.done:
+            return []
+        self._buffer += chunk
+        if not self._in_table:
+            self._find_table()
+            if not self._in_table:
+                return []
+        rows = []
+        position = 0
+        table_end = self._buffer.find('</table>')
+        while True:
+            row_end = self._buffer.find('</tr>', position)
+            if table_end != -1 and (row_end == -1 or table_end < row_end):
+                self.done = True
+                self._buffer = ''
+                return rows
+            if row_end == -1:
+                break
+            row = self._parse_row(self._buffer, position, row_end)
+            if len(row) > 0:
+                rows.append(row)
+            position = row_end + len('</tr>')
+        self._buffer = self._buffer[position:]
+        return rows
+
+    def _find_table(self):
+        index = self._buffer.find(CoinTableParser.TABLE_MARKER)
+        if index == -1:
+            # Keep enough of it in case the marker is split between chunks
+            self._buffer = self._buffer[-len(CoinTableParser.TABLE_MARKER):]
+            return
+        tag_end = self._buffer.find('>', index)
+        if tag_end == -1:
+            self._buffer = self._buffer[index:]
+            return
+        self._in_table = True
+        self._buffer = self._buffer[tag_end + 1:]
+
+    # Returns the attribute for the given class, PERCENT_CHANGE_CLASS or None
+    def _find_class_attribute(self, classes):
+        if classes in CoinTableParser.CLASS_ATTRIBUTES:
+            return CoinTableParser.CLASS_ATTRIBUTES[classes]
+        for class_name in classes.split():
+            if class_name in CoinTableParser.CLASS_NAME_ATTRIBUTES:
+                return CoinTableParser.CLASS_NAME_ATTRIBUTES[class_name]
+            if class_name == CoinTableParser.PERCENT_CHANGE_CLASS:
+                return class_name
+        return None
+
+    # The value of an attribute is the first piece of text after its tag within its cell
+    def _parse_row(self, data, start, end):
+        row = {}
+        for match in CoinTableParser.CLASS_REGEX.finditer(data, start, end):
+            classes = match.group(1)
+            if classes in self._class_attributes:
+                attribute = self._class_attributes[classes]
+            else:
+                attribute = self._find_class_attribute(classes)
+                self._class_attributes[classes] = attribute
+            if attribute is None:
+                continue
+            tag_end = data.find('>', match.end(), end)
+            if tag_end == -1:
+                continue
+            if attribute == CoinTableParser.PERCENT_CHANGE_CLASS:
+                tag_start = data.rfind('<', start, match.start())
+                timespan = CoinTableParser.TIMESPAN_REGEX.search(data, tag_start, tag_end)
+                if timespan is None:
+                    continue
+                attribute = CoinTableParser.TIMESPAN_ATTRIBUTES.get(timespan.group(1))
+                if attribute is None:
+                    continue
+            cell_end = data.find('</td>', tag_end, end)
+            if cell_end == -1:
+                cell_end = end
+            text = CoinTableParser.TEXT_REGEX.search(data, tag_end, cell_end + 1)
+            row[attribute] = None if text is None else text.group(1).strip()
+        return row
@@ -32,27 +32,13 @@ import sys
 import re
 from terminaltables import AsciiTable
 from exceptions import *
-from models import CandleTicks, Candle
+from models import CandleTicks, Candle, TransferType
 from simpleeval import simple_eval
 from exchanges.base_exchange_wrapper import OrderInvalidity
+from exchanges.compound_candles import get_compound_candles
+from candle_renderer import CandleRenderer
 from parameter_parser import *
 
-COLOR_HEAD = lambda x: '\033[' + str(x) + 'm'
-COLOR_TAIL = '\033[0m'
-
-RED = 31
-GREEN = 32
-
-CANDLE_BODY = u'\u2588'
-CANDLE_TAIL = u'\u2502'
-
-UP_CANDLE = COLOR_HEAD(GREEN) + CANDLE_BODY + COLOR_TAIL
-DOWN_CANDLE=COLOR_HEAD(RED) + CANDLE_BODY + COLOR_TAIL
-
-STICK_POS = COLOR_HEAD(GREEN) + CANDLE_TAIL + COLOR_TAIL
-STICK_NEG = COLOR_HEAD(RED) + CANDLE_TAIL + COLOR_TAIL
-STICK_STABLE = CANDLE_TAIL
-
 try:
     import readline
 except ImportError: #Window systems don't have GNU readline
@@ -97,6 +83,41 @@ class BaseCommand:
     def format_date(self, datetime):
         return datetime.strftime("%Y-%m-%d %H:%M:%S")
 
+    # Titles of tables that show fiat prices include how old those are
+    def make_fiat_title(self, core, title):
+        age = core.coin_db.get_data_age()
+        if age is None:
+            return title
+        return '{0} ({1} prices from {2} ago)'.format(
+            title,
+            core.coin_db.fiat_currency.upper(),
+            utils.format_age(age)
+        )
+
+    def log_aggregate_errors(self, core, result):
+        for exchange_name, ex in result.errors.items():
+            core.output_manager.log_error(
+                'API execution error',
+                '{0}: {1}',
+                exchange_name,
+                str(ex)
+            )
+
+    # Transfers that failed to sync are still listed as far as they were stored before
+    def log_transfer_sync_errors(self, core, transfer_type, exchange_names):
+        for exchange_name in exchange_names:
+            handle = core.exchange_session.get_handle(exchange_name)
+            errors = handle.get_transfer_sync_errors(transfer_type)
+            for currency_code, ex in sorted(errors.items()):
+                core.output_manager.log_error(
+                    'API execution error',
+                    '{0}: failed to sync {1} {2}s: {3}',
+                    exchange_name,
+                    currency_code or 'all',
+                    transfer_type.name,
+                    str(ex)
+                )
+
     def split_args(self, raw_params):
         return filter(lambda i: len(i) > 0, raw_params.strip().split(' '))
 
@@ -198,17 +219,40 @@ is operating. ''',
     def __init__(self):
         BaseCommand.__init__(self, 'market')
 
+    def _execute_aggregate(self, core, base_currency_code, market_currency_code, price):
+        result = core.exchange_session.aggregate.get_market_state(
+            base_currency_code,
+            market_currency_code
+        )
+        data = [['Exchange', 'Ask', 'Bid', 'Last']]
+        for exchange_name, state in result.rows:
+            data.append([
+                exchange_name,
+                price.format_value(state.ask),
+                price.format_value(state.bid),
+                price.format_value(state.last)
+            ])
+        self.log_aggregate_errors(core, result)
+        if len(data) > 1:
+            title = '{0}/{1} market'.format(base_currency_code, market_currency_code)
+            table = AsciiTable(data, self.make_fiat_title(core, title))
+            print table.table
+
     def execute(self, core, params):
         base_currency_code = params['base-currency']
         market_currency_code = params['market-currency']
         price = core.coin_db.get_currency_price(base_currency_code)
+        if core.exchange_session.is_multi_exchange():
+            self._execute_aggregate(core, base_currency_code, market_currency_code, price)
+            return
         result = core.exchange_handle.get_market_state(base_currency_code, market_currency_code)
         data = [
             ['Ask', price.format_value(result.ask)],
             ['Bid', price.format_value(result.bid)],
             ['Last', price.format_value(result.last)]
         ]
-        table = AsciiTable(data, '{0}/{1} market'.format(base_currency_code, market_currency_code))
+        title = '{0}/{1} market'.format(base_currency_code, market_currency_code)
+        table = AsciiTable(data, self.make_fiat_title(core, title))
         table.inner_heading_row_border = False
         print table.table
 
@@ -258,7 +302,7 @@ class OrderbookCommand(BaseCommand):
             sell_rows.append(self._make_columns(sell_orderbook.orders[i], base_code, market_code,
                                                 price, core.coin_db.fiat_currency))
 
-        buy_table_rows = utils.make_table_rows('Bids', buy_rows)
+        buy_table_rows = utils.make_table_rows(self.make_fiat_title(core, 'Bids'), buy_rows)
         sell_table_rows = utils.make_table_rows('Asks', sell_rows)
         for i in range(len(buy_table_rows)):
             print u'{0} {1}'.format(buy_table_rows[i], sell_table_rows[i])
@@ -275,24 +319,32 @@ class WalletsCommand(BaseCommand):
         BaseCommand.__init__(self, 'wallets')
 
     def execute(self, core, raw_params):
-        wallets = core.exchange_handle.get_wallets()
-        data = [['Currency', 'Total balance', 'Available balance', 'Pending/locked balance']]
-        for wallet in sorted(wallets, reverse=True, key=lambda i: i.balance):
+        if core.exchange_session.is_multi_exchange():
+            result = core.exchange_session.aggregate.get_wallets()
+            self.log_aggregate_errors(core, result)
+            rows = result.rows
+            data = [['Exchange']]
+        else:
+            rows = map(lambda i: (None, i), core.exchange_handle.get_wallets())
+            data = [[]]
+        data[0] += ['Currency', 'Total balance', 'Available balance', 'Pending/locked balance']
+        for exchange_name, wallet in sorted(rows, reverse=True, key=lambda i: i[1].balance):
             # Stop once we reach 0 balances
             if wallet.balance == 0:
                 break
             price = core.coin_db.get_currency_price(wallet.currency.code)
-            data.append([
+            data.append([] if exchange_name is None else [exchange_name])
+            data[-1] += [
                 '{0} ({1})'.format(wallet.currency.name, wallet.currency.code),
                 price.format_value(wallet.balance),
                 price.format_value(wallet.available),
                 price.format_value(wallet.pending)
-            ])
+            ]
         # If we only have the labels
         if len(data) == 1:
             print 'No wallets currently have funds'
             return
-        table = AsciiTable(data, 'wallets')
+        table = AsciiTable(data, self.make_fiat_title(core, 'wallets'))
         print table.table
 
 class WalletCommand(BaseCommand):
@@ -321,7 +373,7 @@ class WalletCommand(BaseCommand):
             ['Available balance', price.format_value(wallet.available)],
             ['Pending/locked balance', price.format_value(wallet.pending)]
         ]
-        table = AsciiTable(data, '{0} wallet'.format(currency.name))
+        table = AsciiTable(data, self.make_fiat_title(core, '{0} wallet'.format(currency.name)))
         table.inner_heading_row_border = False
         print table.table
 
@@ -339,32 +391,68 @@ class DepositsCommand(BaseCommand):
     def __init__(self):
         BaseCommand.__init__(self, 'deposits')
 
+    OPTIONAL_CURRENCY_PARAMETER_PARSER = ParameterParser([
+        PositionalParameter('currency', parameter_type=str, required=False)
+    ])
+
     def parameter_parser(self, core):
-        if core.exchange_handle.transfers_needs_asset():
+        if core.exchange_session.is_multi_exchange():
+            return DepositsCommand.OPTIONAL_CURRENCY_PARAMETER_PARSER
+        elif core.exchange_handle.transfers_needs_asset():
             return DepositsCommand.CURRENCY_PARAMETER_PARSER
         else:
             return DepositsCommand.PARAMETER_PARSER
 
+    def _format_status(self, handle, deposit):
+        if handle.exposes_confirmations:
+            return '{0}/{1}'.format(deposit.confirmations, deposit.currency.min_confirmations)
+        else:
+            return 'Completed' if deposit.confirmations > 0 else 'Pending'
+
+    def _execute_aggregate(self, core, currency_code):
+        result = core.exchange_session.aggregate.get_deposit_history(currency_code)
+        self.log_aggregate_errors(core, result)
+        data = [['Exchange', 'Timestamp', 'Amount', 'Transaction id', 'Status']]
+        for exchange_name, deposit in sorted(result.rows, key=lambda i: i[1].timestamp):
+            data.append([
+                exchange_name,
+                self.format_date(deposit.timestamp),
+                '{0} {1}'.format(deposit.amount, deposit.currency.code),
+                deposit.transaction_id,
+                self._format_status(core.exchange_session.get_handle(exchange_name), deposit)
+            ])
+        table = AsciiTable(data, 'Deposits')
+        print table.table
+        self.log_transfer_sync_errors(
+            core,
+            TransferType.deposit,
+            filter(lambda i: i not in result.errors, core.exchange_session.get_exchange_names())
+        )
+
     def execute(self, core, params):
         currency_code = params.get('currency', None)
+        if core.exchange_session.is_multi_exchange():
+            self._execute_aggregate(core, currency_code)
+            return
         has_confirmations = core.exchange_handle.exposes_confirmations
         data = [
             ['Timestamp', 'Amount', 'Transaction id',
              'Confirmations' if has_confirmations else 'Status']
         ]
         for deposit in core.exchange_handle.get_deposit_history(currency_code):
-            if has_confirmations:
-                status = '{0}/{1}'.format(deposit.confirmations, deposit.currency.min_confirmations)
-            else:
-                status = 'Completed' if deposit.confirmations > 0 else 'Pending'
             data.append([
                 self.format_date(deposit.timestamp),
                 '{0} {1}'.format(deposit.amount, deposit.currency.code),
                 deposit.transaction_id,
-                status
+                self._format_status(core.exchange_handle, deposit)
             ])
         table = AsciiTable(data, 'Deposits')
         print table.table
+        self.log_transfer_sync_errors(
+            core,
+            TransferType.deposit,
+            [core.exchange_session.active_exchange_name]
+        )
 
 class WithdrawalsCommand(BaseCommand):
     PARAMETER_PARSER = ParameterParser([])
@@ -408,6 +496,11 @@ class WithdrawalsCommand(BaseCommand):
                 data[-1].insert(cost_index, cost)
         table = AsciiTable(data, 'Withdrawals')
         print table.table
+        self.log_transfer_sync_errors(
+            core,
+            TransferType.withdrawal,
+            [core.exchange_session.active_exchange_name]
+        )
 
 class OrdersCommand(BaseCommand):
     DEFAULT_PARAMETER_PARSER = ParameterParser([
@@ -461,9 +554,17 @@ currency pair for completed orders.''',
         order_type = params['order-type']
         if order_type == 'open':
             data = [['Id', 'Exchange', 'Date', 'Type', 'Bid/Ask', 'Amount (filled/total)']]
-            sort = lambda orders: sorted(orders, key=lambda i: i.date_open)
-            for order in sort(core.exchange_handle.get_open_orders()):
-                data.append([
+            if core.exchange_session.is_multi_exchange():
+                result = core.exchange_session.aggregate.get_open_orders()
+                self.log_aggregate_errors(core, result)
+                rows = result.rows
+                # The "Exchange" column is really the market so name this one differently
+                data[0].insert(0, 'Venue')
+            else:
+                rows = map(lambda i: (None, i), core.exchange_handle.get_open_orders())
+            for exchange_name, order in sorted(rows, key=lambda i: i[1].date_open):
+                data.append([] if exchange_name is None else [exchange_name])
+                data[-1] += [
                     order.order_id,
                     '{0}/{1}'.format(order.base_currency.code, order.market_currency.code),
                     self.format_date(order.date_open),
@@ -474,7 +575,7 @@ currency pair for completed orders.''',
                         order.amount,
                         order.market_currency.code
                     )
-                ])
+                ]
             title = 'Open orders'
         elif order_type == 'completed':
             data = [['Exchange', 'Date', 'Type', 'Price', 'Amount (filled/total)']]
@@ -673,8 +774,9 @@ Example using percentage of available amount:
             price.format_value(rate),
             price.format_value(rate * amount)
         ])
-        table = AsciiTable(data, 'Sell operation')
+        table = AsciiTable(data, self.make_fiat_title(core, 'Sell operation'))
         print table.table
+        core.exchange_handle.warm_connection()
         if utils.show_operation_dialog():
             order_id = core.exchange_handle.sell(
                 base_currency_code,
@@ -760,8 +862,9 @@ Example using percentage of available amount:
             price.format_value(rate),
             price.format_value(rate * amount),
         ])
-        table = AsciiTable(data, 'Buy operation')
+        table = AsciiTable(data, self.make_fiat_title(core, 'Buy operation'))
         print table.table
+        core.exchange_handle.warm_connection()
         if utils.show_operation_dialog():
             order_id = core.exchange_handle.buy(
                base_currency_code,
@@ -866,8 +969,9 @@ Another example, 1 BTC:
             # Try to get our more specific namings if we have them
             data[0].append(WithdrawCommand.ADDRESS_TAG_NAME.get(currency.code, 'Address tag'))
             data[1].append(address_tag)
-        table = AsciiTable(data, 'Withdrawal')
+        table = AsciiTable(data, self.make_fiat_title(core, 'Withdrawal'))
         print table.table
+        core.exchange_handle.warm_connection()
         if utils.show_operation_dialog():
             withdraw_id = core.exchange_handle.withdraw(
                 currency.code,
@@ -970,91 +1074,49 @@ class CandlesCommand(BaseCommand):
         PositionalParameter('market-currency', parameter_type=str),
         ParameterChoice([
             ConstParameter('interval', keyword=i, required=False) for i in CandleTicks.__members__.keys()
-        ])
+        ]),
+        NamedParameter('count', parameter_type=int, required=False)
     ])
     HELP_TEMPLATE = {
-        'usage' : '{0} <base-currency> <market-currency> <interval>',
+        'usage' : '{0} <base-currency> <market-currency> [interval] [count <candles>]',
         'short_description' : 'fetch the price candles for a market',
         'long_description' : '''Fetch the price candles for the market <base-currency>/<market-currency>
 
 The <interval> parameter must be one of one_minute, five_minutes,
-thirty_minutes, one_hour and one_day.''',
+fifteen_minutes, thirty_minutes, one_hour, four_hours, one_day and
+one_week. Intervals the exchange doesn't provide are built out of
+shorter ones.
+
+By default the last 50 candles are fetched, use "count" to change that.
+If there's more candles than fit in the terminal, consecutive ones are
+merged and the chart's title shows how long each of them spans.''',
         'examples' : '''Print the candles using a one hour interval for the
 BTC/XLM market:
 
-{0} BTC XLM one_hour'''
+{0} BTC XLM one_hour
+
+Print the last 20 one day candles for the BTC/XLM market:
+
+{0} BTC XLM one_day count 20'''
     }
     SAMPLE_COUNT = 50
-    HEIGHT = 24
 
     def __init__(self):
         BaseCommand.__init__(self, 'candles')
 
     @classmethod
-    def find_lowest_highest(cls, candles):
-        lowest = None
-        highest = None
-        for i in candles:
-            if lowest is None or i.lowest_price < lowest:
-                lowest = i.lowest_price
-            if highest is None or i.highest_price > highest:
-                highest = i.highest_price
-        return (lowest, highest)
-
-    @classmethod
-    def display_candles(cls, candles, matrix, lowest, highest, interval):
-        y_values = map(
-            lambda i: lowest + (i / float(CandlesCommand.HEIGHT)) * (highest - lowest),
-            range(CandlesCommand.HEIGHT)
-        )
-        y_values.reverse()
-        y_fmt_string = utils.make_appropriate_float_format_string(max(y_values))
-        top_y_length = len(y_fmt_string.format(y_values[0]))
-
-        for i in range(CandlesCommand.HEIGHT):
-            y_label = y_fmt_string.format(y_values[i])
-            # Append enough spaces to padd the length difference with the top label 
-            sys.stdout.write('{0}{1} | '.format(y_label, (top_y_length - len(y_label)) * ' '))
-            for column in matrix:
-                sys.stdout.write(column[i] + " ")
-            sys.stdout.write('\n')
-        print u'\u2015' * (len(candles) * 2 + top_y_length + 2)
-        label_length = 5
-        x_labels = []
-        for i in range(len(candles) - 1, 0, -4):
-            x_labels.append(utils.make_candle_label(candles[i].timestamp, interval))
-        x_labels.reverse()
-        print ' ' * top_y_length + '   ' + '   '.join(x_labels)
+    def get_sample_count(cls, params):
+        count = params.get('count', CandlesCommand.SAMPLE_COUNT)
+        if count <= 0:
+            raise CommandExecutionException('count has to be positive')
+        return count
 
     @classmethod
-    def build_matrix(cls, candles, lowest, highest):
-        matrix = []
-        normalize = lambda v: (v - lowest) / (highest - lowest)
-        for i in candles:
-            open_value = normalize(i.open_price)
-            close_value = normalize(i.close_price)
-            low_value = normalize(i.lowest_price)
-            high_value = normalize(i.highest_price)
-            top = max(open_value, close_value)
-            bottom = min(open_value, close_value)
-            column = []
-            total_written = 0
-            for i in range(CandlesCommand.HEIGHT):
-                value = i / float(CandlesCommand.HEIGHT)
-                if value >= bottom and value <= top:
-                    column.append(UP_CANDLE if close_value > open_value else DOWN_CANDLE)
-                    total_written += 1
-                elif value > low_value and value < high_value:
-                    column.append(STICK_POS if close_value > open_value else STICK_NEG)
-                    total_written += 1
-                else:
-                    column.append(' ')
-            if total_written == 0:
-                column[int(high_value * (CandlesCommand.HEIGHT - 1))] = STICK_STABLE
-            column.reverse()
-            matrix.append(column)
-        return matrix
-
+    def display_candles(cls, candles, interval, title):
+        if len(candles) == 0:
+            print 'No candles found'
+            return
+        CandleRenderer().display(candles, interval, title)
 
     def execute(self, core, params):
         base_currency_code = params['base-currency']
@@ -1064,16 +1126,18 @@ BTC/XLM market:
             interval = CandleTicks.thirty_minutes
         else:
             interval = CandleTicks[interval_string]
+        count = self.get_sample_count(params)
         candles = core.exchange_handle.get_candles(
             base_currency_code,
             market_currency_code,
             interval,
-            CandlesCommand.SAMPLE_COUNT
+            count
+        )
+        self.display_candles(
+            candles[-count:],
+            interval,
+            '{0}/{1}'.format(base_currency_code, market_currency_code)
         )
-        candles = candles[-CandlesCommand.SAMPLE_COUNT:]
-        lowest, highest = self.find_lowest_highest(candles)
-        matrix = self.build_matrix(candles, lowest, highest)
-        self.display_candles(candles, matrix, lowest, highest, interval)
 
 class CompoundCandlesCommand(BaseCommand):
     PARAMETER_PARSER = ParameterParser([
@@ -1082,10 +1146,13 @@ class CompoundCandlesCommand(BaseCommand):
         PositionalParameter('target-currency', parameter_type=str),
         ParameterChoice([
             ConstParameter('interval', keyword=i, required=False) for i in CandleTicks.__members__.keys()
-        ])
+        ]),
+        NamedParameter('via', parameter_type=str, required=False),
+        NamedParameter('count', parameter_type=int, required=False)
     ])
     HELP_TEMPLATE = {
-        'usage' : '{0} <base-currency> <source-currency> <target-currency> [interval]',
+        'usage' : '{0} <base-currency> <source-currency> <target-currency> [interval] '\
+                  '[via <currencies>] [count <candles>]',
         'short_description' : 'compute the candles for two non tradeable currencies',
         'long_description' : '''Fetches the candles for <base-currency>/<source-currency> and
 <base-currency>/<target-currency> and correlates their values. This
@@ -1094,15 +1161,29 @@ For example, if there's a BTC/DOGE and a BTC/XLM market but not a
 DOGE/XLM one, you can use this command to compute what the
 historic price for DOGE/XLM would be.
 
+If there's no market between <base-currency> and <target-currency>,
+more intermediate currencies can be given as a comma separated list
+using "via". Candles are matched by their time so markets that had
+no trades during some interval don't shift the rest of them.
+
 The <interval> parameter must be one of one_minute, five_minutes,
-thirty_minutes, one_hour and one_day.''',
+fifteen_minutes, thirty_minutes, one_hour, four_hours, one_day and
+one_week. Intervals the exchange doesn't provide are built out of
+shorter ones.
+
+By default the last 50 candles are computed, use "count" to change
+that. If there's more candles than fit in the terminal, consecutive ones
+are merged and the chart's title shows how long each of them spans.''',
         'examples' : '''Print the candles for a XRP/XLM market using ETH as the
 intermediate currency to use:
 
-{0} ETH XLM XRP'''
+{0} ETH XLM XRP
+
+Print the candles for a DOGE/XLM market going through the BTC/DOGE,
+BTC/ETH and ETH/XLM markets:
+
+{0} BTC DOGE XLM via ETH'''
     }
-    SAMPLE_COUNT = 50
-    HEIGHT = 24
 
     def __init__(self):
         BaseCommand.__init__(self, 'compound_candles')
@@ -1116,37 +1197,21 @@ intermediate currency to use:
             interval = CandleTicks.thirty_minutes
         else:
             interval = CandleTicks[interval_string]
-        candles_source = core.exchange_handle.get_candles(
-            base_currency_code,
-            source_currency_code,
+        path = [source_currency_code, base_currency_code]
+        if 'via' in params:
+            path += filter(None, params['via'].split(','))
+        path.append(target_currency_code)
+        candles = get_compound_candles(
+            core.exchange_handle,
+            path,
             interval,
-            CandlesCommand.SAMPLE_COUNT
+            CandlesCommand.get_sample_count(params)
         )
-        candles_target = core.exchange_handle.get_candles(
-            base_currency_code,
-            target_currency_code,
+        CandlesCommand.display_candles(
+            candles,
             interval,
-            CandlesCommand.SAMPLE_COUNT
+            '{0}/{1}'.format(source_currency_code, target_currency_code)
         )
-        samples = min(CandlesCommand.SAMPLE_COUNT, len(candles_source), len(candles_target))
-        candles_source = candles_source[-samples:]
-        candles_target = candles_target[-samples:]
-
-        candles = []
-        for i in range(len(candles_source)):
-            source = candles_source[i]
-            target = candles_target[i]
-            candles.append(Candle(
-                source.lowest_price / target.lowest_price,
-                source.highest_price / target.highest_price,
-                source.open_price / target.open_price,
-                source.close_price / target.close_price,
-                source.timestamp
-            ))
-
-        lowest, highest = CandlesCommand.find_lowest_highest(candles)
-        matrix = CandlesCommand.build_matrix(candles, lowest, highest)
-        CandlesCommand.display_candles(candles, matrix, lowest, highest, interval)
 
     def generate_options(self, core, parameter_name, existing_parameters):
         if parameter_name in ['source-currency', 'target-currency']:
@@ -1284,11 +1349,11 @@ class CoinInfoCommand(BaseCommand):
             ['Change 24h', '{0}%'.format(self._format_number(metadata.change_24h))],
             ['Change 7d', '{0}%'.format(self._format_number(metadata.change_7d))],
         ]
-        table = AsciiTable(data, '{0} information'.format(currency))
+        table = AsciiTable(data, self.make_fiat_title(core, '{0} information'.format(currency)))
         table.inner_heading_row_border = False
         print table.table
 
-    def _list_coins(self, coins, fmt_currency, title):
+    def _list_coins(self, core, coins, fmt_currency, title):
         coins = sorted(coins, key=lambda c: c.rank)
         data = [['Rank', 'Name', 'Code', 'Price', 'Market cap']]
         for coin in coins:
@@ -1299,12 +1364,12 @@ class CoinInfoCommand(BaseCommand):
                 fmt_currency(coin.price),
                 fmt_currency(coin.market_cap)
             ])
-        table = AsciiTable(data, title)
+        table = AsciiTable(data, self.make_fiat_title(core, title))
         print table.table
 
     def _list_top_coins(self, core, top, fmt_currency):
         coins = core.coin_db.get_top_coins(top)
-        self._list_coins(coins, fmt_currency, 'Top {0}'.format(top))
+        self._list_coins(core, coins, fmt_currency, 'Top {0}'.format(top))
 
     def _search_coin(self, core, match_string, fmt_currency):
         match_string = match_string.lower()
@@ -1318,7 +1383,7 @@ class CoinInfoCommand(BaseCommand):
         elif len(matches) == 1:
             self._show_coin(core, matches[0].code, fmt_currency)
         else:
-            self._list_coins(matches, fmt_currency, 'Coin matches')
+            self._list_coins(core, matches, fmt_currency, 'Coin matches')
 
     def execute(self, core, params):
         fmt_currency = lambda value: utils.format_fiat_currency(
@@ -1405,13 +1470,103 @@ class WithdrawalFeesCommand(BaseCommand):
                 ['Currency', currency.name],
                 ['Withdrawal fee', self._make_price(currency, core)]
             ]
-            table = AsciiTable(data, 'Fees')
+            table = AsciiTable(data, self.make_fiat_title(core, 'Fees'))
             table.inner_row_border = True
         else:
             data = [['Currency', 'Withdraw fee']]
             for currency in currencies:
                 data.append([currency.name, self._make_price(currency, core)])
-            table = AsciiTable(data, 'Fees')
+            table = AsciiTable(data, self.make_fiat_title(core, 'Fees'))
+        print table.table
+
+class ExchangeCommand(BaseCommand):
+    PARAMETER_PARSER = ParameterParser([
+        PositionalParameter('exchange', parameter_type=str, required=False)
+    ])
+    HELP_TEMPLATE = {
+        'usage' : '{0} [exchange]',
+        'short_description' : 'list or switch the exchange in use',
+        'long_description' : '''When executed with no parameters, list the configured exchanges.
+When an exchange is provided, every command will use that exchange
+from then on. When several exchanges are configured, the wallets,
+market, deposits and open orders commands show all of them.''',
+        'examples' : '''Start using Binance:
+
+{0} binance'''
+    }
+
+    def __init__(self):
+        BaseCommand.__init__(self, 'exchange')
+
+    def execute(self, core, params):
+        if 'exchange' in params:
+            core.set_active_exchange(params['exchange'])
+            print 'Now using {0}'.format(params['exchange'])
+        else:
+            data = [['Exchange', 'Active']]
+            for exchange_name in core.exchange_session.get_exchange_names():
+                is_active = exchange_name == core.exchange_session.active_exchange_name
+                data.append([exchange_name, 'yes' if is_active else ''])
+            table = AsciiTable(data, 'Exchanges')
+            print table.table
+
+    def generate_options(self, core, parameter_name, existing_parameters):
+        if parameter_name == 'exchange':
+            return core.exchange_session.get_exchange_names()
+        return []
+
+class RequestStatsCommand(BaseCommand):
+    PARAMETER_PARSER = ParameterParser([])
+    HELP_TEMPLATE = {
+        'usage' : '{0}',
+        'short_description' : 'show statistics about the requests sent to the exchanges',
+        'long_description' : '''Show how many times each exchange API endpoint was called, how
+many of those calls were retried after a transient failure and
+how many times a second request was sent because the first one
+was too slow ("hedged"), along with how many of those finished
+first. Endpoints that keep failing are temporarily disabled.
+
+Wallets, open orders, prices and deposit addresses are reused
+for a few seconds. How many times the cached ones were used,
+how many had expired and how many were dropped because an order
+was placed, cancelled or a withdrawal made is shown as well.
+Identical requests made at the same time are only sent once,
+the "coalesced" column shows how many were saved that way.'''
+    }
+
+    def __init__(self):
+        BaseCommand.__init__(self, 'requests')
+
+    def execute(self, core, params):
+        data = [['Exchange', 'Endpoint', 'Calls', 'Retries', 'Hedged (won)', 'Status']]
+        for exchange_name in core.exchange_session.get_exchange_names():
+            handle = core.exchange_session.get_handle(exchange_name)
+            for endpoint, stats in handle.get_request_stats():
+                data.append([
+                    exchange_name,
+                    endpoint,
+                    stats.calls,
+                    stats.retries,
+                    '{0} ({1})'.format(stats.hedges, stats.hedge_wins),
+                    'disabled' if stats.is_circuit_open() else 'ok'
+                ])
+        table = AsciiTable(data, 'Requests')
+        print table.table
+        data = [['Exchange', 'Method', 'Hits', 'Misses (stale)', 'Evicted', 'Invalidated',
+                 'Coalesced']]
+        for exchange_name in core.exchange_session.get_exchange_names():
+            handle = core.exchange_session.get_handle(exchange_name)
+            for name, stats in handle.get_cache_stats():
+                data.append([
+                    exchange_name,
+                    name,
+                    stats.hits,
+                    '{0} ({1})'.format(stats.misses, stats.stale),
+                    stats.evictions,
+                    stats.invalidations,
+                    stats.coalesced
+                ])
+        table = AsciiTable(data, 'Cache')
         print table.table
 
 class CommandManager:
@@ -1436,6 +1591,8 @@ class CommandManager:
         self.add_command(CoinInfoCommand())
         self.add_command(CommandHistoryCommand())
         self.add_command(WithdrawalFeesCommand())
+        self.add_command(ExchangeCommand())
+        self.add_command(RequestStatsCommand())
         self.add_command(UsageCommand())
         self.add_command(HelpCommand())
 
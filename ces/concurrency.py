@@ -0,0 +1,63 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+from exchanges.request_scheduler import request_priority, get_request_priority
+
+def make_thread_pool(size):
+    return ThreadPool(max(1, size))
+
+# AsyncResult.get() without a timeout can't be interrupted using ctrl+c so wait for
+# the result in small steps instead
+def get_result(async_result):
+    while not async_result.ready():
+        async_result.wait(0.1)
+    return async_result.get()
+
+# Same as pool.apply_async but the request priority is per thread so the worker is told
+# to use the caller's one
+def apply_async(pool, functor, args=()):
+    priority = get_request_priority()
+    def run():
+        with request_priority(priority):
+            return functor(*args)
+    return pool.apply_async(run)
+
+# Calls functor(item) for every item concurrently. Returns a (results, errors) pair of
+# OrderedDicts from item to the value returned for it and from item to the exception
+# raised for it
+def fan_out(pool, functor, items):
+    pending = [(item, apply_async(pool, functor, (item,))) for item in items]
+    results = OrderedDict()
+    errors = OrderedDict()
+    for item, result in pending:
+        try:
+            results[item] = get_result(result)
+        except Exception as ex:
+            errors[item] = ex
+    return (results, errors)
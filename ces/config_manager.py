@@ -30,9 +30,10 @@ from exceptions import KeyMissingConfigException
 from utils import decrypt_file
 
 class ExchangeConfig:
-    def __init__(self, api_key, api_secret):
+    def __init__(self, api_key, api_secret, stream_market_data=False):
         self.api_key = api_key
         self.api_secret = api_secret
+        self.stream_market_data = stream_market_data
 
 class ConfigManager:
     def __init__(self):
@@ -55,7 +56,8 @@ class ConfigManager:
             self._ensure_key_is_present(exchange, 'name')
             exchanges[exchange['name']] = ExchangeConfig(
                 exchange['api_key'],
-                exchange['api_secret']
+                exchange['api_secret'],
+                exchange.get('stream_market_data', False)
             )
         self.fiat_currency = None
         for key, value in config.get('metadata', {}).items():
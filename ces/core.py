@@ -26,9 +26,14 @@
 # either expressed or implied, of the FreeBSD Project.
 
 class Core:
-    def __init__(self, exchange_handle, cmd_manager, output_manager, address_book, coin_db):
-        self.exchange_handle = exchange_handle
+    def __init__(self, exchange_session, cmd_manager, output_manager, address_book, coin_db):
+        self.exchange_session = exchange_session
+        self.exchange_handle = exchange_session.get_active_handle()
         self.cmd_manager = cmd_manager
         self.output_manager = output_manager
         self.address_book = address_book
         self.coin_db = coin_db
+
+    def set_active_exchange(self, exchange_name):
+        self.exchange_session.set_active_exchange(exchange_name)
+        self.exchange_handle = self.exchange_session.get_active_handle()
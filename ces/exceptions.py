@@ -59,6 +59,11 @@ class UnknownMarketException(BaseException):
 class ExchangeAPIException(BaseException):
     pass
 
+class UnknownExchangeException(BaseException):
+    def __init__(self, exchange_name):
+        BaseException.__init__(self, 'Unknown exchange {0}'.format(exchange_name))
+        self.exchange_name = exchange_name
+
 class InvalidArgumentException(BaseException):
     pass
 
@@ -106,3 +111,9 @@ class ParameterParsingException(CommandExecutionException):
 
 class InvalidAmountException(BaseException):
     pass
+
+class StartupException(BaseException):
+    def __init__(self, stage, error):
+        BaseException.__init__(self, 'Stage "{0}" failed: {1}'.format(stage, error))
+        self.stage = stage
+        self.error = error
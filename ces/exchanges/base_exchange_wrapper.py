@@ -25,8 +25,11 @@
 # of the authors and should not be interpreted as representing official policies,
 # either expressed or implied, of the FreeBSD Project.
 
+import copy
 from enum import Enum
 from ces.exceptions import *
+from ces.models import Currency, Transfer, TransferType, CANDLE_TICK_SECONDS
+import ces.timestamps as timestamps
 
 class OrderInvalidity:
     Comparison = Enum('Comparison', 'lower_eq greater_eq')
@@ -36,18 +39,102 @@ class OrderInvalidity:
         self.value = value
 
 class BaseExchangeWrapper:
+    # CandleTicks -> the exchange's name for that interval
+    INTERVAL_MAP = {}
+
     def __init__(self, exposes_confirmations=True):
         self._currencies = {}
         self._markets = {}
+        self._symbols = {}
+        self._candle_cache = None
+        self._transfer_ledger = None
+        # TransferType -> errors raised the last time those transfers were synced
+        self._transfer_sync_errors = {}
         self.exposes_confirmations = exposes_confirmations
 
+    def set_candle_cache(self, candle_cache):
+        self._candle_cache = candle_cache
+
+    # Keep every deposit and withdrawal in a local ledger so only new ones are downloaded
+    def set_transfer_ledger(self, transfer_ledger):
+        self._transfer_ledger = transfer_ledger
+
     def add_currency(self, currency):
         self._currencies[currency.code] = currency
 
-    def add_market(self, base_currency_code, market_currency_code):
+    def add_market(self, base_currency_code, market_currency_code, symbol=None):
         if base_currency_code not in self._markets:
             self._markets[base_currency_code] = set()
         self._markets[base_currency_code].add(market_currency_code)
+        if symbol is not None:
+            self._symbols[symbol] = (base_currency_code, market_currency_code)
+
+    def _split_symbol(self, symbol):
+        if symbol not in self._symbols:
+            raise ExchangeAPIException('Failed to decode symbol {0}'.format(symbol))
+        return self._symbols[symbol]
+
+    def _init_metadata(self, metadata):
+        if metadata is None:
+            self._load_markets()
+        else:
+            self.import_metadata(metadata)
+
+    def _clear_metadata(self):
+        self._currencies = {}
+        self._markets = {}
+        self._symbols = {}
+
+    def _load_markets(self):
+        pass
+
+    # Returns the currencies and markets in a form that can be serialized as JSON
+    def export_metadata(self):
+        symbols = dict(map(lambda i: (i[1], i[0]), self._symbols.items()))
+        currencies = []
+        for currency in self._currencies.values():
+            currencies.append([
+                currency.code,
+                currency.name,
+                currency.min_confirmations,
+                currency.withdraw_fee
+            ])
+        markets = []
+        for base_currency_code, market_currency_codes in self._markets.items():
+            for market_currency_code in market_currency_codes:
+                symbol = symbols.get((base_currency_code, market_currency_code), None)
+                markets.append([base_currency_code, market_currency_code, symbol])
+        return {
+            'currencies' : sorted(currencies),
+            'markets' : sorted(markets),
+        }
+
+    # Replaces the currencies and markets with the ones in the given exported metadata
+    def import_metadata(self, metadata):
+        currencies = {}
+        markets = {}
+        symbols = {}
+        for code, name, min_confirmations, withdraw_fee in metadata['currencies']:
+            currencies[code] = Currency(code, name, min_confirmations, withdraw_fee)
+        for base_currency_code, market_currency_code, symbol in metadata['markets']:
+            markets.setdefault(base_currency_code, set()).add(market_currency_code)
+            if symbol is not None:
+                symbols[symbol] = (base_currency_code, market_currency_code)
+        self._currencies = currencies
+        self._markets = markets
+        self._symbols = symbols
+
+    # Loads the metadata from the exchange again and applies it if anything changed.
+    # Returns true if there were any differences
+    def refresh_metadata(self):
+        fresh = copy.copy(self)
+        fresh._clear_metadata()
+        fresh._load_markets()
+        metadata = fresh.export_metadata()
+        if metadata == self.export_metadata():
+            return False
+        self.import_metadata(metadata)
+        return True
 
     def check_valid_currency(self, currency_code):
         if currency_code not in self._currencies:
@@ -68,6 +155,152 @@ class BaseExchangeWrapper:
             raise UnknownBaseCurrencyException(base_currency_code)
         return [self._currencies[x] for x in self._markets[base_currency_code]]
 
+    # The candle intervals the exchange provides
+    def get_native_candle_intervals(self):
+        return self.INTERVAL_MAP.keys()
+
+    # Returns the interval to build candles out of. The ones the exchange doesn't provide are
+    # built out of the longest interval that fits in them. The ones it does are only built
+    # locally if enough shorter candles are stored
+    def _find_candle_source(self, base_currency_code, market_currency_code, interval, limit):
+        native_intervals = self.get_native_candle_intervals()
+        interval_seconds = CANDLE_TICK_SECONDS[interval]
+        sources = sorted(
+            filter(
+                lambda i: i != interval and interval_seconds % CANDLE_TICK_SECONDS[i] == 0,
+                native_intervals
+            ),
+            key=lambda i: CANDLE_TICK_SECONDS[i],
+            reverse=True
+        )
+        if interval in native_intervals:
+            if self._candle_cache is not None:
+                for source in sources:
+                    count = self._get_source_candle_count(interval, source, limit)
+                    if self._candle_cache.has_candles(base_currency_code, market_currency_code,
+                                                      source, count):
+                        return source
+            return interval
+        if len(sources) == 0:
+            raise ExchangeAPIException(
+                'Candles with interval {0} are not supported'.format(interval.name)
+            )
+        return sources[0]
+
+    # Returns how many source candles are needed to build limit ones. An extra one is used
+    # as the first source candle may be in the middle of an interval
+    @classmethod
+    def _get_source_candle_count(cls, interval, source, limit):
+        return (limit + 1) * CANDLE_TICK_SECONDS[interval] / CANDLE_TICK_SECONDS[source]
+
+    def get_candles(self, base_currency_code, market_currency_code, interval, limit):
+        source = self._find_candle_source(
+            base_currency_code,
+            market_currency_code,
+            interval,
+            limit
+        )
+        if source == interval:
+            return self._get_stored_candles(
+                base_currency_code,
+                market_currency_code,
+                interval,
+                limit
+            )
+        candles = self._get_stored_candles(
+            base_currency_code,
+            market_currency_code,
+            source,
+            self._get_source_candle_count(interval, source, limit)
+        )
+        return candles.resample(interval)[-limit:]
+
+    # Uses the candle cache, if any, to fetch candles through the exchange's _fetch_candles.
+    # If since is not None, only the candles starting at or after it are needed although
+    # older ones may be returned as well
+    def _get_stored_candles(self, base_currency_code, market_currency_code, interval, limit):
+        if self._candle_cache is None:
+            return self._fetch_candles(
+                base_currency_code,
+                market_currency_code,
+                interval,
+                limit
+            )
+        return self._candle_cache.get_candles(
+            base_currency_code,
+            market_currency_code,
+            interval,
+            limit,
+            lambda since: self._fetch_candles(
+                base_currency_code,
+                market_currency_code,
+                interval,
+                limit,
+                since
+            )
+        )
+
+    # Exchanges that need an asset to list transfers are asked about every currency we hold
+    # and every one we've moved before
+    def _get_transfer_currency_codes(self, transfer_type):
+        currency_codes = set(self._transfer_ledger.get_cursors(transfer_type).keys())
+        for wallet in self.get_wallets():
+            if wallet.balance > 0:
+                currency_codes.add(wallet.currency.code)
+        return sorted(currency_codes)
+
+    # Stores the transfers returned by the exchange's _fetch_transfers, which returns
+    # (transfer id, currency code, amount, transaction id, confirmations, cost, cancelled,
+    # timestamp) tuples. If since is not None, only the transfers made at or after it are
+    # needed although older ones may be returned as well.
+    #
+    # Returns a dict from currency code (None if all of them were synced at once) to the
+    # exception raised while syncing it
+    def sync_transfers(self, transfer_type, currency_code=None):
+        if currency_code is not None:
+            currency_codes = [currency_code]
+        elif self._transfer_needs_asset():
+            currency_codes = self._get_transfer_currency_codes(transfer_type)
+        else:
+            currency_codes = None
+        return self._transfer_ledger.sync(transfer_type, currency_codes, self._fetch_transfers)
+
+    def _get_transfer_history(self, transfer_type, currency_code):
+        if self._transfer_ledger is None:
+            rows = self._fetch_transfers(transfer_type, currency_code)
+        else:
+            # Whatever failed to sync is served from what the ledger already has
+            self._transfer_sync_errors[transfer_type] = \
+                self.sync_transfers(transfer_type, currency_code)
+            rows = self._transfer_ledger.get_transfers(transfer_type, currency_code)
+        output = []
+        for _, code, amount, transaction_id, confirmations, cost, cancelled, timestamp in \
+                sorted(rows, key=lambda i: i[7]):
+            # TODO: somehow log this
+            if code not in self._currencies:
+                continue
+            output.append(Transfer(
+                self._currencies[code],
+                amount,
+                transaction_id,
+                confirmations,
+                cost,
+                bool(cancelled),
+                timestamps.from_epoch(timestamp)
+            ))
+        return output
+
+    def get_deposit_history(self, currency_code=None):
+        return self._get_transfer_history(TransferType.deposit, currency_code)
+
+    def get_withdrawal_history(self, currency_code=None):
+        return self._get_transfer_history(TransferType.withdrawal, currency_code)
+
+    # Returns a dict from currency code (None for all of them) to the exception raised the
+    # last time the history of the given transfer type was synced
+    def get_transfer_sync_errors(self, transfer_type):
+        return self._transfer_sync_errors.get(transfer_type, {})
+
     def is_order_rate_valid(self, base_currency_code, market_currency_code, rate):
         return True
 
@@ -86,8 +319,26 @@ class BaseExchangeWrapper:
     def adjust_order_amount(self, base_currency_code, market_currency_code, amount):
         return amount
 
+    # Returns (endpoint, EndpointStats) pairs describing the requests performed so far
+    def get_request_stats(self):
+        return []
+
+    # Returns (method name, CacheStats) pairs if the handle caches its results
+    def get_cache_stats(self):
+        return []
+
+    # Called before an operation (e.g. placing an order) is confirmed so it can be sent
+    # over a connection that's already open
+    def warm_connection(self):
+        pass
+
     def order_history_needs_asset(self):
         return False
 
-    def transfers_needs_asset(self):
+    # Whether the exchange's API needs an asset to list transfers
+    def _transfer_needs_asset(self):
         return False
+
+    # The ledger takes care of asking for every asset
+    def transfers_needs_asset(self):
+        return self._transfer_needs_asset() and self._transfer_ledger is None
@@ -25,16 +25,23 @@
 # of the authors and should not be interpreted as representing official policies,
 # either expressed or implied, of the FreeBSD Project.
 
-import requests
-import json
-import dateparser
+import threading
+import time
+from collections import deque
+from multiprocessing.pool import ThreadPool
 from time import mktime
 from datetime import datetime
 from binance.client import Client
+from binance.exceptions import BinanceRequestException
 from ces.models import *
 from ces.exceptions import *
 from ces.exchanges.base_exchange_wrapper import *
 import ces.utils as utils
+import ces.timestamps as timestamps
+from ces.transport import get_transport
+from ces.exchanges.request_scheduler import *
+from ces.exchanges.resilience import ResilientClient
+from ces.exchanges.market_stream import BinanceMarketStream
 
 class OrderFilter:
     def __init__(self, min_price, max_price, price_tick, min_amount, max_amount,
@@ -47,24 +54,89 @@ class OrderFilter:
         self.amount_step = amount_step
         self.min_notional = min_notional
 
+# Holds the state of every market in the exchange. This is shared by every caller
+# while it's fresh so a burst of market lookups only costs a single bulk fetch
+class TickerSnapshot:
+    def __init__(self, ttl):
+        self._ttl = ttl
+        self._states = {}
+        self._timestamp = None
+        self._lock = threading.Lock()
+
+    def update(self, states):
+        with self._lock:
+            self._states = states
+            self._timestamp = time.time()
+
+    def get_market_state(self, symbol):
+        with self._lock:
+            if self._timestamp is None or time.time() - self._timestamp > self._ttl:
+                return None
+            return self._states.get(symbol, None)
+
 class BinanceWrapper(BaseExchangeWrapper):
     INTERVAL_MAP = {
         CandleTicks.one_minute : Client.KLINE_INTERVAL_1MINUTE,
         CandleTicks.five_minutes : Client.KLINE_INTERVAL_5MINUTE,
+        CandleTicks.fifteen_minutes : Client.KLINE_INTERVAL_15MINUTE,
         CandleTicks.thirty_minutes : Client.KLINE_INTERVAL_30MINUTE,
         CandleTicks.one_hour : Client.KLINE_INTERVAL_1HOUR,
+        CandleTicks.four_hours : Client.KLINE_INTERVAL_4HOUR,
         CandleTicks.one_day : Client.KLINE_INTERVAL_1DAY,
+        CandleTicks.one_week : Client.KLINE_INTERVAL_1WEEK,
     }
-
-    def __init__(self, api_key, api_secret):
+    MAX_KLINES = 1000
+    # How long (in seconds) a snapshot of all tickers is used before being discarded
+    TICKER_SNAPSHOT_TTL = 5
+    # Request weights for a single symbol's 24hr ticker and for fetching both the prices
+    # and the order book tickers for every symbol
+    SINGLE_TICKER_WEIGHT = 1
+    ALL_TICKERS_WEIGHT = 4
+    # Weights of the other endpoints that cost more than 1
+    ACCOUNT_WEIGHT = 5
+    OPEN_ORDERS_WEIGHT = 40
+    MY_TRADES_WEIGHT = 5
+    # The snapshot used to start a local order book is as deep as possible
+    DEPTH_SNAPSHOT_LIMIT = 1000
+    DEPTH_SNAPSHOT_WEIGHT = 10
+    # Binance allows this much weight per minute
+    MAX_REQUEST_WEIGHT = 1200
+    COIN_TICKER_URL = 'https://api.coinmarketcap.com/v1/ticker/'
+    WITHDRAW_INFO_URL = 'https://www.binance.com/assetWithdraw/getAllAsset.html'
+
+    # coin_ticker can be a SharedDownload of the coinmarketcap ticker so it's only
+    # downloaded once during startup
+    def __init__(self, api_key, api_secret, coin_ticker=None, metadata=None):
         BaseExchangeWrapper.__init__(self, exposes_confirmations=False)
-        self._handle = Client(api_key, api_secret)
+        # Invalid JSON, usually an error page from a proxy in front of the API
+        self._handle = ResilientClient(Client(api_key, api_secret), (BinanceRequestException,))
+        get_transport().attach(self._handle.session)
+        self._handle.session.hooks['response'].append(self._on_response)
+        self._scheduler = RequestScheduler(BinanceWrapper.MAX_REQUEST_WEIGHT)
+        self._coin_ticker = coin_ticker
         self._filters = {}
-        self._load_markets()
-
-    def _perform_request(self, request_lambda):
+        self._ticker_snapshot = TickerSnapshot(BinanceWrapper.TICKER_SNAPSHOT_TTL)
+        self._ticker_requests = deque()
+        self._ticker_requests_lock = threading.Lock()
+        self._market_stream = None
+        self._trade_ledger = None
+        self._held_currencies = None
+        self.withdraw_info = {}
+        self._init_metadata(metadata)
+
+    def _on_response(self, response, *args, **kwargs):
+        used_weight = response.headers.get('X-MBX-USED-WEIGHT-1M') or \
+                      response.headers.get('X-MBX-USED-WEIGHT')
+        if used_weight is not None:
+            self._scheduler.update_used_weight(int(used_weight))
+        # 429 means we're over the limit, 418 that we've been banned for not backing off
+        if response.status_code in (418, 429):
+            self._scheduler.block_for(int(response.headers.get('Retry-After', 60)))
+
+    # Requests that share a key are coalesced if they're performed at the same time
+    def _perform_request(self, request_lambda, weight=1, key=None):
         try:
-            output = request_lambda()
+            output = self._scheduler.run(request_lambda, weight, key)
             if type(output) is dict and output.get('success', True) == False:
                 if output['msg'] is dict:
                     if output['msg']['code'] == -1021:
@@ -76,10 +148,26 @@ class BinanceWrapper(BaseExchangeWrapper):
         except Exception as ex:
             raise ExchangeAPIException(ex.message)
 
+    # Use websocket streams for the markets being looked up instead of polling them
+    def enable_market_stream(self, stream_url=None):
+        self._market_stream = BinanceMarketStream(self._handle, stream_url)
+
+    # Keep every trade in a local ledger so the order history isn't limited to one symbol
+    def set_trade_ledger(self, trade_ledger):
+        self._trade_ledger = trade_ledger
+
+    def get_request_stats(self):
+        return self._handle.get_request_stats()
+
+    def warm_connection(self):
+        get_transport().warm_in_background(Client.API_URL)
+
     def _load_names(self):
         try:
-            result = requests.get('https://api.coinmarketcap.com/v1/ticker/')
-            data = json.loads(result.text)
+            if self._coin_ticker is not None:
+                data = self._coin_ticker.get()
+            else:
+                data = get_transport().get_json(BinanceWrapper.COIN_TICKER_URL)
         except Exception as ex:
             print 'Failed to parse coinmarketcap data: {0}'.format(ex)
             return {}
@@ -90,8 +178,7 @@ class BinanceWrapper(BaseExchangeWrapper):
 
     def _load_withdraw_info(self):
         try:
-            result = requests.get('https://www.binance.com/assetWithdraw/getAllAsset.html')
-            data = json.loads(result.text)
+            data = get_transport().get_json(BinanceWrapper.WITHDRAW_INFO_URL)
         except Exception as ex:
             print 'Failed to parse withdraw fees data: {0}'.format(ex)
             return {}
@@ -109,13 +196,6 @@ class BinanceWrapper(BaseExchangeWrapper):
            raise UnknownMarketException(base_currency_code, market_currency_code)
         return '{0}{1}'.format(market_currency_code, base_currency_code)
 
-    def _split_sumbol(self, symbol):
-        for base_code, markets in self._markets.items():
-            for market_code in markets:
-                if market_code + base_code == symbol:
-                    return (base_code, market_code)
-        raise ExchangeAPIException('Failed to decode symbol {0}'.format(symbol))
-
     def _add_filter(self, exchange, filters):
         min_price = None
         max_price = None
@@ -146,9 +226,19 @@ class BinanceWrapper(BaseExchangeWrapper):
         )
 
     def _load_markets(self):
-        names = self._load_names()
-        self.withdraw_info = self._load_withdraw_info()
-        result = self._perform_request(lambda: self._handle.get_exchange_info())
+        # None of these depend on each other so fetch them all at once
+        pool = ThreadPool(2)
+        try:
+            names = pool.apply_async(self._load_names)
+            withdraw_info = pool.apply_async(self._load_withdraw_info)
+            result = self._perform_request(
+                lambda: self._handle.get_exchange_info(),
+                key='exchange_info'
+            )
+            names = names.get()
+            self.withdraw_info = withdraw_info.get()
+        finally:
+            pool.close()
         for symbol in result['symbols']:
             base_currency = symbol['quoteAsset']
             market_currency = symbol['baseAsset']
@@ -164,20 +254,53 @@ class BinanceWrapper(BaseExchangeWrapper):
                 0,
                 self.withdraw_info.get(market_currency, {}).get('fee', None)
             ))
-            self.add_market(base_currency, market_currency)
+            self.add_market(base_currency, market_currency, symbol['symbol'])
             self._add_filter(symbol['symbol'], symbol['filters'])
 
+    def _clear_metadata(self):
+        BaseExchangeWrapper._clear_metadata(self)
+        self._filters = {}
+        self.withdraw_info = {}
+
+    def export_metadata(self):
+        output = BaseExchangeWrapper.export_metadata(self)
+        filters = {}
+        for symbol, order_filter in self._filters.items():
+            filters[symbol] = [
+                order_filter.min_price,
+                order_filter.max_price,
+                order_filter.price_tick,
+                order_filter.min_amount,
+                order_filter.max_amount,
+                order_filter.amount_step,
+                order_filter.min_notional
+            ]
+        output['filters'] = filters
+        output['withdraw_info'] = self.withdraw_info
+        return output
+
+    def import_metadata(self, metadata):
+        BaseExchangeWrapper.import_metadata(self, metadata)
+        filters = {}
+        for symbol, values in metadata['filters'].items():
+            filters[symbol] = OrderFilter(*values)
+        self._filters = filters
+        self.withdraw_info = metadata['withdraw_info']
+
     def get_open_orders(self):
-        result = self._perform_request(lambda: self._handle.get_open_orders())
+        result = self._perform_request(
+            lambda: self._handle.get_open_orders(),
+            BinanceWrapper.OPEN_ORDERS_WEIGHT
+        )
         output = []
         for item in result:
-            base_code, market_code = self._split_sumbol(item['symbol'])
+            base_code, market_code = self._split_symbol(item['symbol'])
             amount = float(item['origQty'])
             output.append(TradeOrder(
                 item["orderId"],
                 self._currencies[base_code],
                 self._currencies[market_code],
-                dateparser.parse(str(item["time"])),
+                timestamps.from_epoch(item["time"]),
                 None,
                 amount,
                 amount - float(item["executedQty"]),
@@ -187,10 +310,93 @@ class BinanceWrapper(BaseExchangeWrapper):
             ))
         return output
 
-    # Order history in Binance requires a symbol... This doesn't really work
+    def _fetch_trades(self, symbol, from_id, limit):
+        result = self._perform_request(
+            lambda: self._handle.get_my_trades(symbol=symbol, fromId=from_id, limit=limit),
+            BinanceWrapper.MY_TRADES_WEIGHT
+        )
+        return [
+            (
+                item['id'],
+                str(item['orderId']),
+                item['time'] / 1000.0,
+                float(item['price']),
+                float(item['qty']),
+                item['isBuyer']
+            )
+            for item in result
+        ]
+
+    # Trades can only be fetched per symbol so only the ones we may have traded are: the
+    # ones already in the ledger, the ones for currencies we started holding since the
+    # last sync and, every once in a while, the rest of the ones for currencies we hold
+    def _get_trade_symbols(self):
+        held = set(map(
+            lambda i: i.currency.code,
+            filter(lambda i: i.balance > 0, self.get_wallets())
+        ))
+        previously_held = self._held_currencies
+        self._held_currencies = held
+        new = set() if previously_held is None else held - previously_held
+        symbols = set(self._trade_ledger.get_cursors().keys())
+        unchecked = []
+        for symbol, (base_currency_code, market_currency_code) in self._symbols.items():
+            if base_currency_code in new or market_currency_code in new:
+                symbols.add(symbol)
+            elif base_currency_code in held or market_currency_code in held:
+                unchecked.append(symbol)
+        symbols.update(self._trade_ledger.get_unchecked_symbols(unchecked))
+        return sorted(symbols)
+
+    # Returns a dict from symbol to the exception raised while syncing it
+    def sync_trades(self):
+        return self._trade_ledger.sync(self._get_trade_symbols(), self._fetch_trades)
+
+    def sync_trades_in_background(self):
+        return self._trade_ledger.sync_in_background(
+            self._get_trade_symbols,
+            self._fetch_trades
+        )
+
+    def _get_ledger_orders(self):
+        output = []
+        for symbol, _, order_id, timestamp, price, quantity, is_buyer in \
+                self._trade_ledger.get_trades():
+            if symbol not in self._symbols:
+                continue
+            base_currency_code, market_currency_code = self._split_symbol(symbol)
+            output.append(TradeOrder(
+                order_id,
+                self._currencies[base_currency_code],
+                self._currencies[market_currency_code],
+                None,
+                timestamps.from_epoch(timestamp),
+                quantity,
+                0, # Amount remaining
+                price,
+                price,
+                OrderType.limit_buy if is_buyer else OrderType.limit_sell
+            ))
+        return output
+
+    # Without a ledger, order history in Binance requires a symbol
     def get_order_history(self, base_currency_code=None, market_currency_code=None):
+        if self._trade_ledger is not None:
+            # Whatever happened since the last sync will show up next time
+            self.sync_trades_in_background()
+            output = self._get_ledger_orders()
+            if base_currency_code is not None:
+                output = filter(
+                    lambda i: i.base_currency.code == base_currency_code and \
+                              i.market_currency.code == market_currency_code,
+                    output
+                )
+            return output
         exchange_name = self._make_exchange_name(base_currency_code, market_currency_code)
-        result = self._perform_request(lambda: self._handle.get_my_trades(symbol=exchange_name))
+        result = self._perform_request(
+            lambda: self._handle.get_my_trades(symbol=exchange_name),
+            BinanceWrapper.MY_TRADES_WEIGHT
+        )
         output = []
         for item in result:
             amount = float(item['qty'])
@@ -199,7 +405,7 @@ class BinanceWrapper(BaseExchangeWrapper):
                 self._currencies[base_currency_code],
                 self._currencies[market_currency_code],
                 None,
-                dateparser.parse(str(item["time"])),
+                timestamps.from_epoch(item["time"]),
                 amount,
                 0, # Amount remaining
                 float(item["price"]),
@@ -208,57 +414,152 @@ class BinanceWrapper(BaseExchangeWrapper):
             ))
         return output
 
-    def get_withdrawal_history(self, currency_code=None):
-        result = self._perform_request(lambda: self._handle.get_withdraw_history())
+    def _fetch_transfers(self, transfer_type, currency_code, since=None):
+        params = {}
+        if currency_code is not None:
+            params['asset'] = currency_code
+        if since is not None:
+            params['startTime'] = int(since * 1000)
         output = []
-        for item in result.get("withdrawList", []):
-            output.append(Transfer(
-                self._currencies[item['asset']],
-                item['amount'],
-                item.get('txId', '<unknown>'),
-                None, # Confirmation
-                None, # Tx cost
-                item['status'] == 1, # Cancelled
-                utils.datetime_from_utc_time(str(item['applyTime']))
-            ))
+        if transfer_type == TransferType.deposit:
+            result = self._perform_request(lambda: self._handle.get_deposit_history(**params))
+            for item in result.get('depositList', []):
+                output.append((
+                    # Deposits have no id of their own
+                    item.get('id', item['txId']),
+                    item['asset'],
+                    float(item['amount']),
+                    item['txId'],
+                    item['status'], # Status == 1 means success
+                    0,
+                    False,
+                    timestamps.to_epoch_seconds(item['insertTime'])
+                ))
+        else:
+            result = self._perform_request(lambda: self._handle.get_withdraw_history(**params))
+            for item in result.get('withdrawList', []):
+                output.append((
+                    item['id'],
+                    item['asset'],
+                    float(item['amount']),
+                    item.get('txId', '<unknown>'),
+                    None, # Confirmation
+                    None, # Tx cost
+                    item['status'] == 1, # Cancelled
+                    timestamps.to_epoch_seconds(item['applyTime'])
+                ))
         return output
 
     def cancel_order(self, base_currency_code, market_currency_code, order_id):
         exchange_name = self._make_exchange_name(base_currency_code, market_currency_code)
-        result = self._perform_request(lambda: self._handle.cancel_order(symbol=exchange_name,
-                                                                         orderId=order_id))
+        with request_priority(RequestPriority.trade):
+            self._perform_request(lambda: self._handle.cancel_order(symbol=exchange_name,
+                                                                    orderId=order_id))
+
+    def _load_ticker_snapshot(self):
+        prices = self._perform_request(
+            lambda: self._handle.get_all_tickers(),
+            BinanceWrapper.ALL_TICKERS_WEIGHT / 2,
+            'all_tickers'
+        )
+        book_tickers = self._perform_request(
+            lambda: self._handle.get_orderbook_tickers(),
+            BinanceWrapper.ALL_TICKERS_WEIGHT / 2,
+            'orderbook_tickers'
+        )
+        last_prices = {}
+        for entry in prices:
+            last_prices[entry['symbol']] = float(entry['price'])
+        states = {}
+        for entry in book_tickers:
+            symbol = entry['symbol']
+            if symbol in last_prices:
+                states[symbol] = MarketState(
+                    float(entry['askPrice']),
+                    float(entry['bidPrice']),
+                    last_prices[symbol]
+                )
+        self._ticker_snapshot.update(states)
+
+    # Keeps track of the symbols requested recently and returns true if fetching every
+    # ticker at once is cheaper (in request weight) than fetching them one at a time
+    def _should_load_all_tickers(self, exchange_name):
+        now = time.time()
+        window_start = now - BinanceWrapper.TICKER_SNAPSHOT_TTL
+        with self._ticker_requests_lock:
+            self._ticker_requests.append((now, exchange_name))
+            while self._ticker_requests[0][0] < window_start:
+                self._ticker_requests.popleft()
+            symbols = set(map(lambda i: i[1], self._ticker_requests))
+        return len(symbols) * BinanceWrapper.SINGLE_TICKER_WEIGHT >= \
+               BinanceWrapper.ALL_TICKERS_WEIGHT
 
     def get_market_state(self, base_currency_code, market_currency_code):
         exchange_name = self._make_exchange_name(base_currency_code, market_currency_code)
-        result = self._perform_request(lambda: self._handle.get_all_tickers())
-        price = None
-        for entry in result:
-            if entry['symbol'] == exchange_name:
-                price = entry['price']
-        if price is not None:
-            result = self._handle.get_orderbook_tickers()
-            for entry in result:
-                if entry['symbol'] == exchange_name:
-                    return MarketState(
-                        float(entry['askPrice']),
-                        float(entry['bidPrice']),
-                        float(price)
-                    )
-        raise ExchangeAPIException('Failed to fetch information for given market')
+        if self._market_stream is not None:
+            state = self._market_stream.get_market_state(exchange_name)
+            if state is not None:
+                return state
+            # Either this is the first lookup or the stream went quiet, use the REST API
+            # in the meantime
+            self._market_stream.subscribe(exchange_name)
+        state = self._ticker_snapshot.get_market_state(exchange_name)
+        if state is not None:
+            return state
+        if self._should_load_all_tickers(exchange_name):
+            self._load_ticker_snapshot()
+            state = self._ticker_snapshot.get_market_state(exchange_name)
+            if state is None:
+                raise ExchangeAPIException('Failed to fetch information for given market')
+            return state
+        result = self._perform_request(
+            lambda: self._handle.get_ticker(symbol=exchange_name),
+            BinanceWrapper.SINGLE_TICKER_WEIGHT,
+            ('ticker', exchange_name)
+        )
+        return MarketState(
+            float(result['askPrice']),
+            float(result['bidPrice']),
+            float(result['lastPrice'])
+        )
+
+    def _fetch_depth_snapshot(self, exchange_name):
+        with request_priority(RequestPriority.background):
+            result = self._perform_request(
+                lambda: self._handle.get_order_book(
+                    symbol=exchange_name,
+                    limit=BinanceWrapper.DEPTH_SNAPSHOT_LIMIT
+                ),
+                BinanceWrapper.DEPTH_SNAPSHOT_WEIGHT
+            )
+        parse_levels = lambda levels: map(lambda i: (float(i[0]), float(i[1])), levels)
+        return (result['lastUpdateId'], parse_levels(result['bids']), parse_levels(result['asks']))
 
     def get_orderbook(self, base_currency_code, market_currency_code):
         exchange_name = self._make_exchange_name(base_currency_code, market_currency_code)
-        result = self._perform_request(lambda: self._handle.get_order_book(symbol=exchange_name))
+        if self._market_stream is not None:
+            orderbook = self._market_stream.get_orderbook(exchange_name)
+            if orderbook is not None:
+                return orderbook.to_orderbooks()
+            self._market_stream.subscribe_depth(
+                exchange_name,
+                lambda: self._fetch_depth_snapshot(exchange_name)
+            )
+        result = self._perform_request(
+            lambda: self._handle.get_order_book(symbol=exchange_name),
+            key=('order_book', exchange_name)
+        )
         buy_orderbook = Orderbook()
         sell_orderbook = Orderbook()
-        for item in result['bids']:
-            buy_orderbook.add_order(Order(float(item[0]), float(item[1])))
-        for item in result['asks']:
-            sell_orderbook.add_order(Order(float(item[0]), float(item[1])))
+        buy_orderbook.add_levels(map(lambda i: i[:2], result['bids']))
+        sell_orderbook.add_levels(map(lambda i: i[:2], result['asks']))
         return (buy_orderbook, sell_orderbook)
 
     def get_wallets(self):
-        result = self._perform_request(lambda: self._handle.get_account())
+        result = self._perform_request(
+            lambda: self._handle.get_account(),
+            BinanceWrapper.ACCOUNT_WEIGHT
+        )
         output = []
         for data in result['balances']:
             currency = data['asset']
@@ -278,7 +579,10 @@ class BinanceWrapper(BaseExchangeWrapper):
 
     def get_wallet(self, currency_code):
         self.check_valid_currency(currency_code)
-        result = self._perform_request(lambda: self._handle.get_asset_balance(currency_code))
+        result = self._perform_request(
+            lambda: self._handle.get_asset_balance(currency_code),
+            BinanceWrapper.ACCOUNT_WEIGHT
+        )
         free = float(result['free'])
         locked = float(result['locked'])
         return Wallet(
@@ -288,38 +592,24 @@ class BinanceWrapper(BaseExchangeWrapper):
             locked
         )
 
-    def get_deposit_history(self, currency_code=None):
-        result = self._perform_request(lambda: self._handle.get_deposit_history())
-        output = []
-        for i in result['depositList']:
-            # TODO: somehow log this
-            if i["asset"] not in self._currencies:
-                continue
-            output.append(
-                Transfer(
-                    self._currencies[i["asset"]],
-                    float(i["amount"]),
-                    i["txId"],
-                    i["status"], # Status == 1 means success
-                    0,
-                    False,
-                    dateparser.parse(str(i["insertTime"])),
-                )
-            )
-        return output
-
     def buy(self, base_currency_code, market_currency_code, amount, rate):
         exchange_name = self._make_exchange_name(base_currency_code, market_currency_code)
-        result = self._perform_request(lambda: self._handle.order_limit_buy(symbol=exchange_name,
-                                                                            quantity=amount,
-                                                                            price=rate))
+        with request_priority(RequestPriority.trade):
+            result = self._perform_request(lambda: self._handle.order_limit_buy(
+                symbol=exchange_name,
+                quantity=amount,
+                price=rate
+            ))
         return result['orderId']
 
     def sell(self, base_currency_code, market_currency_code, amount, rate):
         exchange_name = self._make_exchange_name(base_currency_code, market_currency_code)
-        result = self._perform_request(lambda: self._handle.order_limit_sell(symbol=exchange_name,
-                                                                             quantity=amount,
-                                                                             price=rate))
+        with request_priority(RequestPriority.trade):
+            result = self._perform_request(lambda: self._handle.order_limit_sell(
+                symbol=exchange_name,
+                quantity=amount,
+                price=rate
+            ))
         return result['orderId']
 
     def withdraw(self, currency_code, amount, address, address_tag):
@@ -330,7 +620,8 @@ class BinanceWrapper(BaseExchangeWrapper):
         }
         if address_tag is not None:
             params['addressTag'] = address_tag
-        result = self._perform_request(lambda:self._handle.withdraw(**params))
+        with request_priority(RequestPriority.trade):
+            result = self._perform_request(lambda:self._handle.withdraw(**params))
         return result['id']
 
     def get_deposit_address(self, currency_code):
@@ -344,24 +635,22 @@ class BinanceWrapper(BaseExchangeWrapper):
             result.get('addressTag', None)
         )
 
-    def get_candles(self, base_currency_code, market_currency_code, interval, limit):
+    def _fetch_candles(self, base_currency_code, market_currency_code, interval, limit,
+                       since=None):
         exchange_name = self._make_exchange_name(base_currency_code, market_currency_code)
-        result = self._perform_request(lambda:
-            self._handle.get_klines(
-                symbol=exchange_name,
-                interval=BinanceWrapper.INTERVAL_MAP[interval],
-                limit=limit
-            )
+        params = {
+            'symbol' : exchange_name,
+            'interval' : BinanceWrapper.INTERVAL_MAP[interval],
+            'limit' : min(limit, BinanceWrapper.MAX_KLINES),
+        }
+        if since is not None:
+            params['startTime'] = int(since * 1000)
+        result = self._perform_request(lambda: self._handle.get_klines(**params))
+        output = CandleSeries()
+        # Open time (milliseconds), open, high, low, close, volume
+        output.add_candles(
+            (i[0] / 1000.0, i[1], i[2], i[3], i[4], i[5]) for i in result
         )
-        output = []
-        for i in result:
-            output.append(Candle(
-                float(i[3]), # Low
-                float(i[2]), # High
-                float(i[1]), # Open
-                float(i[4]), # Close
-                dateparser.parse(str(i[0]))
-            ))
         return output
 
     def is_order_rate_valid(self, base_currency_code, market_currency_code, rate):
@@ -419,4 +708,4 @@ class BinanceWrapper(BaseExchangeWrapper):
         return utils.round_order_value(order_filter.amount_step, amount)
 
     def order_history_needs_asset(self):
-        return True
+        return self._trade_ledger is None
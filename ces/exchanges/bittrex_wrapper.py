@@ -25,11 +25,16 @@
 # of the authors and should not be interpreted as representing official policies,
 # either expressed or implied, of the FreeBSD Project.
 
+import threading
 from bittrex.bittrex import *
 from ces.models import *
 from ces.exceptions import *
 from ces.exchanges.base_exchange_wrapper import BaseExchangeWrapper
 import ces.utils as utils
+import ces.timestamps as timestamps
+from ces.transport import get_transport
+from ces.exchanges.request_scheduler import *
+from ces.exchanges.resilience import ResilientClient
 
 class BittrexWrapper(BaseExchangeWrapper):
     ORDER_TYPE_MAPPINGS = {
@@ -44,12 +49,52 @@ class BittrexWrapper(BaseExchangeWrapper):
         CandleTicks.one_day : 'day',
     }
     CURRENCIES_WITH_ADDRESS_TAG = set(['XLM', 'XMR', 'NXT', 'XRP'])
+    MAX_REQUESTS_PER_MINUTE = 60
 
-    def __init__(self, api_key, api_secret):
+    def __init__(self, api_key, api_secret, metadata=None):
         BaseExchangeWrapper.__init__(self)
-        self._handle = Bittrex(api_key, api_secret)
-        self._handle_v2 = Bittrex(api_key, api_secret, api_version=API_V2_0)
-        self._load_markets()
+        self._scheduler = RequestScheduler(BittrexWrapper.MAX_REQUESTS_PER_MINUTE)
+        # The last exception raised while dispatching a request on each thread
+        self._dispatch_errors = threading.local()
+        # Error pages aren't valid JSON so they fail with a ValueError
+        self._handle = ResilientClient(
+            Bittrex(api_key, api_secret, dispatch=self._dispatch),
+            (ValueError,),
+            get_result_error=self._get_dispatch_error
+        )
+        self._handle_v2 = ResilientClient(
+            Bittrex(api_key, api_secret, dispatch=self._dispatch, api_version=API_V2_0),
+            (ValueError,),
+            get_result_error=self._get_dispatch_error
+        )
+        self._init_metadata(metadata)
+
+    def _dispatch(self, request_url, apisign):
+        self._dispatch_errors.last = None
+        try:
+            return self._scheduler.run(
+                lambda: get_transport().get_json(request_url, headers={ 'apisign' : apisign }),
+                1
+            )
+        except Exception as ex:
+            self._dispatch_errors.last = ex
+            raise
+
+    # The client swallows the exceptions raised while dispatching requests and returns a
+    # NO_API_RESPONSE result instead. This brings them back so they can be retried
+    def _get_dispatch_error(self, result):
+        if not isinstance(result, dict) or result.get('message') != 'NO_API_RESPONSE':
+            return None
+        error = getattr(self._dispatch_errors, 'last', None)
+        self._dispatch_errors.last = None
+        return error
+
+    def get_request_stats(self):
+        v2_stats = map(lambda i: ('v2.' + i[0], i[1]), self._handle_v2.get_request_stats())
+        return self._handle.get_request_stats() + v2_stats
+
+    def warm_connection(self):
+        get_transport().warm_in_background(BASE_URL_V1_1)
 
     def _make_exchange_name(self, base_currency_code, market_currency_code):
         if base_currency_code not in self._markets or \
@@ -58,7 +103,7 @@ class BittrexWrapper(BaseExchangeWrapper):
         return '{0}-{1}'.format(base_currency_code, market_currency_code)
 
     def _load_currencies(self):
-        result = self._handle.get_currencies()
+        result = self._perform_request(lambda: self._handle.get_currencies())
         self._check_result(result)
         for data in result['result']:
             self.add_currency(
@@ -72,10 +117,24 @@ class BittrexWrapper(BaseExchangeWrapper):
 
     def _load_markets(self):
         self._load_currencies()
-        result = self._handle.get_markets()
+        result = self._perform_request(lambda: self._handle.get_markets())
         self._check_result(result)
         for market in result['result']:
-            self.add_market(market['BaseCurrency'], market['MarketCurrency'])
+            self.add_market(
+                market['BaseCurrency'],
+                market['MarketCurrency'],
+                market['MarketName']
+            )
+
+    # The client gives up on requests that keep failing by raising whatever they failed
+    # with. Those are reported the same way as the requests the exchange rejected
+    def _perform_request(self, request_lambda):
+        try:
+            return request_lambda()
+        except ExchangeAPIException:
+            raise
+        except Exception as ex:
+            raise ExchangeAPIException(str(ex))
 
     def _check_result(self, result):
         if not result['success']:
@@ -83,26 +142,24 @@ class BittrexWrapper(BaseExchangeWrapper):
 
     def get_market_state(self, base_currency_code, market_currency_code):
         exchange_name = self._make_exchange_name(base_currency_code, market_currency_code)
-        result = self._handle.get_ticker(exchange_name)
+        result = self._perform_request(lambda: self._handle.get_ticker(exchange_name))
         self._check_result(result)
         data = result['result']
         return MarketState(data['Ask'], data['Bid'], data['Last'])
 
     def get_orderbook(self, base_currency_code, market_currency_code):
         exchange_name = self._make_exchange_name(base_currency_code, market_currency_code)
-        result = self._handle.get_orderbook(exchange_name)
+        result = self._perform_request(lambda: self._handle.get_orderbook(exchange_name))
         self._check_result(result)
         data = result['result']
         buy_orderbook = Orderbook()
         sell_orderbook = Orderbook()
-        for item in data['buy']:
-            buy_orderbook.add_order(Order(item['Rate'], item['Quantity']))
-        for item in data['sell']:
-            sell_orderbook.add_order(Order(item['Rate'], item['Quantity']))
+        buy_orderbook.add_levels(map(lambda i: (i['Rate'], i['Quantity']), data['buy']))
+        sell_orderbook.add_levels(map(lambda i: (i['Rate'], i['Quantity']), data['sell']))
         return (buy_orderbook, sell_orderbook)
 
     def get_wallets(self):
-        result = self._handle.get_balances()
+        result = self._perform_request(lambda: self._handle.get_balances())
         self._check_result(result)
         output = []
         for data in result['result']:
@@ -121,7 +178,7 @@ class BittrexWrapper(BaseExchangeWrapper):
 
     def get_wallet(self, currency_code):
         self.check_valid_currency(currency_code)
-        result = self._handle.get_balance(currency_code)
+        result = self._perform_request(lambda: self._handle.get_balance(currency_code))
         self._check_result(result)
         data = result['result']
         return Wallet(
@@ -131,72 +188,61 @@ class BittrexWrapper(BaseExchangeWrapper):
             data['Balance'] - data['Available'] + data['Pending']
         )
 
-    def get_deposit_history(self, currency_code=None):
-        result = self._handle.get_deposit_history()
-        self._check_result(result)
-        output = []
-        for data in result['result']:
-            # TODO: log this
-            if data['Currency'] not in self._currencies:
-                continue
-            try:
-                deposit = Transfer(
-                    self._currencies[data['Currency']],
-                    data['Amount'],
-                    data['TxId'],
-                    data.get('Confirmations', 0),
-                    0, # Cost,
-                    False, # Cancelled
-                    utils.datetime_from_utc_time(data['LastUpdated'])
-                )
-                output.append(deposit)
-            except Exception as ex:
-                print 'Failed to parse deposit for currency "{0}": {1}'.format(
-                    data['Currency'],
-                    ex
-                )
-        return output
-
-    def get_withdrawal_history(self, currency_code=None):
-        result = self._handle.get_withdrawal_history()
+    # The API has no way to filter by time so everything is fetched
+    def _fetch_transfers(self, transfer_type, currency_code, since=None):
+        if transfer_type == TransferType.deposit:
+            result = self._perform_request(lambda: self._handle.get_deposit_history(currency_code))
+        else:
+            result = self._perform_request(lambda: self._handle.get_withdrawal_history(currency_code))
         self._check_result(result)
         output = []
         for data in result['result']:
-            # TODO: log this
-            if data['Currency'] not in self._currencies:
-                continue
             try:
-                deposit = Transfer(
-                    self._currencies[data['Currency']],
-                    data['Amount'],
-                    data['TxId'],
-                    data.get('Confirmations', 0),
-                    data['TxCost'],
-                    data['Canceled'],
-                    utils.datetime_from_utc_time(data['Opened'])
-                )
-                output.append(deposit)
+                if transfer_type == TransferType.deposit:
+                    transfer = (
+                        data['Id'],
+                        data['Currency'],
+                        data['Amount'],
+                        data['TxId'],
+                        data.get('Confirmations', 0),
+                        0, # Cost,
+                        False, # Cancelled
+                        timestamps.to_epoch_seconds(data['LastUpdated'])
+                    )
+                else:
+                    transfer = (
+                        data['PaymentUuid'],
+                        data['Currency'],
+                        data['Amount'],
+                        data['TxId'],
+                        data.get('Confirmations', 0),
+                        data['TxCost'],
+                        data['Canceled'],
+                        timestamps.to_epoch_seconds(data['Opened'])
+                    )
+                output.append(transfer)
             except Exception as ex:
-                print 'Failed to parse withdrawal for currency "{0}": {1}'.format(
+                print 'Failed to parse {0} for currency "{1}": {2}'.format(
+                    transfer_type.name,
                     data['Currency'],
                     ex
                 )
         return output
 
     def get_open_orders(self):
-        result = self._handle.get_open_orders()
+        result = self._perform_request(lambda: self._handle.get_open_orders())
         self._check_result(result)
         output = []
         for data in result['result']:
-            base_currency, market_currency = data['Exchange'].split('-')
             # TODO: log this
-            if base_currency not in self._currencies or market_currency not in self._currencies:
+            if data['Exchange'] not in self._symbols:
                 continue
+            base_currency, market_currency = self._split_symbol(data['Exchange'])
             output.append(TradeOrder(
                 data['OrderUuid'],
                 self._currencies[base_currency],
                 self._currencies[market_currency],
-                utils.datetime_from_utc_time(data['Opened']),
+                timestamps.from_utc_time(data['Opened']),
                 None, # Date closed
                 data['Quantity'],
                 data['QuantityRemaining'],
@@ -207,20 +253,20 @@ class BittrexWrapper(BaseExchangeWrapper):
         return output
 
     def get_order_history(self, base_currency_code=None, market_currency_code=None):
-        result = self._handle.get_order_history()
+        result = self._perform_request(lambda: self._handle.get_order_history())
         self._check_result(result)
         output = []
         for data in result['result']:
-            base_currency, market_currency = data['Exchange'].split('-')
             # TODO: log this
-            if base_currency not in self._currencies or market_currency not in self._currencies:
+            if data['Exchange'] not in self._symbols:
                 continue
+            base_currency, market_currency = self._split_symbol(data['Exchange'])
             output.append(TradeOrder(
                 data['OrderUuid'],
                 self._currencies[base_currency],
                 self._currencies[market_currency],
                 None, # Date open
-                utils.datetime_from_utc_time(data['TimeStamp']),
+                timestamps.from_utc_time(data['TimeStamp']),
                 data['Quantity'],
                 data['QuantityRemaining'],
                 data['Limit'],
@@ -230,18 +276,21 @@ class BittrexWrapper(BaseExchangeWrapper):
         return output
 
     def cancel_order(self, base_currency_code, market_currency_code, order_id):
-        result = self._handle.cancel(order_id)
+        with request_priority(RequestPriority.trade):
+            result = self._perform_request(lambda: self._handle.cancel(order_id))
         self._check_result(result)
 
     def buy(self, base_currency_code, market_currency_code, amount, rate):
         exchange_name = self._make_exchange_name(base_currency_code, market_currency_code)
-        result = self._handle.buy_limit(exchange_name, amount, rate)
+        with request_priority(RequestPriority.trade):
+            result = self._perform_request(lambda: self._handle.buy_limit(exchange_name, amount, rate))
         self._check_result(result)
         return result['result']['uuid']
 
     def sell(self, base_currency_code, market_currency_code, amount, rate):
         exchange_name = self._make_exchange_name(base_currency_code, market_currency_code)
-        result = self._handle.sell_limit(exchange_name, amount, rate)
+        with request_priority(RequestPriority.trade):
+            result = self._perform_request(lambda: self._handle.sell_limit(exchange_name, amount, rate))
         self._check_result(result)
         return result['result']['uuid']
 
@@ -255,18 +304,21 @@ class BittrexWrapper(BaseExchangeWrapper):
         if address_tag is not None:
             params['paymentid'] = address_tag
         # The current API doesn't include the address tag
-        result = self._handle._api_query(
-            path_dict={ API_V1_1: '/account/withdraw' },
-            options=params,
-            protection=PROTECTION_PRV
-        )
+        with request_priority(RequestPriority.trade):
+            result = self._perform_request(lambda: self._handle._api_query(
+                path_dict={ API_V1_1: '/account/withdraw' },
+                options=params,
+                protection=PROTECTION_PRV
+            ))
         self._check_result(result)
         return result['result']['uuid']
 
     def get_deposit_address(self, currency_code):
         self.check_valid_currency(currency_code)
-        self._check_result(self._handle_v2.generate_deposit_address(currency_code))
-        result = self._handle_v2.get_deposit_address(currency_code)
+        self._check_result(self._perform_request(
+            lambda: self._handle_v2.generate_deposit_address(currency_code)
+        ))
+        result = self._perform_request(lambda: self._handle_v2.get_deposit_address(currency_code))
         if result['success'] == False:
             # Address may take a bit of time to be generated
             if result['message'] == 'ADDRESS_GENERATING':
@@ -289,20 +341,25 @@ class BittrexWrapper(BaseExchangeWrapper):
             address_tag
         )
 
-    def get_candles(self, base_currency_code, market_currency_code, interval, limit):
+    # There's no way to only fetch the newest candles so since is ignored
+    def _fetch_candles(self, base_currency_code, market_currency_code, interval, limit,
+                       since=None):
         exchange_name = self._make_exchange_name(base_currency_code, market_currency_code)
-        result = self._handle_v2.get_candles(
+        result = self._perform_request(lambda: self._handle_v2.get_candles(
             exchange_name,
             BittrexWrapper.INTERVAL_MAP[interval]
-        )
+        ))
         self._check_result(result)
-        output = []
-        for i in result['result'][-limit:]:
-            output.append(Candle(
-                i["L"],
-                i["H"],
+        output = CandleSeries()
+        output.add_candles(
+            (
+                timestamps.to_epoch_seconds(i["T"]),
                 i["O"],
+                i["H"],
+                i["L"],
                 i["C"],
-                utils.datetime_from_utc_time(i["T"])
-            ))
+                i["V"]
+            )
+            for i in result['result'][-limit:]
+        )
         return output
@@ -0,0 +1,175 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+import threading
+import time
+from collections import OrderedDict
+from ces.exchanges.request_scheduler import SingleFlight, RequestPriority, \
+                                            get_request_priority
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        # Misses caused by an entry that had expired
+        self.stale = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Calls that shared the result of an identical one that was already running
+        self.coalesced = 0
+
+# Wraps an exchange handle so the results of some of its read methods are reused for a
+# while. Placing orders, cancelling them and withdrawing drop the entries they may have
+# changed. Identical calls to read methods made while one of them is running share its
+# result. Every other attribute is taken straight from the wrapped handle.
+class CachedExchangeHandle:
+    # Method name -> how many seconds its results are valid for
+    TTLS = {
+        'get_wallet' : 10,
+        'get_wallets' : 10,
+        'get_open_orders' : 5,
+        'get_market_state' : 2,
+        'get_deposit_address' : 60 * 60,
+    }
+    # Read methods that aren't cached but whose concurrent calls are coalesced
+    COALESCED_METHODS = [
+        'get_orderbook',
+        'get_candles',
+        'get_order_history',
+        'get_deposit_history',
+        'get_withdrawal_history',
+    ]
+    MAX_ENTRIES = 256
+
+    def __init__(self, handle, ttls=TTLS, max_entries=MAX_ENTRIES,
+                 coalesced_methods=COALESCED_METHODS):
+        self._handle = handle
+        self._ttls = ttls
+        self._max_entries = max_entries
+        # (method name, args) -> (expiration time, value), least recently used first
+        self._entries = OrderedDict()
+        method_names = set(ttls.keys()) | set(coalesced_methods)
+        self._stats = dict((name, CacheStats()) for name in method_names)
+        self._flights = dict((name, SingleFlight()) for name in method_names)
+        # Method name -> how many times its entries were invalidated. Results of calls that
+        # started before an invalidation are neither stored nor shared with later calls
+        self._generations = dict((name, 0) for name in ttls.keys())
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        attribute = getattr(self._handle, name)
+        if name in self._ttls:
+            return lambda *args: self._call_cached(name, args, lambda: attribute(*args))
+        elif name in self._flights:
+            return lambda *args: self._call_coalesced(name, args, lambda: attribute(*args))
+        return attribute
+
+    # Calls with the same key made while one of them is running share its result
+    def _call_coalesced(self, name, key, functor):
+        # Trading requests are never shared, same as in the request scheduler
+        if get_request_priority() == RequestPriority.trade:
+            return functor()
+        return self._flights[name].run(key, functor)
+
+    def _call_cached(self, name, args, functor):
+        key = (name, args)
+        stats = self._stats[name]
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] > time.time():
+                # Re-inserting it makes it the most recently used one
+                self._entries[key] = entry
+                stats.hits += 1
+                return entry[1]
+            stats.misses += 1
+            if entry is not None:
+                stats.stale += 1
+            generation = self._generations[name]
+        value = self._call_coalesced(name, (generation, args), functor)
+        with self._lock:
+            # The value may be outdated if the entries were invalidated while it was fetched
+            if self._generations[name] != generation:
+                return value
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + self._ttls[name], value)
+            while len(self._entries) > self._max_entries:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._stats[evicted_key[0]].evictions += 1
+        return value
+
+    # Drops the entries for the given method. If args is not None, only the ones called
+    # with those arguments are
+    def _invalidate(self, name, args=None):
+        with self._lock:
+            if name not in self._generations:
+                return
+            self._generations[name] += 1
+            for key in filter(lambda i: i[0] == name, self._entries.keys()):
+                if args is None or key[1] == args:
+                    del self._entries[key]
+                    self._stats[name].invalidations += 1
+
+    # Any of these may have partially gone through even if they fail so the entries are
+    # always dropped
+    def _invalidate_trade(self, base_currency_code, market_currency_code):
+        self._invalidate('get_wallet', (base_currency_code, ))
+        self._invalidate('get_wallet', (market_currency_code, ))
+        self._invalidate('get_wallets')
+        self._invalidate('get_open_orders')
+
+    def buy(self, base_currency_code, market_currency_code, amount, rate):
+        try:
+            return self._handle.buy(base_currency_code, market_currency_code, amount, rate)
+        finally:
+            self._invalidate_trade(base_currency_code, market_currency_code)
+
+    def sell(self, base_currency_code, market_currency_code, amount, rate):
+        try:
+            return self._handle.sell(base_currency_code, market_currency_code, amount, rate)
+        finally:
+            self._invalidate_trade(base_currency_code, market_currency_code)
+
+    def cancel_order(self, base_currency_code, market_currency_code, order_id):
+        try:
+            return self._handle.cancel_order(base_currency_code, market_currency_code, order_id)
+        finally:
+            self._invalidate_trade(base_currency_code, market_currency_code)
+
+    def withdraw(self, currency_code, amount, address, address_tag):
+        try:
+            return self._handle.withdraw(currency_code, amount, address, address_tag)
+        finally:
+            self._invalidate('get_wallet', (currency_code, ))
+            self._invalidate('get_wallets')
+
+    # Returns (method name, CacheStats) pairs
+    def get_cache_stats(self):
+        with self._lock:
+            for name, stats in self._stats.items():
+                stats.coalesced = self._flights[name].saved_calls
+            return sorted(self._stats.items())
@@ -0,0 +1,110 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+import time
+from ces.models import CandleSeries, CANDLE_TICK_SECONDS
+
+# Keeps the closed candles of every market and interval in the local database so only
+# the ones that were created since the last request need to be fetched from the exchange.
+# The newest candle is still open so it's never stored and always fetched again
+class CandleCache:
+    MAX_CANDLES = 1000
+
+    def __init__(self, storage, exchange_name, max_candles=MAX_CANDLES):
+        self._storage = storage
+        self._exchange_name = exchange_name
+        self._max_candles = max_candles
+
+    def _load(self, market, interval):
+        output = CandleSeries()
+        output.add_candles(self._storage.load_candles(self._exchange_name, market, interval))
+        return output
+
+    # Returns how many of the newest stored candles follow each other without gaps, up to
+    # limit of them
+    @classmethod
+    def _get_contiguous_count(cls, stored, interval_seconds, limit):
+        timestamps = stored.timestamps
+        count = 1
+        while count < min(limit, len(timestamps)) and \
+              timestamps[-count] - timestamps[-count - 1] == interval_seconds:
+            count += 1
+        return count
+
+    # Returns the time since which candles have to be fetched or None if the stored ones
+    # aren't useful
+    @classmethod
+    def _get_since(cls, stored, interval_seconds, limit, now):
+        if len(stored) == 0:
+            return None
+        # Candles created after the last stored one, including the open one
+        missing = int((now - stored.timestamps[-1]) / interval_seconds)
+        if missing > limit:
+            return None
+        # The stored candles are only useful if, along with the missing ones, they cover
+        # the whole window. Older ones separated by a gap don't count
+        contiguous = cls._get_contiguous_count(stored, interval_seconds, limit - missing)
+        if contiguous + missing >= limit:
+            return stored.timestamps[-1] + interval_seconds
+        return None
+
+    # Indicates whether the last limit candles can be served mostly from stored ones
+    def has_candles(self, base_currency_code, market_currency_code, interval, limit):
+        market = '{0}/{1}'.format(base_currency_code, market_currency_code)
+        stored = self._load(market, interval.name)
+        return self._get_since(stored, CANDLE_TICK_SECONDS[interval], limit, time.time()) \
+            is not None
+
+    # Returns the last limit candles, using fetch_candles(since) to get the ones that
+    # aren't stored. since is None if everything has to be fetched
+    def get_candles(self, base_currency_code, market_currency_code, interval, limit,
+                    fetch_candles):
+        market = '{0}/{1}'.format(base_currency_code, market_currency_code)
+        interval_seconds = CANDLE_TICK_SECONDS[interval]
+        now = time.time()
+        stored = self._load(market, interval.name)
+        since = self._get_since(stored, interval_seconds, limit, now)
+        fetched = fetch_candles(since)
+        if since is None:
+            output = fetched
+        else:
+            fetched = fetched[fetched.find_timestamp(since):]
+            output = stored[:]
+            output.extend(fetched)
+        # Every candle but the last one is closed, the last one is too if its interval is over
+        closed_count = len(fetched) - 1
+        if len(fetched) > 0 and fetched.timestamps[-1] + interval_seconds <= now:
+            closed_count += 1
+        if closed_count > 0:
+            self._storage.save_candles(
+                self._exchange_name,
+                market,
+                interval.name,
+                fetched[:closed_count].get_rows(),
+                self._max_candles
+            )
+        return output[-limit:]
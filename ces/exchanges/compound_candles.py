@@ -0,0 +1,72 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+from ces.models import align_candle_series
+from ces.exceptions import *
+import ces.concurrency as concurrency
+
+def _has_market(handle, base_currency_code, market_currency_code):
+    try:
+        markets = handle.get_markets(base_currency_code)
+    except UnknownBaseCurrencyException:
+        return False
+    return any(map(lambda i: i.code == market_currency_code, markets))
+
+# Finds the market that gives the price of a currency in terms of another one. Returns
+# (base currency, market currency, inverted) where inverted means the market's price
+# has to be inverted
+def find_leg(handle, from_currency_code, to_currency_code):
+    if _has_market(handle, to_currency_code, from_currency_code):
+        return (to_currency_code, from_currency_code, False)
+    if _has_market(handle, from_currency_code, to_currency_code):
+        return (from_currency_code, to_currency_code, True)
+    raise UnknownMarketException(to_currency_code, from_currency_code)
+
+# Computes the candles for the price of the first currency in the path in terms of the
+# last one, going through every market between consecutive currencies in it. e.g. the
+# path DOGE, BTC, ETH, XLM uses the BTC/DOGE, BTC/ETH and ETH/XLM markets
+def get_compound_candles(handle, path, interval, limit):
+    legs = [find_leg(handle, path[i], path[i + 1]) for i in range(len(path) - 1)]
+    pool = concurrency.make_thread_pool(len(legs))
+    try:
+        pending = [
+            concurrency.apply_async(
+                pool,
+                handle.get_candles,
+                (base_code, market_code, interval, limit)
+            )
+            for base_code, market_code, _ in legs
+        ]
+        leg_candles = map(concurrency.get_result, pending)
+    finally:
+        pool.close()
+    output = None
+    for candles, leg in zip(align_candle_series(leg_candles), legs):
+        if leg[2]:
+            candles = candles.invert()
+        output = candles if output is None else output * candles
+    return output[-limit:]
@@ -0,0 +1,134 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+from collections import OrderedDict
+from ces.exceptions import *
+import ces.concurrency as concurrency
+
+class AggregateResult:
+    def __init__(self):
+        # List of (exchange name, item) tuples
+        self.rows = []
+        # Exchange name -> exception raised while querying it
+        self.errors = OrderedDict()
+
+# Performs read operations on every exchange at once and merges their results
+class AggregateExchangeHandle:
+    MAX_WORKERS = 4
+
+    def __init__(self, handles, max_workers=MAX_WORKERS):
+        self._handles = handles
+        self._pool = concurrency.make_thread_pool(min(max_workers, len(handles)))
+
+    def _fan_out(self, functor, returns_list=True, exchange_names=None):
+        if exchange_names is None:
+            exchange_names = self._handles.keys()
+        results, errors = concurrency.fan_out(
+            self._pool,
+            lambda name: functor(self._handles[name]),
+            exchange_names
+        )
+        output = AggregateResult()
+        output.errors = errors
+        for name, value in results.items():
+            if returns_list:
+                output.rows += map(lambda i: (name, i), value)
+            else:
+                output.rows.append((name, value))
+        return output
+
+    def _has_market(self, handle, base_currency_code, market_currency_code):
+        try:
+            markets = handle.get_markets(base_currency_code)
+        except UnknownBaseCurrencyException:
+            return False
+        return any(map(lambda i: i.code == market_currency_code, markets))
+
+    def get_wallets(self):
+        return self._fan_out(lambda handle: handle.get_wallets())
+
+    def get_open_orders(self):
+        return self._fan_out(lambda handle: handle.get_open_orders())
+
+    def get_deposit_history(self, currency_code=None):
+        def fetch(handle):
+            # Exchanges that need an asset can't list every deposit
+            if currency_code is None and handle.transfers_needs_asset():
+                return []
+            return handle.get_deposit_history(currency_code)
+        return self._fan_out(fetch)
+
+    # Only the exchanges that have this market are queried
+    def get_market_state(self, base_currency_code, market_currency_code):
+        exchange_names = filter(
+            lambda i: self._has_market(self._handles[i], base_currency_code, market_currency_code),
+            self._handles.keys()
+        )
+        if len(exchange_names) == 0:
+            raise UnknownMarketException(base_currency_code, market_currency_code)
+        return self._fan_out(
+            lambda handle: handle.get_market_state(base_currency_code, market_currency_code),
+            returns_list=False,
+            exchange_names=exchange_names
+        )
+
+# Keeps a handle for every configured exchange, one of which is the active one
+class ExchangeSession:
+    def __init__(self, handles, active_exchange_name):
+        self._handles = OrderedDict(sorted(handles.items()))
+        self.aggregate = AggregateExchangeHandle(self._handles)
+        self.set_active_exchange(active_exchange_name)
+
+    def get_exchange_names(self):
+        return self._handles.keys()
+
+    def get_handle(self, exchange_name):
+        if exchange_name not in self._handles:
+            raise UnknownExchangeException(exchange_name)
+        return self._handles[exchange_name]
+
+    def set_active_exchange(self, exchange_name):
+        self.get_handle(exchange_name)
+        self.active_exchange_name = exchange_name
+
+    def get_active_handle(self):
+        return self._handles[self.active_exchange_name]
+
+    # Returns the currency as listed by the active exchange or, if it doesn't list it, by
+    # any of the other ones
+    def get_currency(self, currency_code):
+        exchange_names = [self.active_exchange_name]
+        exchange_names += filter(lambda i: i != self.active_exchange_name, self._handles.keys())
+        for exchange_name in exchange_names:
+            try:
+                return self._handles[exchange_name].get_currency(currency_code)
+            except UnknownCurrencyException:
+                pass
+        raise UnknownCurrencyException(currency_code)
+
+    def is_multi_exchange(self):
+        return len(self._handles) > 1
@@ -25,45 +25,62 @@
 # of the authors and should not be interpreted as representing official policies,
 # either expressed or implied, of the FreeBSD Project.
 
-import dateparser
+import time
+from collections import deque
+from datetime import datetime
 from kucoin.client import Client, KucoinAPIException
+from kucoin.exceptions import KucoinRequestException
 from ces.models import *
 from ces.exceptions import *
 from ces.exchanges.base_exchange_wrapper import *
 import ces.utils as utils
+import ces.timestamps as timestamps
+import ces.concurrency as concurrency
+from ces.transport import get_transport
+from ces.exchanges.request_scheduler import *
+from ces.exchanges.resilience import ResilientClient
 
 class KucoinWrapper(BaseExchangeWrapper):
     INTERVAL_MAP = {
         CandleTicks.one_minute : Client.RESOLUTION_1MINUTE,
         CandleTicks.five_minutes : Client.RESOLUTION_5MINUTES,
+        CandleTicks.fifteen_minutes : Client.RESOLUTION_15MINUTES,
         CandleTicks.thirty_minutes : Client.RESOLUTION_30MINUTES,
         CandleTicks.one_hour : Client.RESOLUTION_1HOUR,
         CandleTicks.one_day : Client.RESOLUTION_1DAY,
-    }
-    TIME_SINCE_MAP = {
-        CandleTicks.one_minute : "1 hour ago",
-        CandleTicks.five_minutes : "5 hours ago",
-        CandleTicks.thirty_minutes : "26 hours ago",
-        CandleTicks.one_hour : "52 hours ago",
-        CandleTicks.one_day : "60 days ago",
+        CandleTicks.one_week : Client.RESOLUTION_1WEEK,
     }
     ORDER_TYPE_MAPPINGS = {
         'BUY' : OrderType.limit_buy,
         'SELL' : OrderType.limit_sell,
     }
+    PAGE_SIZE = 50
+    MAX_PAGE_REQUESTS = 4
+    # Kucoin doesn't document its limits so stay on the safe side
+    MAX_REQUESTS_PER_MINUTE = 600
 
-    def __init__(self, api_key, api_secret):
+    def __init__(self, api_key, api_secret, metadata=None, max_page_requests=MAX_PAGE_REQUESTS):
         BaseExchangeWrapper.__init__(self)
-        self._handle = Client(api_key, api_secret)
+        self._handle = ResilientClient(Client(api_key, api_secret), (KucoinRequestException,))
+        get_transport().attach(self._handle.session)
+        self._scheduler = RequestScheduler(KucoinWrapper.MAX_REQUESTS_PER_MINUTE)
         self._filters = {}
-        self._load_markets()
+        self._max_page_requests = max_page_requests
+        self._page_pool = concurrency.make_thread_pool(max_page_requests)
+        self._init_metadata(metadata)
 
     def _perform_request(self, request_lambda):
         try:
-            return request_lambda()
+            return self._scheduler.run(request_lambda, 1)
         except KucoinAPIException as ex:
             raise ExchangeAPIException('Failed to perform request: {0}'.format(ex.message))
 
+    def get_request_stats(self):
+        return self._handle.get_request_stats()
+
+    def warm_connection(self):
+        get_transport().warm_in_background(Client.API_URL)
+
     def _load_currencies(self):
         result = self._perform_request(lambda: self._handle.get_coin_list())
         for coin in result:
@@ -80,20 +97,46 @@ class KucoinWrapper(BaseExchangeWrapper):
         self._load_currencies()
         result = self._perform_request(lambda: self._handle.get_trading_symbols())
         for market in result:
-            self.add_market(market['coinTypePair'], market['coinType'])
+            self.add_market(market['coinTypePair'], market['coinType'], market['symbol'])
 
     def _make_symbol(self, base_currency_code, market_currency_code):
         return '{0}-{1}'.format(market_currency_code, base_currency_code)
 
-    def _process_paged_request(self, make_request, callback):
-        page = 1
-        limit = 50
-        data = self._perform_request(lambda: make_request(limit=limit, page=page))
-        while len(data['datas']) > 0:
-            for entry in data['datas']:
+    def _get_page_count(self, data, limit):
+        if data.get('pageNos') is not None:
+            return int(data['pageNos'])
+        elif data.get('total') is not None:
+            return (int(data['total']) + limit - 1) / limit
+        return None
+
+    # Fetches up to max_page_requests pages at once while the entries are handed to the
+    # callback in order. If should_stop returns true for an entry, nothing else is processed
+    def _process_paged_request(self, make_request, callback, should_stop=None):
+        limit = KucoinWrapper.PAGE_SIZE
+        def fetch_page(page):
+            return self._perform_request(lambda: make_request(limit=limit, page=page))
+        data = fetch_page(1)
+        # If the total is unknown, keep fetching ahead until a page comes back incomplete
+        page_count = self._get_page_count(data, limit)
+        pending = deque()
+        next_page = 2
+        while True:
+            entries = data['datas']
+            for entry in entries:
+                if should_stop is not None and should_stop(entry):
+                    return
                 callback(entry)
-            page += 1
-            data = make_request(limit=limit, page=page)
+            if len(entries) < limit:
+                return
+            while len(pending) < self._max_page_requests and \
+                  (page_count is None or next_page <= page_count):
+                pending.append(
+                    concurrency.apply_async(self._page_pool, fetch_page, (next_page,))
+                )
+                next_page += 1
+            if len(pending) == 0:
+                return
+            data = concurrency.get_result(pending.popleft())
 
     def get_market_state(self, base_currency_code, market_currency_code):
         symbol = self._make_symbol(base_currency_code, market_currency_code)
@@ -105,41 +148,41 @@ class KucoinWrapper(BaseExchangeWrapper):
         data = self._perform_request(lambda: self._handle.get_order_book(symbol))
         buy_orderbook = Orderbook()
         sell_orderbook = Orderbook()
-        for item in data['BUY']:
-            buy_orderbook.add_order(Order(item[0], item[1]))
-        for item in data['SELL']:
-            sell_orderbook.add_order(Order(item[0], item[1]))
+        buy_orderbook.add_levels(map(lambda i: i[:2], data['BUY']))
+        sell_orderbook.add_levels(map(lambda i: i[:2], data['SELL']))
         return (buy_orderbook, sell_orderbook)
 
-    def get_candles(self, base_currency_code, market_currency_code, interval, limit):
+    def _fetch_candles(self, base_currency_code, market_currency_code, interval, limit,
+                       since=None):
         symbol = self._make_symbol(base_currency_code, market_currency_code)
-        since = KucoinWrapper.TIME_SINCE_MAP[interval]
+        interval_seconds = CANDLE_TICK_SECONDS[interval]
+        if since is None:
+            since = time.time() - limit * interval_seconds
+        # The client drops the first candle it gets so start one interval earlier
+        start = datetime.utcfromtimestamp(since - interval_seconds)
+        start = start.strftime('%Y-%m-%d %H:%M:%S UTC')
         kucoin_interval = KucoinWrapper.INTERVAL_MAP[interval]
         data = self._perform_request(
-            lambda: self._handle.get_historical_klines_tv(symbol, kucoin_interval, since)
+            lambda: self._handle.get_historical_klines_tv(symbol, kucoin_interval, start)
         )
-        output = []
-        for i in data:
-            output.append(Candle(
-                i[3], # Low
-                i[2], # High
-                i[1], # Open
-                i[4], # Close
-                dateparser.parse(str(i[0]))
-            ))
+        output = CandleSeries()
+        # Time (seconds), open, high, low, close, volume
+        output.add_candles(i[:6] for i in data)
         return output
 
     def get_wallets(self):
         output = []
-        self._process_paged_request(
-            self._handle.get_all_balances,
-            lambda entry: output.append(Wallet(
-                entry['coinType'],
+        def add_wallet(entry):
+            # TODO: log this
+            if entry['coinType'] not in self._currencies:
+                return
+            output.append(Wallet(
+                self._currencies[entry['coinType']],
                 entry['balance'],
                 entry['balance'] - entry['freezeBalance'],
                 entry['freezeBalance']
             ))
-        )
+        self._process_paged_request(self._handle.get_all_balances, add_wallet)
         return output
 
     def get_wallet(self, currency_code):
@@ -152,45 +195,29 @@ class KucoinWrapper(BaseExchangeWrapper):
             data['freezeBalance']
         )
 
-    def get_deposit_history(self, currency_code):
-        request = lambda limit, page: self._handle.get_deposits(
-            currency_code,
-            limit=limit,
-            page=page
-        )
+    def _fetch_transfers(self, transfer_type, currency_code, since=None):
+        if transfer_type == TransferType.deposit:
+            endpoint = self._handle.get_deposits
+        else:
+            endpoint = self._handle.get_withdrawals
+        request = lambda limit, page: endpoint(currency_code, limit=limit, page=page)
+        is_deposit = transfer_type == TransferType.deposit
         output = []
+        # Transfers come newest first so stop as soon as one older than since shows up
         self._process_paged_request(
             request,
-            lambda entry: output.append(Transfer(
-                self._currencies[entry['coinType']],
-                entry['amount'],
-                entry['outerWalletTxid'], # is this right?
-                1 if entry['status'] == 'FINISHED' else 0,
-                0, # cost
-                entry['status'] == 'CANCEL',
-                dataparser.parse(str(entry['createdAt']))
-            ))
-        )
-        return output
-
-    def get_withdrawal_history(self, currency_code):
-        request = lambda limit, page: self._handle.get_withdrawals(
-            currency_code,
-            limit=limit,
-            page=page
-        )
-        output = []
-        self._process_paged_request(
-            request,
-            lambda entry: output.append(Transfer(
-                self._currencies[entry['coinType']],
+            lambda entry: output.append((
+                entry['oid'],
+                entry['coinType'],
                 entry['amount'],
                 entry['outerWalletTxid'], # is this right?
-                0,
-                entry['fee'],
+                int(entry['status'] == 'FINISHED') if is_deposit else 0,
+                0 if is_deposit else entry['fee'],
                 entry['status'] == 'CANCEL',
-                dataparser.parse(str(entry['createdAt']))
-            ))
+                timestamps.to_epoch_seconds(entry['createdAt'])
+            )),
+            None if since is None else \
+                lambda entry: timestamps.to_epoch_seconds(entry['createdAt']) < since
         )
         return output
 
@@ -206,7 +233,7 @@ class KucoinWrapper(BaseExchangeWrapper):
                 self._currencies[base_currency],
                 self._currencies[market_currency],
                 None, # Date open
-                dateparser.parse(str(data['createdAt'])),
+                timestamps.from_epoch(data['createdAt']),
                 data['amount'],
                 0, # Amount remaining
                 data['dealPrice'],
@@ -218,23 +245,31 @@ class KucoinWrapper(BaseExchangeWrapper):
 
     def buy(self, base_currency_code, market_currency_code, amount, rate):
         symbol = self._make_symbol(base_currency_code, market_currency_code)
-        result = self._perform_request(lambda: self._handle.create_buy_order(symbol, rate, amount))
+        with request_priority(RequestPriority.trade):
+            result = self._perform_request(
+                lambda: self._handle.create_buy_order(symbol, rate, amount)
+            )
         return result['orderOid']
 
     def sell(self, base_currency_code, market_currency_code, amount, rate):
         symbol = self._make_symbol(base_currency_code, market_currency_code)
-        result = self._perform_request(lambda: self._handle.create_sell_order(symbol, rate, amount))
+        with request_priority(RequestPriority.trade):
+            result = self._perform_request(
+                lambda: self._handle.create_sell_order(symbol, rate, amount)
+            )
         return result['orderOid']
 
     def cancel_order(self, base_currency_code, market_currency_code, order_id):
-        self._perform_request(lambda: self._handle.cancel_order(order_id, None))
+        with request_priority(RequestPriority.trade):
+            self._perform_request(lambda: self._handle.cancel_order(order_id, None))
 
     def withdraw(self, currency_code, amount, address, address_tag):
         if address_tag:
             raise ExchangeAPIException('Address tag not supported')
-        self._perform_request(
-            lambda: self._handle.create_withdrawal(currency_code, amount, address)
-        )
+        with request_priority(RequestPriority.trade):
+            self._perform_request(
+                lambda: self._handle.create_withdrawal(currency_code, amount, address)
+            )
 
     def get_deposit_address(self, currency_code):
         result = self._perform_request(lambda: self._handle.get_deposit_address(currency_code))
@@ -244,5 +279,5 @@ class KucoinWrapper(BaseExchangeWrapper):
             None
         )
 
-    def transfers_needs_asset(self):
+    def _transfer_needs_asset(self):
         return True
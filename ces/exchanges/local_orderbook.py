@@ -0,0 +1,137 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+import threading
+import time
+from ces.models import Orderbook
+
+# An order book kept up to date by applying the sequenced diffs coming from a stream on
+# top of a snapshot. Diffs that arrive while there's no snapshot are buffered. If a diff
+# doesn't follow the previous one, the book is considered out of sync and a new
+# snapshot is fetched in the background.
+#
+# fetch_snapshot must return a (last update id, bids, asks) tuple, bids and asks being
+# lists of (price, quantity). Diffs use the same format for their levels and a quantity
+# of 0 removes a level.
+class LocalOrderbook:
+    def __init__(self, fetch_snapshot):
+        self._fetch_snapshot = fetch_snapshot
+        self._lock = threading.Lock()
+        self._bids = {}
+        self._asks = {}
+        self._last_update_id = None
+        self._buffer = []
+        self._resyncing = False
+        self._last_update_time = None
+        self.resync_count = 0
+
+    def _apply_levels(self, book, levels):
+        for price, quantity in levels:
+            if quantity == 0:
+                book.pop(price, None)
+            else:
+                book[price] = quantity
+
+    # Returns false if the diff can't be applied because updates were missed
+    def _apply_diff(self, first_update_id, last_update_id, bids, asks):
+        # Older than what we've got
+        if last_update_id <= self._last_update_id:
+            return True
+        if first_update_id > self._last_update_id + 1:
+            return False
+        self._apply_levels(self._bids, bids)
+        self._apply_levels(self._asks, asks)
+        self._last_update_id = last_update_id
+        self._last_update_time = time.time()
+        return True
+
+    def _start_resync(self):
+        self._last_update_id = None
+        self._resyncing = True
+        self.resync_count += 1
+        thread = threading.Thread(target=self._resync)
+        thread.daemon = True
+        thread.start()
+
+    def _resync(self):
+        try:
+            last_update_id, bids, asks = self._fetch_snapshot()
+        except Exception:
+            # Try again once the next diff arrives
+            with self._lock:
+                self._resyncing = False
+            return
+        with self._lock:
+            self._bids = {}
+            self._asks = {}
+            self._apply_levels(self._bids, bids)
+            self._apply_levels(self._asks, asks)
+            self._last_update_id = last_update_id
+            self._last_update_time = time.time()
+            self._resyncing = False
+            buffer = self._buffer
+            self._buffer = []
+            for diff in buffer:
+                if not self._apply_diff(*diff):
+                    self._start_resync()
+                    return
+
+    def apply_diff(self, first_update_id, last_update_id, bids, asks):
+        with self._lock:
+            diff = (first_update_id, last_update_id, bids, asks)
+            if self._last_update_id is None:
+                self._buffer.append(diff)
+                if not self._resyncing:
+                    self._start_resync()
+            elif not self._apply_diff(*diff):
+                self._buffer = [diff]
+                self._start_resync()
+
+    def is_synced(self):
+        with self._lock:
+            return self._last_update_id is not None
+
+    # True if the book is synced and was updated in the last max_age seconds
+    def is_live(self, max_age):
+        with self._lock:
+            return self._last_update_id is not None and \
+                   time.time() - self._last_update_time <= max_age
+
+    # Returns the best depth bids and asks as (price, quantity) lists, best first
+    def get_levels(self, depth=None):
+        with self._lock:
+            bids = sorted(self._bids.items(), reverse=True)
+            asks = sorted(self._asks.items())
+        return (bids[:depth], asks[:depth])
+
+    def to_orderbooks(self, depth=None):
+        bids, asks = self.get_levels(depth)
+        buy_orderbook = Orderbook()
+        sell_orderbook = Orderbook()
+        buy_orderbook.add_levels(bids)
+        sell_orderbook.add_levels(asks)
+        return (buy_orderbook, sell_orderbook)
@@ -0,0 +1,180 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+import threading
+import time
+from collections import OrderedDict
+from binance.websockets import BinanceSocketManager
+from twisted.internet import reactor
+from ces.models import MarketState
+from ces.exchanges.local_orderbook import LocalOrderbook
+
+# Latest ask, bid and last prices for every symbol, as they come from the streams
+class MarketStateCache:
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def update(self, symbol, ask=None, bid=None, last=None):
+        with self._lock:
+            entry = self._states.setdefault(symbol, [None, None, None, None])
+            for index, value in enumerate([ask, bid, last]):
+                if value is not None:
+                    entry[index] = value
+            entry[3] = time.time()
+
+    # Returns None if there's no complete state for the symbol or it hasn't been
+    # updated in the last max_age seconds
+    def get(self, symbol, max_age):
+        with self._lock:
+            entry = self._states.get(symbol, None)
+            if entry is None or None in entry or time.time() - entry[3] > max_age:
+                return None
+            return MarketState(entry[0], entry[1], entry[2])
+
+    def remove(self, symbol):
+        with self._lock:
+            self._states.pop(symbol, None)
+
+# Subscribes to the ticker and book ticker streams of the symbols being used and keeps
+# their market state up to date. Order books being looked at are also kept up to date
+# using the depth diff streams. Only the most recently used symbols are kept subscribed
+class BinanceMarketStream:
+    # The ticker stream is pushed every second so anything older means it's not healthy
+    STALE_AFTER = 5
+    # The depth stream only pushes when something changed
+    DEPTH_STALE_AFTER = 30
+    MAX_SYMBOLS = 20
+    MAX_ORDERBOOKS = 5
+
+    def __init__(self, client, stream_url=None):
+        self._manager = BinanceSocketManager(client)
+        if stream_url is not None:
+            self._manager.STREAM_URL = stream_url
+        self._manager.daemon = True
+        self._cache = MarketStateCache()
+        # Symbol -> connection key, least recently used first
+        self._connections = OrderedDict()
+        # Symbol -> (LocalOrderbook, connection key), least recently used first
+        self._orderbooks = OrderedDict()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _make_connection_key(self, streams):
+        # This is what the socket manager uses for multiplexed sockets
+        return 'streams={0}'.format('/'.join(streams))
+
+    # The socket manager isn't thread safe so everything goes through the reactor's thread
+    def _start_socket(self, streams):
+        reactor.callFromThread(self._manager.start_multiplex_socket, streams, self._on_message)
+        if not self._started:
+            self._started = True
+            self._manager.start()
+
+    def _stop_socket(self, symbol, connection_key):
+        reactor.callFromThread(self._manager.stop_socket, connection_key)
+        self._cache.remove(symbol)
+
+    def _stop_depth_socket(self, symbol, entry):
+        reactor.callFromThread(self._manager.stop_socket, entry[1])
+
+    def subscribe(self, symbol):
+        with self._lock:
+            if symbol in self._connections:
+                self._connections[symbol] = self._connections.pop(symbol)
+                return
+            if len(self._connections) >= BinanceMarketStream.MAX_SYMBOLS:
+                self._stop_socket(*self._connections.popitem(last=False))
+            streams = map(lambda i: i.format(symbol.lower()), ['{0}@ticker', '{0}@bookTicker'])
+            self._connections[symbol] = self._make_connection_key(streams)
+            self._start_socket(streams)
+
+    # fetch_snapshot is used to get the initial book and whenever it gets out of sync. See
+    # LocalOrderbook
+    def subscribe_depth(self, symbol, fetch_snapshot):
+        with self._lock:
+            if symbol in self._orderbooks:
+                self._orderbooks[symbol] = self._orderbooks.pop(symbol)
+                return
+            if len(self._orderbooks) >= BinanceMarketStream.MAX_ORDERBOOKS:
+                self._stop_depth_socket(*self._orderbooks.popitem(last=False))
+            streams = ['{0}@depth'.format(symbol.lower())]
+            self._orderbooks[symbol] = (
+                LocalOrderbook(fetch_snapshot),
+                self._make_connection_key(streams)
+            )
+            self._start_socket(streams)
+
+    # Returns the order book for this symbol if it's being kept up to date, None otherwise
+    def get_orderbook(self, symbol):
+        with self._lock:
+            entry = self._orderbooks.get(symbol, None)
+        if entry is None or not entry[0].is_live(BinanceMarketStream.DEPTH_STALE_AFTER):
+            return None
+        return entry[0]
+
+    def _on_depth_update(self, data):
+        with self._lock:
+            entry = self._orderbooks.get(data['s'], None)
+        if entry is None:
+            return
+        parse_levels = lambda levels: map(lambda i: (float(i[0]), float(i[1])), levels)
+        entry[0].apply_diff(data['U'], data['u'], parse_levels(data['b']), parse_levels(data['a']))
+
+    def is_subscribed(self, symbol):
+        with self._lock:
+            return symbol in self._connections
+
+    def _on_message(self, message):
+        if message.get('e') == 'error':
+            # The socket manager gave up reconnecting. Drop everything so the next
+            # lookups subscribe again
+            self.close()
+            return
+        data = message.get('data', message)
+        if data.get('e') == 'depthUpdate':
+            self._on_depth_update(data)
+        elif data.get('e') == '24hrTicker':
+            self._cache.update(
+                data['s'],
+                ask=float(data['a']),
+                bid=float(data['b']),
+                last=float(data['c'])
+            )
+        elif 'u' in data and 's' in data:
+            self._cache.update(data['s'], ask=float(data['a']), bid=float(data['b']))
+
+    # Returns None unless the symbol's stream is healthy
+    def get_market_state(self, symbol):
+        return self._cache.get(symbol, BinanceMarketStream.STALE_AFTER)
+
+    def close(self):
+        with self._lock:
+            while len(self._connections) > 0:
+                self._stop_socket(*self._connections.popitem())
+            while len(self._orderbooks) > 0:
+                self._stop_depth_socket(*self._orderbooks.popitem())
@@ -0,0 +1,77 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+import json
+import threading
+import time
+from ces.exchanges.request_scheduler import request_priority, RequestPriority
+
+# Keeps a copy of an exchange's currencies, markets, etc in the local database so the
+# shell can start without having to fetch them from the exchange
+class ExchangeMetadataCache:
+    # Bump this whenever the format of the exported metadata changes
+    VERSION = 1
+    DEFAULT_TTL = 60 * 60 * 24
+
+    def __init__(self, storage, exchange_name, ttl=DEFAULT_TTL):
+        self._storage = storage
+        self._exchange_name = exchange_name
+        self._ttl = ttl
+
+    def load(self):
+        row = self._storage.load_exchange_metadata(self._exchange_name)
+        if row is None:
+            return None
+        version, timestamp, data = row
+        if version != ExchangeMetadataCache.VERSION or time.time() - timestamp > self._ttl:
+            return None
+        return json.loads(data)
+
+    def save(self, metadata):
+        self._storage.save_exchange_metadata(
+            self._exchange_name,
+            ExchangeMetadataCache.VERSION,
+            time.time(),
+            json.dumps(metadata)
+        )
+
+    def _revalidate(self, exchange_handle):
+        try:
+            with request_priority(RequestPriority.background):
+                exchange_handle.refresh_metadata()
+            self.save(exchange_handle.export_metadata())
+        except Exception as ex:
+            # We'll keep using the cached data and try again next time
+            pass
+
+    # Fetches the metadata from the exchange in a background thread, applying any
+    # differences to the handle and updating the cache
+    def revalidate_in_background(self, exchange_handle):
+        thread = threading.Thread(target=self._revalidate, args=(exchange_handle,))
+        thread.daemon = True
+        thread.start()
+        return thread
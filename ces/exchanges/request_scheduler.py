@@ -0,0 +1,226 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from enum import Enum
+
+RequestPriority = Enum('RequestPriority', 'trade interactive background')
+
+_context = threading.local()
+
+# Every request performed by this thread inside the "with" block uses the given priority
+@contextmanager
+def request_priority(priority):
+    previous = get_request_priority()
+    _context.priority = priority
+    try:
+        yield
+    finally:
+        _context.priority = previous
+
+def get_request_priority():
+    return getattr(_context, 'priority', RequestPriority.interactive)
+
+# The (scheduler, weight) pair of the request this thread is performing through a
+# scheduler, if any
+@contextmanager
+def scheduled_request(request):
+    previous = get_scheduled_request()
+    _context.request = request
+    try:
+        yield
+    finally:
+        _context.request = previous
+
+def get_scheduled_request():
+    return getattr(_context, 'request', None)
+
+# Accounts for performing a scheduled request again (e.g. when retrying it), waiting for
+# room for it like the first time
+def charge_scheduled_request(request):
+    if request is not None:
+        scheduler, weight = request
+        scheduler.acquire(weight)
+
+class PendingCall:
+    def __init__(self):
+        self.done = threading.Event()
+        # Whether the call finished with either a result or an exception
+        self.completed = False
+        self.result = None
+        self.error = None
+
+# Calls sharing the same key while one of them is running are coalesced: only the first one
+# is performed and the rest wait for it and get the same result or exception. If the call
+# is interrupted without finishing (e.g. ctrl+c), the ones waiting for it try again
+class SingleFlight:
+    POLL_INTERVAL = 0.1
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        # How many calls were not performed because an identical one was running
+        self.saved_calls = 0
+
+    def run(self, key, functor):
+        while True:
+            with self._lock:
+                pending = self._pending.get(key, None)
+                is_owner = pending is None
+                if is_owner:
+                    pending = PendingCall()
+                    self._pending[key] = pending
+                else:
+                    self.saved_calls += 1
+            if is_owner:
+                return self._run_owner(key, pending, functor)
+            # Wait in small steps so ctrl+c still works
+            while not pending.done.wait(SingleFlight.POLL_INTERVAL):
+                pass
+            if pending.completed:
+                break
+            with self._lock:
+                self.saved_calls -= 1
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _run_owner(self, key, pending, functor):
+        try:
+            pending.result = functor()
+            pending.completed = True
+            return pending.result
+        except Exception as ex:
+            pending.error = ex
+            pending.completed = True
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.done.set()
+
+# Keeps track of the weight of the requests performed against an exchange within a time
+# window and makes requests wait when they'd go over the exchange's limit.
+#
+# Trading requests never wait. Interactive ones can use everything but a small reserve
+# left for trading and background ones can only use part of the budget and always let
+# interactive requests go first
+class RequestScheduler:
+    TRADE_RESERVE = 0.1
+    BACKGROUND_SHARE = 0.5
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, max_weight, window=60):
+        self.max_weight = max_weight
+        self.window = window
+        self._condition = threading.Condition()
+        self._history = deque()
+        self._used_weight = 0
+        self._reported_weight = None
+        self._reported_time = None
+        self._blocked_until = None
+        self._interactive_waiters = 0
+        self._single_flight = SingleFlight()
+
+    def _expire(self, now):
+        while len(self._history) > 0 and now - self._history[0][0] >= self.window:
+            self._used_weight -= self._history.popleft()[1]
+
+    def _current_weight(self, now):
+        self._expire(now)
+        used = self._used_weight
+        # The exchange counts in fixed windows, so its number is only valid until the
+        # current one ends
+        if self._reported_time is not None and \
+           int(now / self.window) == int(self._reported_time / self.window):
+            used = max(used, self._reported_weight)
+        return used
+
+    def _weight_limit(self, priority):
+        if priority == RequestPriority.background:
+            return self.max_weight * RequestScheduler.BACKGROUND_SHARE
+        return self.max_weight * (1 - RequestScheduler.TRADE_RESERVE)
+
+    def _can_run(self, weight, priority, now):
+        if self._blocked_until is not None and now < self._blocked_until:
+            return False
+        if priority == RequestPriority.trade:
+            return True
+        if priority == RequestPriority.background and self._interactive_waiters > 0:
+            return False
+        used = self._current_weight(now)
+        # A request heavier than the limit can still go through when nothing else is running
+        return used == 0 or used + weight <= self._weight_limit(priority)
+
+    # Blocks until a request with the given weight can be performed and accounts for it
+    def acquire(self, weight, priority=None):
+        priority = priority or get_request_priority()
+        with self._condition:
+            is_waiting = False
+            try:
+                while not self._can_run(weight, priority, time.time()):
+                    if priority == RequestPriority.interactive and not is_waiting:
+                        is_waiting = True
+                        self._interactive_waiters += 1
+                    self._condition.wait(RequestScheduler.POLL_INTERVAL)
+            finally:
+                if is_waiting:
+                    self._interactive_waiters -= 1
+                    self._condition.notify_all()
+            self._history.append((time.time(), weight))
+            self._used_weight += weight
+
+    # Performs a call once there's room for it. Non trading calls sharing the same key
+    # while one of them is waiting or running are coalesced and get the same result
+    def run(self, functor, weight, key=None):
+        priority = get_request_priority()
+        def perform():
+            self.acquire(weight, priority)
+            # Retries and duplicates of the request performed by functor are charged too
+            with scheduled_request((self, weight)):
+                return functor()
+        if key is None or priority == RequestPriority.trade:
+            return perform()
+        return self._single_flight.run(key, perform)
+
+    # Used weight as reported by the exchange for its current window
+    def update_used_weight(self, weight):
+        with self._condition:
+            self._reported_weight = weight
+            self._reported_time = time.time()
+
+    # The exchange told us to stop sending requests for a while
+    def block_for(self, seconds):
+        with self._condition:
+            self._blocked_until = max(self._blocked_until or 0, time.time() + seconds)
+
+    def get_used_weight(self):
+        with self._condition:
+            return self._current_weight(time.time())
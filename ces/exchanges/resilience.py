@@ -0,0 +1,241 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+import threading
+import time
+import random
+import Queue
+import requests
+from collections import deque
+from ces.exceptions import ExchangeAPIException
+from ces.exchanges.request_scheduler import request_priority, get_request_priority, \
+                                            RequestPriority, scheduled_request, \
+                                            get_scheduled_request, charge_scheduled_request
+
+# Connection problems and server side errors are worth retrying, anything else (e.g.
+# invalid parameters) will fail again
+def is_transient_error(ex):
+    if isinstance(ex, (requests.ConnectionError, requests.Timeout)):
+        return True
+    status_code = getattr(ex, 'status_code', None)
+    return status_code is not None and status_code >= 500
+
+class EndpointStats:
+    LATENCY_SAMPLES = 100
+
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.rejected = 0
+        self.consecutive_failures = 0
+        self.open_until = None
+        self.latencies = deque(maxlen=EndpointStats.LATENCY_SAMPLES)
+
+    def latency_percentile(self, percentile, min_samples):
+        if len(self.latencies) < min_samples:
+            return None
+        values = sorted(self.latencies)
+        return values[min(len(values) - 1, int(len(values) * percentile))]
+
+    def is_circuit_open(self, now=None):
+        return self.open_until is not None and (now or time.time()) < self.open_until
+
+# Wraps an exchange's client so every method called on it is retried using jittered
+# exponential backoff when it fails due to a transient error. Once a method has been
+# slower than most of its previous calls, a second identical request is sent and
+# whichever finishes first is used. Methods that keep failing are rejected right away
+# for a while.
+#
+# Requests performed using the trade priority are never retried nor hedged as they're
+# not idempotent. When the client is used within a request scheduler's call, every retry
+# and hedge is charged to the scheduler like the original request.
+#
+# Clients that report failures as results rather than exceptions can provide
+# get_result_error, which returns the exception a result stands for or None.
+class ResilientClient:
+    MAX_RETRIES = 2
+    BASE_DELAY = 0.25
+    MAX_DELAY = 2
+    HEDGE_PERCENTILE = 0.95
+    HEDGE_MIN_SAMPLES = 20
+    FAILURE_THRESHOLD = 5
+    COOLDOWN = 30
+
+    def __init__(self, handle, transient_exceptions=(), max_retries=MAX_RETRIES, hedge=True,
+                 get_result_error=None):
+        self._handle = handle
+        self._get_result_error = get_result_error
+        self._transient_exceptions = transient_exceptions
+        self._max_retries = max_retries
+        self._hedge = hedge
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        attribute = getattr(self._handle, name)
+        if not callable(attribute):
+            return attribute
+        return lambda *args, **kwargs: self._call_endpoint(
+            name,
+            lambda: self._check_result(attribute(*args, **kwargs))
+        )
+
+    def _check_result(self, result):
+        if self._get_result_error is not None:
+            error = self._get_result_error(result)
+            if error is not None:
+                raise error
+        return result
+
+    def _is_transient(self, ex):
+        return isinstance(ex, self._transient_exceptions) or is_transient_error(ex)
+
+    def _get_stats(self, endpoint):
+        with self._lock:
+            if endpoint not in self._stats:
+                self._stats[endpoint] = EndpointStats()
+            stats = self._stats[endpoint]
+            stats.calls += 1
+            if stats.is_circuit_open():
+                stats.rejected += 1
+                raise ExchangeAPIException(
+                    'Not calling {0} for {1:.0f} seconds after repeated failures'.format(
+                        endpoint,
+                        stats.open_until - time.time()
+                    )
+                )
+            return stats
+
+    def _record_success(self, stats, latency):
+        with self._lock:
+            stats.consecutive_failures = 0
+            stats.open_until = None
+            stats.latencies.append(latency)
+
+    # Returns true if the circuit was opened
+    def _record_failure(self, stats):
+        with self._lock:
+            stats.consecutive_failures += 1
+            # After the cooldown expires a single failure is enough to open it again
+            if stats.consecutive_failures >= ResilientClient.FAILURE_THRESHOLD:
+                stats.open_until = time.time() + ResilientClient.COOLDOWN
+                return True
+            return False
+
+    def _get_backoff(self, attempt):
+        delay = min(ResilientClient.MAX_DELAY, ResilientClient.BASE_DELAY * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _call_endpoint(self, endpoint, functor):
+        if get_request_priority() == RequestPriority.trade:
+            return functor()
+        stats = self._get_stats(endpoint)
+        request = get_scheduled_request()
+        attempt = 0
+        while True:
+            try:
+                return self._call_hedged(stats, functor, request)
+            except Exception as ex:
+                if not self._is_transient(ex):
+                    raise
+                if self._record_failure(stats) or attempt == self._max_retries:
+                    raise
+            with self._lock:
+                stats.retries += 1
+            time.sleep(self._get_backoff(attempt))
+            charge_scheduled_request(request)
+            attempt += 1
+
+    def _call_hedged(self, stats, functor, request=None):
+        threshold = None
+        if self._hedge:
+            with self._lock:
+                threshold = stats.latency_percentile(
+                    ResilientClient.HEDGE_PERCENTILE,
+                    ResilientClient.HEDGE_MIN_SAMPLES
+                )
+        if threshold is None:
+            start_time = time.time()
+            output = functor()
+            self._record_success(stats, time.time() - start_time)
+            return output
+        priority = get_request_priority()
+        results = Queue.Queue()
+        def run(is_hedge):
+            try:
+                with request_priority(priority), scheduled_request(request):
+                    if is_hedge:
+                        charge_scheduled_request(request)
+                    start_time = time.time()
+                    output = functor()
+                results.put((is_hedge, None, output, time.time() - start_time))
+            except Exception as ex:
+                results.put((is_hedge, ex, None, None))
+        self._start_thread(run, False)
+        pending = 1
+        try:
+            result = results.get(timeout=threshold)
+        except Queue.Empty:
+            result = None
+            self._start_thread(run, True)
+            pending += 1
+            with self._lock:
+                stats.hedges += 1
+        error = None
+        while True:
+            # Wait in small steps so ctrl+c still works
+            while result is None:
+                try:
+                    result = results.get(timeout=0.1)
+                except Queue.Empty:
+                    pass
+            pending -= 1
+            is_hedge, ex, output, latency = result
+            if ex is None:
+                self._record_success(stats, latency)
+                if is_hedge:
+                    with self._lock:
+                        stats.hedge_wins += 1
+                return output
+            error = error or ex
+            if pending == 0:
+                raise error
+            result = None
+
+    def _start_thread(self, functor, *args):
+        thread = threading.Thread(target=functor, args=args)
+        thread.daemon = True
+        thread.start()
+
+    # Returns (endpoint, EndpointStats) pairs sorted by endpoint
+    def get_request_stats(self):
+        with self._lock:
+            return sorted(self._stats.items())
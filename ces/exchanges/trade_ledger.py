@@ -0,0 +1,136 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+import threading
+import time
+import ces.concurrency as concurrency
+from ces.exchanges.request_scheduler import *
+
+# Keeps every trade made in an exchange in the local database. Syncing only fetches the
+# trades made after the last stored one for each symbol
+class TradeLedger:
+    MAX_WORKERS = 4
+    # How many trades are fetched on every request
+    PAGE_SIZE = 1000
+    # Symbols without trades are only synced again after this many seconds
+    RECHECK_INTERVAL = 60 * 60 * 24
+    # Background syncs are skipped if the last sync started less than this many seconds ago
+    MIN_SYNC_INTERVAL = 60
+
+    def __init__(self, storage, exchange_name, max_workers=MAX_WORKERS,
+                 min_sync_interval=MIN_SYNC_INTERVAL):
+        self._storage = storage
+        self._exchange_name = exchange_name
+        self._max_workers = max_workers
+        self._min_sync_interval = min_sync_interval
+        self._sync_lock = threading.Lock()
+        self._sync_thread = None
+        self._last_sync_time = None
+
+    def get_cursors(self):
+        return self._storage.load_trade_cursors(self._exchange_name)
+
+    # Returns the given symbols that weren't synced in the last RECHECK_INTERVAL seconds
+    def get_unchecked_symbols(self, symbols):
+        checks = self._storage.load_trade_checks(self._exchange_name)
+        now = time.time()
+        return filter(
+            lambda i: now - checks.get(i, 0) >= TradeLedger.RECHECK_INTERVAL,
+            symbols
+        )
+
+    # Returns (symbol, trade id, order id, timestamp, price, quantity, is buyer) tuples
+    def get_trades(self):
+        return self._storage.load_trades(self._exchange_name)
+
+    def _sync_symbol(self, symbol, cursor, fetch_trades):
+        check_time = time.time()
+        while True:
+            # Trade ids start at 0
+            from_id = 0 if cursor is None else cursor + 1
+            trades = fetch_trades(symbol, from_id, TradeLedger.PAGE_SIZE)
+            if len(trades) > 0:
+                self._storage.save_trades(self._exchange_name, symbol, trades)
+                cursor = max(map(lambda i: i[0], trades))
+            if len(trades) < TradeLedger.PAGE_SIZE:
+                break
+        self._storage.save_trade_check(self._exchange_name, symbol, check_time)
+
+    # Fetches the new trades for every symbol concurrently. fetch_trades(symbol, from_id,
+    # limit) must return (trade id, order id, timestamp, price, quantity, is buyer)
+    # tuples. Returns a dict from symbol to the exception raised while syncing it
+    def sync(self, symbols, fetch_trades):
+        self._last_sync_time = time.time()
+        if len(symbols) == 0:
+            return {}
+        cursors = self.get_cursors()
+        pool = concurrency.make_thread_pool(min(self._max_workers, len(symbols)))
+        try:
+            _, errors = concurrency.fan_out(
+                pool,
+                lambda symbol: self._sync_symbol(symbol, cursors.get(symbol), fetch_trades),
+                symbols
+            )
+        finally:
+            pool.close()
+        return errors
+
+    def _sync_in_background(self, get_symbols, fetch_trades):
+        try:
+            with request_priority(RequestPriority.background):
+                self.sync(get_symbols(), fetch_trades)
+        except Exception as ex:
+            # Whatever is stored is still valid, we'll try again next time
+            pass
+        finally:
+            self._sync_lock.release()
+
+    # Syncs in a background thread unless a sync is already running or the last one
+    # started less than min_sync_interval seconds ago. Returns whether one was started
+    def sync_in_background(self, get_symbols, fetch_trades):
+        if not self._sync_lock.acquire(False):
+            return False
+        last_sync_time = self._last_sync_time
+        if last_sync_time is not None and \
+                time.time() - last_sync_time < self._min_sync_interval:
+            self._sync_lock.release()
+            return False
+        self._last_sync_time = time.time()
+        thread = threading.Thread(
+            target=self._sync_in_background,
+            args=(get_symbols, fetch_trades)
+        )
+        thread.daemon = True
+        thread.start()
+        self._sync_thread = thread
+        return True
+
+    # Blocks until the last sync started in the background is done
+    def wait_for_background_sync(self):
+        thread = self._sync_thread
+        if thread is not None:
+            thread.join()
@@ -0,0 +1,95 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+import ces.concurrency as concurrency
+
+# Keeps every deposit and withdrawal made in an exchange in the local database. Syncing only
+# fetches the transfers made since the newest stored one
+class TransferLedger:
+    MAX_WORKERS = 4
+    # Recent transfers may still change (e.g. get confirmed or cancelled) so they're fetched
+    # again on every sync
+    RESYNC_SECONDS = 60 * 60 * 24
+
+    def __init__(self, storage, exchange_name, max_workers=MAX_WORKERS):
+        self._storage = storage
+        self._exchange_name = exchange_name
+        self._max_workers = max_workers
+
+    # Returns a dict from currency code to the newest transfer timestamp stored for it
+    def get_cursors(self, transfer_type):
+        return self._storage.load_transfer_cursors(self._exchange_name, transfer_type.name)
+
+    # Returns (transfer id, currency code, amount, transaction id, confirmations, cost,
+    # cancelled, timestamp) tuples sorted by timestamp
+    def get_transfers(self, transfer_type, currency_code=None):
+        return self._storage.load_transfers(
+            self._exchange_name,
+            transfer_type.name,
+            currency_code
+        )
+
+    def _get_since(self, cursor):
+        if cursor is None:
+            return None
+        return cursor - TransferLedger.RESYNC_SECONDS
+
+    def _sync_currency(self, transfer_type, currency_code, since, fetch_transfers):
+        transfers = fetch_transfers(transfer_type, currency_code, since)
+        if len(transfers) > 0:
+            self._storage.save_transfers(self._exchange_name, transfer_type.name, transfers)
+
+    # Fetches the new transfers of the given type. fetch_transfers(transfer_type,
+    # currency_code, since) must return tuples in the same format get_transfers does. If
+    # currency_codes is None, every currency is fetched at once. Otherwise every currency is
+    # fetched concurrently. Returns a dict from currency code (None when fetching all of
+    # them) to the exception raised while syncing it
+    def sync(self, transfer_type, currency_codes, fetch_transfers):
+        cursors = self.get_cursors(transfer_type)
+        if currency_codes is None:
+            since = self._get_since(max(cursors.values()) if len(cursors) > 0 else None)
+            try:
+                self._sync_currency(transfer_type, None, since, fetch_transfers)
+                return {}
+            except Exception as ex:
+                return { None : ex }
+        if len(currency_codes) == 0:
+            return {}
+        pool = concurrency.make_thread_pool(min(self._max_workers, len(currency_codes)))
+        try:
+            _, errors = concurrency.fan_out(
+                pool,
+                lambda currency_code: self._sync_currency(
+                    transfer_type,
+                    currency_code,
+                    self._get_since(cursors.get(currency_code)),
+                    fetch_transfers
+                ),
+                currency_codes
+            )
+        finally:
+            pool.close()
+        return errors
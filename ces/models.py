@@ -25,6 +25,9 @@
 # of the authors and should not be interpreted as representing official policies,
 # either expressed or implied, of the FreeBSD Project.
 
+from datetime import datetime
+from array import array
+from bisect import bisect_left
 from enum import Enum
 
 class Currency:
@@ -56,12 +59,94 @@ class Order:
         self.rate = rate
         self.quantity = quantity
 
+# One side of an order book. Levels have to be added best first (e.g. highest bid first).
+# Prices and quantities are kept in parallel arrays along with the cumulative quantity
+# and notional value up to each level so depth queries don't need to walk the book
 class Orderbook:
     def __init__(self):
-        self.orders = []
+        self.prices = array('d')
+        self.quantities = array('d')
+        self.cumulative_quantities = array('d')
+        self.cumulative_notionals = array('d')
+        self._orders = None
+
+    def add_level(self, rate, quantity):
+        self.add_levels([(rate, quantity)])
+
+    # Adds every (rate, quantity) in the given iterable
+    def add_levels(self, levels):
+        total_quantity = 0.0
+        total_notional = 0.0
+        if len(self.prices) > 0:
+            total_quantity = self.cumulative_quantities[-1]
+            total_notional = self.cumulative_notionals[-1]
+        prices = []
+        quantities = []
+        cumulative_quantities = []
+        cumulative_notionals = []
+        for rate, quantity in levels:
+            rate = float(rate)
+            quantity = float(quantity)
+            total_quantity += quantity
+            total_notional += rate * quantity
+            prices.append(rate)
+            quantities.append(quantity)
+            cumulative_quantities.append(total_quantity)
+            cumulative_notionals.append(total_notional)
+        self.prices.extend(prices)
+        self.quantities.extend(quantities)
+        self.cumulative_quantities.extend(cumulative_quantities)
+        self.cumulative_notionals.extend(cumulative_notionals)
+        self._orders = None
 
     def add_order(self, order):
-        self.orders.append(order)
+        self.add_level(order.rate, order.quantity)
+
+    # The levels as Order objects. These are only created when asked for
+    @property
+    def orders(self):
+        if self._orders is None:
+            self._orders = map(Order, self.prices, self.quantities)
+        return self._orders
+
+    def __len__(self):
+        return len(self.prices)
+
+    # Returns the (average price, worst price) tuple for an order that takes the given
+    # quantity from this side of the book or None if there isn't enough of it
+    def get_fill_price(self, quantity):
+        if quantity <= 0 or len(self.prices) == 0 or \
+           quantity > self.cumulative_quantities[-1]:
+            return None
+        index = bisect_left(self.cumulative_quantities, quantity)
+        notional = (quantity - self._get_cumulative(self.cumulative_quantities, index)) * \
+                   self.prices[index]
+        notional += self._get_cumulative(self.cumulative_notionals, index)
+        return (notional / quantity, self.prices[index])
+
+    # Returns the total quantity in the levels that are at most percentage % away from
+    # the given mid price
+    def get_quantity_within(self, mid_price, percentage):
+        max_distance = mid_price * percentage / 100.0
+        # Prices move away from the mid price as we go deeper into the book
+        low = 0
+        high = len(self.prices)
+        while low < high:
+            middle = (low + high) / 2
+            if abs(self.prices[middle] - mid_price) <= max_distance:
+                low = middle + 1
+            else:
+                high = middle
+        return self._get_cumulative(self.cumulative_quantities, low)
+
+    # The cumulative value for every level before the given index
+    def _get_cumulative(self, values, index):
+        return values[index - 1] if index > 0 else 0.0
+
+def get_mid_price(buy_orderbook, sell_orderbook):
+    if len(buy_orderbook) == 0 or len(sell_orderbook) == 0:
+        return None
+    return (buy_orderbook.prices[0] + sell_orderbook.prices[0]) / 2
 
 class Wallet:
     def __init__(self, currency, balance, available, pending):
@@ -80,6 +165,8 @@ class Transfer:
         self.cancelled = cancelled
         self.timestamp = timestamp
 
+TransferType = Enum('TransferType', 'deposit withdrawal')
+
 OrderType = Enum('OrderType', 'limit_sell limit_buy')
 
 class TradeOrder:
@@ -109,19 +196,252 @@ class CryptoAddress:
         self.address_tag = address_tag
 
 class Candle:
-    def __init__(self, lowest_price, highest_price, open_price, close_price, timestamp):
+    def __init__(self, lowest_price, highest_price, open_price, close_price, timestamp,
+                 volume=0):
         self.lowest_price = lowest_price
         self.highest_price = highest_price
         self.open_price = open_price
         self.close_price = close_price
         self.timestamp = timestamp
+        self.volume = volume
+
+# A sequence of candles stored as columns. Timestamps are seconds since the epoch.
+#
+# Indexing it returns a Candle (using a local datetime as timestamp) so it can be used as
+# a list of them, while slicing, arithmetic and normalizing return new series
+class CandleSeries:
+    PRICE_COLUMNS = ['open_prices', 'highest_prices', 'lowest_prices', 'close_prices']
+    COLUMNS = ['timestamps'] + PRICE_COLUMNS + ['volumes']
+
+    def __init__(self, timestamps=(), open_prices=(), highest_prices=(), lowest_prices=(),
+                 close_prices=(), volumes=None):
+        self.timestamps = array('d', timestamps)
+        self.open_prices = array('d', open_prices)
+        self.highest_prices = array('d', highest_prices)
+        self.lowest_prices = array('d', lowest_prices)
+        self.close_prices = array('d', close_prices)
+        if volumes is None:
+            volumes = [0.0] * len(self.timestamps)
+        self.volumes = array('d', volumes)
+
+    # Adds every (timestamp, open, high, low, close, volume) in the given iterable
+    def add_candles(self, rows):
+        columns = map(lambda i: getattr(self, i), CandleSeries.COLUMNS)
+        for row in rows:
+            for column, value in zip(columns, row):
+                column.append(float(value))
+
+    def add_candle(self, timestamp, open_price, highest_price, lowest_price, close_price,
+                   volume=0):
+        self.add_candles([
+            (timestamp, open_price, highest_price, lowest_price, close_price, volume)
+        ])
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._map_columns(lambda column: column[index])
+        return Candle(
+            self.lowest_prices[index],
+            self.highest_prices[index],
+            self.open_prices[index],
+            self.close_prices[index],
+            self.get_datetime(index),
+            self.volumes[index]
+        )
+
+    # Python 2 uses this one for candles[a:b]
+    def __getslice__(self, start, end):
+        return self.__getitem__(slice(start, end))
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def get_datetime(self, index):
+        return datetime.fromtimestamp(self.timestamps[index])
+
+    # Returns the index of the first candle at or after the given timestamp
+    def find_timestamp(self, timestamp):
+        return bisect_left(self.timestamps, timestamp)
+
+    # Appends every candle in the given series
+    def extend(self, other):
+        for name in CandleSeries.COLUMNS:
+            getattr(self, name).extend(getattr(other, name))
+
+    # Merges every size consecutive candles into a single one, the last one ending at the
+    # newest candle. Merged candles use the first timestamp and open price, the last close
+    # price, the extreme lowest and highest prices and the total volume
+    def group(self, size):
+        if size <= 1:
+            return self[:]
+        count = len(self)
+        first = count % size
+        bounds = [(i, i + size) for i in xrange(first, count, size)]
+        if first > 0:
+            bounds.insert(0, (0, first))
+        return self._aggregate(bounds, [self.timestamps[i[0]] for i in bounds])
+
+    # Merges the candles into ones of the given interval. Each of them starts at a multiple
+    # of the interval (weeks start on mondays) and is built out of the candles that start
+    # within it
+    def resample(self, interval):
+        seconds = CANDLE_TICK_SECONDS[interval]
+        origin = WEEK_ORIGIN if interval == CandleTicks.one_week else 0
+        buckets = [int((i - origin) // seconds) for i in self.timestamps]
+        bounds = []
+        begin = 0
+        for i in xrange(1, len(buckets) + 1):
+            if i == len(buckets) or buckets[i] != buckets[begin]:
+                bounds.append((begin, i))
+                begin = i
+        return self._aggregate(
+            bounds,
+            [origin + buckets[i[0]] * seconds for i in bounds]
+        )
+
+    # Builds a candle for every (begin, end) range using the given timestamps
+    def _aggregate(self, bounds, timestamps):
+        output = CandleSeries()
+        output.add_candles(
+            (
+                timestamp,
+                self.open_prices[begin],
+                max(self.highest_prices[begin:end]),
+                min(self.lowest_prices[begin:end]),
+                self.close_prices[end - 1],
+                sum(self.volumes[begin:end])
+            )
+            for timestamp, (begin, end) in zip(timestamps, bounds)
+        )
+        return output
+
+    # Returns (timestamp, open, high, low, close, volume) tuples
+    def get_rows(self):
+        return zip(*map(lambda i: getattr(self, i), CandleSeries.COLUMNS))
+
+    # Builds a new series by applying functor to every column
+    def _map_columns(self, functor, columns=COLUMNS):
+        output = CandleSeries()
+        for name in CandleSeries.COLUMNS:
+            value = getattr(self, name)
+            if name in columns:
+                value = functor(value)
+            setattr(output, name, array('d', value))
+        return output
+
+    def get_lowest_price(self):
+        return min(self.lowest_prices) if len(self) > 0 else None
+
+    def get_highest_price(self):
+        return max(self.highest_prices) if len(self) > 0 else None
+
+    # Returns a series where prices are scaled so lowest is 0 and highest is 1
+    def normalize(self, lowest, highest):
+        delta = float(highest - lowest) or 1.0
+        return self._map_columns(
+            lambda column: [(i - lowest) / delta for i in column],
+            CandleSeries.PRICE_COLUMNS
+        )
+
+    # Returns the price of the quote currency in terms of the base one. The lowest price
+    # becomes the highest one and vice versa
+    def invert(self):
+        output = self._map_columns(
+            lambda column: [1.0 / i for i in column],
+            CandleSeries.PRICE_COLUMNS
+        )
+        output.lowest_prices, output.highest_prices = \
+            output.highest_prices, output.lowest_prices
+        return output
+
+    # Returns a series with a candle for every given timestamp. The ones that are missing
+    # (e.g. nothing was traded during that interval) are flat candles at the close price
+    # of the previous one and without volume
+    def reindex(self, timestamps):
+        indexes = dict((timestamp, i) for i, timestamp in enumerate(self.timestamps))
+        rows = []
+        for timestamp in timestamps:
+            index = indexes.get(timestamp)
+            if index is not None:
+                rows.append((
+                    timestamp,
+                    self.open_prices[index],
+                    self.highest_prices[index],
+                    self.lowest_prices[index],
+                    self.close_prices[index],
+                    self.volumes[index]
+                ))
+                continue
+            index = self.find_timestamp(timestamp) - 1
+            if index < 0:
+                raise ValueError('No candles before {0}'.format(timestamp))
+            price = self.close_prices[index]
+            rows.append((timestamp, price, price, price, price, 0))
+        output = CandleSeries()
+        output.add_candles(rows)
+        return output
+
+    # Applies an operation to every price either using another series with the same
+    # timestamps (price by price) or a number
+    def _apply_operation(self, other, operation):
+        if not isinstance(other, CandleSeries):
+            return self._map_columns(
+                lambda column: [operation(i, other) for i in column],
+                CandleSeries.PRICE_COLUMNS
+            )
+        if self.timestamps != other.timestamps:
+            raise ValueError('Candle series are not aligned')
+        output = self[:]
+        for name in CandleSeries.PRICE_COLUMNS:
+            setattr(output, name, array('d', map(operation, getattr(self, name),
+                                                 getattr(other, name))))
+        return output
+
+    def __mul__(self, other):
+        return self._apply_operation(other, lambda a, b: a * b)
+
+    def __div__(self, other):
+        return self._apply_operation(other, lambda a, b: a / b)
+
+    __truediv__ = __div__
 
 class AddressBookEntry:
     def __init__(self, name, address):
         self.name = name
         self.address = address
 
+# Reindexes every series using the timestamps in any of them, starting at the first one
+# every series has data for
+def align_candle_series(series_list):
+    if any(map(lambda i: len(i) == 0, series_list)):
+        return map(lambda i: CandleSeries(), series_list)
+    start = max(map(lambda i: i.timestamps[0], series_list))
+    timestamps = set()
+    for series in series_list:
+        timestamps.update(series.timestamps[series.find_timestamp(start):])
+    timestamps = sorted(timestamps)
+    return map(lambda i: i.reindex(timestamps), series_list)
+
 CandleTicks = Enum(
     'CandleTicks',
-    'one_minute five_minutes thirty_minutes one_hour one_day'
+    'one_minute five_minutes thirty_minutes one_hour one_day fifteen_minutes four_hours ' \
+    'one_week'
 )
+
+CANDLE_TICK_SECONDS = {
+    CandleTicks.one_minute : 60,
+    CandleTicks.five_minutes : 60 * 5,
+    CandleTicks.fifteen_minutes : 60 * 15,
+    CandleTicks.thirty_minutes : 60 * 30,
+    CandleTicks.one_hour : 60 * 60,
+    CandleTicks.four_hours : 60 * 60 * 4,
+    CandleTicks.one_day : 60 * 60 * 24,
+    CandleTicks.one_week : 60 * 60 * 24 * 7,
+}
+
+# Monday, January 5th 1970
+WEEK_ORIGIN = 60 * 60 * 24 * 4
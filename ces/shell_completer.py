@@ -25,6 +25,8 @@
 # of the authors and should not be interpreted as representing official policies,
 # either expressed or implied, of the FreeBSD Project.
 
+from exchanges.request_scheduler import request_priority, RequestPriority
+
 try:
     import readline
 except ImportError: #Window systems don't have GNU readline
@@ -92,7 +94,10 @@ class ShellCompleter:
                 if index == -1:
                     index = 0
                 line = line[:index]
-            self._setup_completion(text, command.generate_parameters(self._core, line.strip()))
+            # Completing shouldn't take request capacity away from actual commands
+            with request_priority(RequestPriority.background):
+                options = command.generate_parameters(self._core, line.strip())
+            self._setup_completion(text, options)
         return self._get_completion(text, state)
 
     def _setup_completion(self, text, options):
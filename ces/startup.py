@@ -0,0 +1,141 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+import threading
+import time
+from collections import OrderedDict
+from terminaltables import AsciiTable
+from exceptions import StartupException
+from transport import get_transport
+
+# Downloads a JSON document once and hands the same result (or error) to every
+# caller, even if they ask for it concurrently
+class SharedDownload:
+    def __init__(self, url):
+        self.url = url
+        self._lock = threading.Lock()
+        self._fetched = False
+        self._data = None
+        self._error = None
+
+    def get(self):
+        with self._lock:
+            if not self._fetched:
+                try:
+                    self._data = get_transport().get_json(self.url)
+                except Exception as ex:
+                    self._error = ex
+                self._fetched = True
+        if self._error is not None:
+            raise self._error
+        return self._data
+
+class StartupStage:
+    def __init__(self, name, functor, dependencies, optional):
+        self.name = name
+        self.functor = functor
+        self.dependencies = dependencies
+        self.optional = optional
+        self.result = None
+        self.error = None
+        self.skipped = False
+        self.start_time = None
+        self.end_time = None
+        self.done = threading.Event()
+
+# Runs a set of stages, each of them as soon as the stages it depends on are done. A
+# stage's functor is called using the results of its dependencies as parameters.
+#
+# Optional stages can fail without aborting the startup. The stages that depend on them
+# still run and get None as their result
+class StartupPipeline:
+    def __init__(self):
+        self._stages = OrderedDict()
+        self._start_time = None
+        self._end_time = None
+
+    def add_stage(self, name, functor, dependencies=None, optional=False):
+        dependencies = dependencies or []
+        for dependency in dependencies:
+            if dependency not in self._stages:
+                raise ValueError('Unknown stage "{0}"'.format(dependency))
+        self._stages[name] = StartupStage(name, functor, dependencies, optional)
+
+    def _run_stage(self, stage):
+        dependencies = [self._stages[name] for name in stage.dependencies]
+        for dependency in dependencies:
+            dependency.done.wait()
+        if any(map(lambda i: (i.error is not None and not i.optional) or i.skipped,
+                   dependencies)):
+            stage.skipped = True
+        else:
+            stage.start_time = time.time()
+            try:
+                stage.result = stage.functor(*map(lambda i: i.result, dependencies))
+            except Exception as ex:
+                stage.error = ex
+            stage.end_time = time.time()
+        stage.done.set()
+
+    def run(self):
+        self._start_time = time.time()
+        threads = []
+        for stage in self._stages.values():
+            thread = threading.Thread(target=self._run_stage, args=(stage,))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            # Join using a timeout so ctrl+c is still delivered to the main thread
+            while thread.is_alive():
+                thread.join(0.1)
+        self._end_time = time.time()
+        for stage in self._stages.values():
+            if stage.error is not None and not stage.optional:
+                raise StartupException(stage.name, stage.error)
+        return dict(map(lambda i: (i.name, i.result), self._stages.values()))
+
+    def get_result(self, name):
+        return self._stages[name].result
+
+    # Returns the exception raised by the given stage, if any
+    def get_error(self, name):
+        return self._stages[name].error
+
+    def format_profile(self):
+        data = [['Phase', 'Start (s)', 'Duration (s)']]
+        for stage in self._stages.values():
+            if stage.start_time is None:
+                continue
+            data.append([
+                stage.name,
+                '{0:.3f}'.format(stage.start_time - self._start_time),
+                '{0:.3f}'.format(stage.end_time - stage.start_time)
+            ])
+        data.append(['total', '', '{0:.3f}'.format(self._end_time - self._start_time)])
+        table = AsciiTable(data, 'startup profile')
+        return table.table
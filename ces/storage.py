@@ -27,10 +27,14 @@
 
 from contextlib import closing
 import sqlite3
+import threading
 
 class Storage:
     def __init__(self, db_path):
-        self._handle = sqlite3.connect(db_path)
+        # The storage may be created by a thread other than the one that uses it
+        self._handle = sqlite3.connect(db_path, check_same_thread=False)
+        # Background threads (e.g. metadata refreshes) write into the database too
+        self._lock = threading.Lock()
         self._create_tables()
 
     def _create_tables(self):
@@ -42,11 +46,77 @@ class Storage:
                     'address VARCHAR(255) NOT NULL' \
                 ')'
             )
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS exchange_metadata (' \
+                    'exchange VARCHAR(32) UNIQUE NOT NULL,' \
+                    'version INTEGER NOT NULL,' \
+                    'timestamp REAL NOT NULL,' \
+                    'data TEXT NOT NULL' \
+                ')'
+            )
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS coin_metadata (' \
+                    'fiat_currency VARCHAR(10) UNIQUE NOT NULL,' \
+                    'version INTEGER NOT NULL,' \
+                    'timestamp REAL NOT NULL,' \
+                    'data TEXT NOT NULL' \
+                ')'
+            )
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS candles (' \
+                    'exchange VARCHAR(32) NOT NULL,' \
+                    'market VARCHAR(32) NOT NULL,' \
+                    'interval VARCHAR(32) NOT NULL,' \
+                    'timestamp REAL NOT NULL,' \
+                    'open REAL NOT NULL,' \
+                    'high REAL NOT NULL,' \
+                    'low REAL NOT NULL,' \
+                    'close REAL NOT NULL,' \
+                    'volume REAL NOT NULL,' \
+                    'PRIMARY KEY (exchange, market, interval, timestamp)' \
+                ')'
+            )
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS trades (' \
+                    'exchange VARCHAR(32) NOT NULL,' \
+                    'symbol VARCHAR(32) NOT NULL,' \
+                    'trade_id INTEGER NOT NULL,' \
+                    'order_id VARCHAR(64) NOT NULL,' \
+                    'timestamp REAL NOT NULL,' \
+                    'price REAL NOT NULL,' \
+                    'quantity REAL NOT NULL,' \
+                    'is_buyer INTEGER NOT NULL,' \
+                    'PRIMARY KEY (exchange, symbol, trade_id)' \
+                ')'
+            )
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS trade_checks (' \
+                    'exchange VARCHAR(32) NOT NULL,' \
+                    'symbol VARCHAR(32) NOT NULL,' \
+                    'timestamp REAL NOT NULL,' \
+                    'PRIMARY KEY (exchange, symbol)' \
+                ')'
+            )
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS transfers (' \
+                    'exchange VARCHAR(32) NOT NULL,' \
+                    'type VARCHAR(16) NOT NULL,' \
+                    'transfer_id VARCHAR(128) NOT NULL,' \
+                    'currency VARCHAR(10) NOT NULL,' \
+                    'amount REAL NOT NULL,' \
+                    'transaction_id VARCHAR(255),' \
+                    'confirmations INTEGER,' \
+                    'cost REAL,' \
+                    'cancelled INTEGER NOT NULL,' \
+                    'timestamp REAL NOT NULL,' \
+                    'PRIMARY KEY (exchange, type, transfer_id)' \
+                ')'
+            )
 
     def load_address_book(self):
         output = {}
         query = 'SELECT name, currency, address FROM address_book'
-        with closing(self._handle.cursor()) as cursor:
+        with self._lock, closing(self._handle.cursor()) as cursor:
             for row in cursor.execute(query):
                 output[row[0]] = {
                     'currency' : row[1],
@@ -57,7 +127,7 @@ class Storage:
     def add_address_book(self, name, currency_code, address):
         query = 'INSERT INTO address_book (name, currency, address) '\
                 'VALUES (?, ?, ?)'
-        with closing(self._handle.cursor()) as cursor:
+        with self._lock, closing(self._handle.cursor()) as cursor:
             cursor.execute(
                 query,
                 (name, currency_code, address)
@@ -65,6 +135,119 @@ class Storage:
             self._handle.commit()
 
     def remove_address_book(self, name):
-        with closing(self._handle.cursor()) as cursor:
+        with self._lock, closing(self._handle.cursor()) as cursor:
             cursor.execute('DELETE FROM address_book WHERE name = ?', (name, ))
             self._handle.commit()
+
+    def load_exchange_metadata(self, exchange):
+        query = 'SELECT version, timestamp, data FROM exchange_metadata WHERE exchange = ?'
+        with self._lock, closing(self._handle.cursor()) as cursor:
+            cursor.execute(query, (exchange, ))
+            return cursor.fetchone()
+
+    def save_exchange_metadata(self, exchange, version, timestamp, data):
+        query = 'INSERT OR REPLACE INTO exchange_metadata (exchange, version, timestamp, data) '\
+                'VALUES (?, ?, ?, ?)'
+        with self._lock, closing(self._handle.cursor()) as cursor:
+            cursor.execute(query, (exchange, version, timestamp, data))
+            self._handle.commit()
+
+    def load_coin_metadata(self, fiat_currency):
+        query = 'SELECT version, timestamp, data FROM coin_metadata WHERE fiat_currency = ?'
+        with self._lock, closing(self._handle.cursor()) as cursor:
+            cursor.execute(query, (fiat_currency, ))
+            return cursor.fetchone()
+
+    def save_coin_metadata(self, fiat_currency, version, timestamp, data):
+        query = 'INSERT OR REPLACE INTO coin_metadata (fiat_currency, version, timestamp, data) '\
+                'VALUES (?, ?, ?, ?)'
+        with self._lock, closing(self._handle.cursor()) as cursor:
+            cursor.execute(query, (fiat_currency, version, timestamp, data))
+            self._handle.commit()
+
+    # Returns (timestamp, open, high, low, close, volume) rows sorted by timestamp
+    def load_candles(self, exchange, market, interval):
+        query = 'SELECT timestamp, open, high, low, close, volume FROM candles '\
+                'WHERE exchange = ? AND market = ? AND interval = ? ORDER BY timestamp'
+        with self._lock, closing(self._handle.cursor()) as cursor:
+            return cursor.execute(query, (exchange, market, interval)).fetchall()
+
+    # Returns (symbol, trade id, order id, timestamp, price, quantity, is buyer) rows sorted
+    # by timestamp
+    def load_trades(self, exchange):
+        query = 'SELECT symbol, trade_id, order_id, timestamp, price, quantity, is_buyer '\
+                'FROM trades WHERE exchange = ? ORDER BY timestamp'
+        with self._lock, closing(self._handle.cursor()) as cursor:
+            return cursor.execute(query, (exchange, )).fetchall()
+
+    # Returns a dict from every symbol with trades to the highest trade id stored for it
+    def load_trade_cursors(self, exchange):
+        query = 'SELECT symbol, MAX(trade_id) FROM trades WHERE exchange = ? GROUP BY symbol'
+        with self._lock, closing(self._handle.cursor()) as cursor:
+            return dict(cursor.execute(query, (exchange, )).fetchall())
+
+    # Returns a dict from every symbol that was synced to when that last happened, even
+    # if it has no trades
+    def load_trade_checks(self, exchange):
+        query = 'SELECT symbol, timestamp FROM trade_checks WHERE exchange = ?'
+        with self._lock, closing(self._handle.cursor()) as cursor:
+            return dict(cursor.execute(query, (exchange, )).fetchall())
+
+    def save_trade_check(self, exchange, symbol, timestamp):
+        query = 'INSERT OR REPLACE INTO trade_checks (exchange, symbol, timestamp) '\
+                'VALUES (?, ?, ?)'
+        with self._lock, closing(self._handle.cursor()) as cursor:
+            cursor.execute(query, (exchange, symbol, timestamp))
+            self._handle.commit()
+
+    # Stores (trade id, order id, timestamp, price, quantity, is buyer) rows
+    def save_trades(self, exchange, symbol, rows):
+        query = 'INSERT OR REPLACE INTO trades (exchange, symbol, trade_id, order_id, '\
+                'timestamp, price, quantity, is_buyer) VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+        with self._lock, closing(self._handle.cursor()) as cursor:
+            cursor.executemany(query, [(exchange, symbol) + tuple(row) for row in rows])
+            self._handle.commit()
+
+    # Returns (transfer id, currency, amount, transaction id, confirmations, cost, cancelled,
+    # timestamp) rows sorted by timestamp
+    def load_transfers(self, exchange, transfer_type, currency=None):
+        query = 'SELECT transfer_id, currency, amount, transaction_id, confirmations, cost, '\
+                'cancelled, timestamp FROM transfers WHERE exchange = ? AND type = ?'
+        args = (exchange, transfer_type)
+        if currency is not None:
+            query += ' AND currency = ?'
+            args += (currency, )
+        with self._lock, closing(self._handle.cursor()) as cursor:
+            return cursor.execute(query + ' ORDER BY timestamp', args).fetchall()
+
+    # Returns a dict from every currency with transfers to the newest timestamp stored for it
+    def load_transfer_cursors(self, exchange, transfer_type):
+        query = 'SELECT currency, MAX(timestamp) FROM transfers WHERE exchange = ? '\
+                'AND type = ? GROUP BY currency'
+        with self._lock, closing(self._handle.cursor()) as cursor:
+            return dict(cursor.execute(query, (exchange, transfer_type)).fetchall())
+
+    # Stores rows in the same format load_transfers returns them
+    def save_transfers(self, exchange, transfer_type, rows):
+        query = 'INSERT OR REPLACE INTO transfers (exchange, type, transfer_id, currency, '\
+                'amount, transaction_id, confirmations, cost, cancelled, timestamp) '\
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+        key = (exchange, transfer_type)
+        with self._lock, closing(self._handle.cursor()) as cursor:
+            cursor.executemany(query, [key + tuple(row) for row in rows])
+            self._handle.commit()
+
+    # Stores the given candle rows, only keeping the newest max_count ones
+    def save_candles(self, exchange, market, interval, rows, max_count):
+        query = 'INSERT OR REPLACE INTO candles (exchange, market, interval, timestamp, '\
+                'open, high, low, close, volume) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+        key = (exchange, market, interval)
+        with self._lock, closing(self._handle.cursor()) as cursor:
+            cursor.executemany(query, [key + tuple(row) for row in rows])
+            cursor.execute(
+                'DELETE FROM candles WHERE exchange = ? AND market = ? AND interval = ? '\
+                'AND timestamp NOT IN (SELECT timestamp FROM candles WHERE exchange = ? '\
+                'AND market = ? AND interval = ? ORDER BY timestamp DESC LIMIT ?)',
+                key + key + (max_count, )
+            )
+            self._handle.commit()
@@ -0,0 +1,101 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+import calendar
+import datetime
+import re
+import dateparser
+from dateutil.tz import tzlocal
+
+EPOCH = datetime.datetime(1970, 1, 1)
+# Epoch values above this are in milliseconds (this is year 5138 in seconds)
+MILLISECONDS_THRESHOLD = 10 ** 11
+MAX_CACHED_OFFSETS = 10000
+
+ISO_8601_REGEX = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?' \
+    r'(Z|[+-]\d{2}:?\d{2})?$'
+)
+
+LOCAL_TIMEZONE = tzlocal()
+# Local UTC offset in seconds, indexed by hour since the epoch
+_local_offsets = {}
+
+def _get_local_offset(seconds):
+    hour = int(seconds // 3600)
+    offset = _local_offsets.get(hour)
+    if offset is None:
+        if len(_local_offsets) >= MAX_CACHED_OFFSETS:
+            _local_offsets.clear()
+        utc_time = EPOCH + datetime.timedelta(seconds=hour * 3600)
+        local_time = datetime.datetime.fromtimestamp(hour * 3600)
+        offset = int((local_time - utc_time).total_seconds())
+        _local_offsets[hour] = offset
+    return offset
+
+def _parse_iso_8601(str_time):
+    match = ISO_8601_REGEX.match(str_time)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, fraction, zone = match.groups()
+    seconds = calendar.timegm((
+        int(year), int(month), int(day), int(hour), int(minute), int(second)
+    ))
+    if fraction:
+        seconds += int(fraction[:6]) / (10.0 ** len(fraction[:6]))
+    if zone and zone != 'Z':
+        zone = zone.replace(':', '')
+        zone_offset = int(zone[1:3]) * 3600 + int(zone[3:5]) * 60
+        seconds += -zone_offset if zone[0] == '+' else zone_offset
+    return seconds
+
+# Converts an epoch time in seconds or milliseconds, either as a number or a string, or a
+# time string in UTC into seconds since the epoch
+def to_epoch_seconds(value):
+    if not isinstance(value, basestring):
+        value = float(value)
+    elif value.isdigit():
+        value = float(value)
+    else:
+        seconds = _parse_iso_8601(value)
+        if seconds is None:
+            # Anything else goes through the slow path
+            parsed = dateparser.parse(value)
+            seconds = calendar.timegm(parsed.utctimetuple()) + parsed.microsecond / 1e6
+        return seconds
+    if value >= MILLISECONDS_THRESHOLD:
+        value /= 1000.0
+    return value
+
+# Returns the naive local time for the given epoch time or UTC time string
+def from_epoch(value):
+    seconds = to_epoch_seconds(value)
+    return EPOCH + datetime.timedelta(seconds=seconds + _get_local_offset(seconds))
+
+# Same as from_epoch but the output has the local time zone set
+def from_utc_time(value):
+    return from_epoch(value).replace(tzinfo=LOCAL_TIMEZONE)
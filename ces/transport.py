@@ -0,0 +1,98 @@
+# Copyright (c) 2018, Matias Fontanini
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The views and conclusions contained in the software and documentation are those
+# of the authors and should not be interpreted as representing official policies,
+# either expressed or implied, of the FreeBSD Project.
+
+import threading
+import time
+import requests
+from urlparse import urlparse
+from requests.adapters import HTTPAdapter
+
+# A process wide HTTP session. Connections are pooled per host and kept alive so only
+# the first request to each host pays for the TCP and TLS handshakes
+class Transport:
+    POOL_HOSTS = 16
+    POOL_CONNECTIONS_PER_HOST = 8
+    WARM_TIMEOUT = 5
+    # Servers tend to close idle connections after about a minute
+    WARM_INTERVAL = 30
+
+    def __init__(self):
+        self._adapter = HTTPAdapter(
+            pool_connections=Transport.POOL_HOSTS,
+            pool_maxsize=Transport.POOL_CONNECTIONS_PER_HOST
+        )
+        self.session = requests.Session()
+        self.attach(self.session)
+        self.session.headers.update({ 'Accept-Encoding' : 'gzip, deflate' })
+        self._lock = threading.Lock()
+        self._last_warm = {}
+
+    # Makes a session created elsewhere (e.g. by an exchange's library) use our pools
+    def attach(self, session):
+        session.mount('https://', self._adapter)
+        session.mount('http://', self._adapter)
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def get_json(self, url, **kwargs):
+        return self.get(url, **kwargs).json()
+
+    def _get_host_url(self, url):
+        parsed = urlparse(url)
+        return '{0}://{1}/'.format(parsed.scheme, parsed.netloc)
+
+    # Opens a connection to the host in the given URL unless one was used recently
+    def warm(self, url):
+        url = self._get_host_url(url)
+        with self._lock:
+            now = time.time()
+            if now - self._last_warm.get(url, 0) < Transport.WARM_INTERVAL:
+                return
+            self._last_warm[url] = now
+        try:
+            # Whatever the response is, the connection stays in the pool
+            self.session.head(url, timeout=Transport.WARM_TIMEOUT)
+        except Exception:
+            with self._lock:
+                self._last_warm.pop(url, None)
+
+    def warm_in_background(self, url):
+        thread = threading.Thread(target=self.warm, args=(url,))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+_transport = None
+_transport_lock = threading.Lock()
+
+def get_transport():
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport()
+        return _transport
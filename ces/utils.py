@@ -28,22 +28,28 @@
 from terminaltables import AsciiTable
 from terminaltables.width_and_alignment import max_dimensions
 import datetime
-import dateparser
 import sys
 import hashlib
 import base64
 import getpass
 import re
 import math
+import os
+import struct
 try:
     import readline
 except ImportError: #Window systems don't have GNU readline
     import pyreadline.windows_readline as readline
     readline.rl.mode.show_all_if_ambiguous = "on"
+try:
+    import fcntl
+    import termios
+except ImportError: # Neither do they have these
+    fcntl = None
 from Crypto.Cipher import AES
 from Crypto import Random
-from dateutil.tz import tzutc, tzlocal
 from models import CandleTicks
+import timestamps
 from exceptions import InvalidAmountException
 
 class ParameterOptionVisitor:
@@ -177,6 +183,13 @@ def make_price_string(base_currency_price, base_currency_code, currency_price, f
         format_fiat_currency(fiat_value, fiat_currency),
     )
 
+# Formats a number of seconds as e.g. "3m" or "2h"
+def format_age(seconds):
+    for unit, unit_seconds in [('d', 60 * 60 * 24), ('h', 60 * 60), ('m', 60)]:
+        if seconds >= unit_seconds:
+            return '{0}{1}'.format(int(seconds / unit_seconds), unit)
+    return '{0}s'.format(int(seconds))
+
 def make_table_rows(title, table_data):
     table = AsciiTable(table_data, title)
     dimensions = max_dimensions(table.table_data, table.padding_left, table.padding_right)[:3]
@@ -184,7 +197,7 @@ def make_table_rows(title, table_data):
     return map(lambda i: ''.join(i), list(output))
 
 def datetime_from_utc_time(str_time):
-    return dateparser.parse(str_time).replace(tzinfo=tzutc()).astimezone(tz=tzlocal())
+    return timestamps.from_utc_time(str_time)
 
 def show_operation_dialog():
     running = True
@@ -235,13 +248,34 @@ def ask_for_passphrase(text):
     except (KeyboardInterrupt, EOFError):
         return None
 
+# Returns the (columns, lines) of the terminal. If that can't be found, the COLUMNS and
+# LINES environment variables are used instead
+def get_terminal_size(default=(80, 24)):
+    if fcntl is not None:
+        try:
+            lines, columns = struct.unpack(
+                'hh',
+                fcntl.ioctl(sys.stdout.fileno(), termios.TIOCGWINSZ, '1234')
+            )
+            if lines > 0 and columns > 0:
+                return (columns, lines)
+        except Exception:
+            pass
+    try:
+        return (int(os.environ['COLUMNS']), int(os.environ['LINES']))
+    except (KeyError, ValueError):
+        return default
+
 def make_candle_label(date, interval):
     formats = {
         CandleTicks.one_minute : "%H:%M",
         CandleTicks.five_minutes : "%H:%M",
+        CandleTicks.fifteen_minutes : "%H:%M",
         CandleTicks.thirty_minutes : "%H:%M",
         CandleTicks.one_hour : "%H:%M",
-        CandleTicks.one_day : "%d/%m"
+        CandleTicks.four_hours : "%H:%M",
+        CandleTicks.one_day : "%d/%m",
+        CandleTicks.one_week : "%d/%m"
     }
     return date.strftime(formats[interval])
 
@@ -34,6 +34,12 @@ import sys
 from ces.exchanges.bittrex_wrapper import BittrexWrapper
 from ces.exchanges.binance_wrapper import BinanceWrapper
 from ces.exchanges.kucoin_wrapper import KucoinWrapper
+from ces.exchanges.metadata_cache import ExchangeMetadataCache
+from ces.exchanges.candle_cache import CandleCache
+from ces.exchanges.trade_ledger import TradeLedger
+from ces.exchanges.transfer_ledger import TransferLedger
+from ces.exchanges.cached_handle import CachedExchangeHandle
+from ces.exchanges.exchange_session import ExchangeSession
 from ces.commands import CommandManager
 from ces.shell_completer import ShellCompleter
 from ces.core import Core
@@ -44,6 +50,7 @@ from ces.exceptions import *
 from ces.storage import Storage
 from ces.address_book import AddressBook
 from ces.utils import ask_for_passphrase
+from ces.startup import StartupPipeline, SharedDownload
 
 parser = argparse.ArgumentParser(description='Crypto exchange shell')
 parser.add_argument('-c', '--config', type=str, required=True,
@@ -51,8 +58,10 @@ parser.add_argument('-c', '--config', type=str, required=True,
 parser.add_argument('-d', '--decrypt', action='store_true',
                     help='decrypt the configuration file')
 parser.add_argument('-e', '--exchange', action='store',
-                    help='specify the exchange to use. Only needed if the '\
-                         'config file has multiple')
+                    help='specify the exchange to use initially when the config '\
+                         'file has multiple')
+parser.add_argument('--startup-profile', action='store_true',
+                    help='print how long each startup phase took')
 
 try:
     args = parser.parse_args()
@@ -76,59 +85,130 @@ except Exception as ex:
     print 'Error parsing config: {0}'.format(ex)
     exit(1)
 
-try:
-    valid_exchanges = ['bittrex', 'binance', 'kucoin']
-    for name in config_manager.exchanges:
-        if name not in valid_exchanges:
-            print 'Unknown exchange "{0}"'.format(name)
-            exit(1)
-    if args.exchange and args.exchange not in valid_exchanges:
+valid_exchanges = ['bittrex', 'binance', 'kucoin']
+for name in config_manager.exchanges:
+    if name not in valid_exchanges:
         print 'Unknown exchange "{0}"'.format(name)
         exit(1)
-    if len(config_manager.exchanges) > 1 and not args.exchange:
-        print '-e parameter is needed when configuration file has multiple exchanges'
-        exit(1)
-    if args.exchange and args.exchange not in config_manager.exchanges:
-        print 'Configuration is missing keys for {0}'.format(args.exchange)
-        exit(1)
-    exchange_name = args.exchange or config_manager.exchanges.keys()[0]
+if args.exchange and args.exchange not in valid_exchanges:
+    print 'Unknown exchange "{0}"'.format(args.exchange)
+    exit(1)
+if args.exchange and args.exchange not in config_manager.exchanges:
+    print 'Configuration is missing keys for {0}'.format(args.exchange)
+    exit(1)
+exchange_names = sorted(config_manager.exchanges.keys())
+active_exchange_name = args.exchange or exchange_names[0]
+fiat_currency = config_manager.fiat_currency or 'usd'
+
+def make_exchange_handle(exchange_name, storage):
     api_key = config_manager.exchanges[exchange_name].api_key
     api_secret = config_manager.exchanges[exchange_name].api_secret
-    sys.stdout.write('\rFetching data from {0} exchange...'.format(exchange_name))
-    sys.stdout.flush()
+    metadata_cache = ExchangeMetadataCache(storage, exchange_name)
+    metadata = metadata_cache.load()
     if exchange_name == 'bittrex':
-        handle = BittrexWrapper(api_key, api_secret)
+        handle = BittrexWrapper(api_key, api_secret, metadata)
     elif exchange_name == 'binance':
-        handle = BinanceWrapper(api_key, api_secret)
+        handle = BinanceWrapper(api_key, api_secret, coin_ticker, metadata)
+        if config_manager.exchanges[exchange_name].stream_market_data:
+            handle.enable_market_stream()
+        # Trades can't be fetched without API keys
+        if api_key is not None:
+            handle.set_trade_ledger(TradeLedger(storage, exchange_name))
+            handle.sync_trades_in_background()
     elif exchange_name == 'kucoin':
-        handle = KucoinWrapper(api_key, api_secret)
+        handle = KucoinWrapper(api_key, api_secret, metadata)
     else:
         raise Exception('Unknown exchange {0}'.format(exchange_name))
-except Exception as ex:
-    print '\rFailed to create {0} handle: {1}'.format(exchange_name, ex)
-    exit(1)
+    handle.set_candle_cache(CandleCache(storage, exchange_name))
+    if api_key is not None:
+        handle.set_transfer_ledger(TransferLedger(storage, exchange_name))
+    if metadata is None:
+        metadata_cache.save(handle.export_metadata())
+    else:
+        # We started using cached data, make sure it's still up to date
+        metadata_cache.revalidate_in_background(handle)
+    return CachedExchangeHandle(handle)
 
-try:
-    storage = Storage(config_manager.database_path)
-    address_book = AddressBook(storage, handle)
-except Exception as ex:
-    print '\rFailed to initialize storage: {0}'.format(ex)
-    exit(1)
+# Exchanges that failed to load are left out of the session
+def make_exchange_session(*handles):
+    handles = dict(filter(lambda i: i[1] is not None, zip(exchange_names, handles)))
+    if len(handles) == 0:
+        raise Exception('No exchange could be loaded')
+    if active_exchange_name in handles:
+        return ExchangeSession(handles, active_exchange_name)
+    return ExchangeSession(handles, sorted(handles.keys())[0])
+
+def fetch_coin_ticker():
+    try:
+        return coin_ticker.get()
+    except Exception:
+        # Whoever uses this will find out about the error and handle it
+        return None
+
+def exchange_stage_name(exchange_name):
+    return 'exchange:{0}'.format(exchange_name)
+
+def print_exchange_errors():
+    for exchange_name in exchange_names:
+        error = pipeline.get_error(exchange_stage_name(exchange_name))
+        if error is not None:
+            print '\rFailed to create {0} handle: {1}'.format(exchange_name, error)
+
+# Both the Binance wrapper and the coin database use coinmarketcap's ticker. Whichever
+# of them asks for it first will wait for this download rather than starting another one
+coin_ticker = SharedDownload(CoinDatabase.API_URL.format(fiat_currency.upper()))
+pipeline = StartupPipeline()
+pipeline.add_stage('coin_ticker', fetch_coin_ticker)
+pipeline.add_stage('storage', lambda: Storage(config_manager.database_path))
+# Every configured exchange is loaded at the same time. The shell still starts if some
+# of them fail
+for exchange_name in exchange_names:
+    pipeline.add_stage(
+        exchange_stage_name(exchange_name),
+        lambda storage, exchange_name=exchange_name: make_exchange_handle(exchange_name, storage),
+        ['storage'],
+        optional=True
+    )
+pipeline.add_stage('exchange_session', make_exchange_session,
+                   map(exchange_stage_name, exchange_names))
+pipeline.add_stage('address_book', AddressBook, ['storage', 'exchange_session'])
+pipeline.add_stage('coin_database', lambda storage: CoinDatabase(
+    fiat_currency,
+    coin_ticker,
+    storage
+), ['storage'])
 
+sys.stdout.write('\rFetching data from {0} and crypto currency metadata...'.format(
+    ', '.join(exchange_names)
+))
+sys.stdout.flush()
 try:
-    coin_db = CoinDatabase(config_manager.fiat_currency or 'usd')
-except Exception as ex:
-    print '\rFailed to load coin database information: {0}'.format(ex)
+    stages = pipeline.run()
+except StartupException as ex:
+    print_exchange_errors()
+    error_messages = {
+        'storage' : 'Failed to initialize storage',
+        'exchange_session' : 'Failed to create exchange handles',
+        'address_book' : 'Failed to initialize storage',
+        'coin_database' : 'Failed to load coin database information',
+    }
+    print '\r{0}: {1}'.format(error_messages.get(ex.stage, 'Failed to start'), ex.error)
+    coin_db = pipeline.get_result('coin_database')
+    if coin_db is not None:
+        coin_db.stop()
     exit(1)
-sys.stdout.write('\rFetching latest crypto currency metadata...')
-sys.stdout.flush()
-coin_db.wait_for_data()
+print_exchange_errors()
+exchange_session = stages['exchange_session']
+address_book = stages['address_book']
+coin_db = stages['coin_database']
+if args.startup_profile:
+    print '\r' + pipeline.format_profile()
 print '\r*** Cryptocurrency Exchange Shell. Type "help" to get started. ***'
 
 running = True
 output_manager = OutputManager()
 cmd_manager = CommandManager()
-core = Core(handle, cmd_manager, output_manager, address_book, coin_db)
+core = Core(exchange_session, cmd_manager, output_manager, address_book, coin_db)
 completer = ShellCompleter(core)
 if config_manager.history_path:
     completer.load_history(config_manager.history_path)
@@ -162,6 +242,12 @@ while running:
             'Command "{0}" doesn\'t exist',
             ex.command
         )
+    except UnknownExchangeException as ex:
+        output_manager.log_error(
+            'Unknown exchange',
+            'Exchange "{0}" is not configured',
+            ex.exchange_name
+        )
     except UnknownCurrencyException as ex:
         output_manager.log_error(
             'Unknown currency',
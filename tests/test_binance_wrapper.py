@@ -0,0 +1,181 @@
+import unittest
+import requests
+from ces.storage import Storage
+from ces.exchanges.trade_ledger import TradeLedger
+import ces.exchanges.binance_wrapper as binance_wrapper
+from ces.exchanges.binance_wrapper import BinanceWrapper
+from ces.exceptions import ExchangeAPIException
+
+class FakeClient:
+    SYMBOLS = [('BTC', 'ETH'), ('BTC', 'XLM'), ('ETH', 'XLM'), ('BTC', 'LTC'), ('USDT', 'BTC')]
+
+    def __init__(self, api_key, api_secret):
+        self.session = requests.session()
+        self.calls = []
+
+    def get_exchange_info(self):
+        symbols = []
+        for base, market in FakeClient.SYMBOLS:
+            symbols.append({
+                'symbol' : market + base,
+                'quoteAsset' : base,
+                'baseAsset' : market,
+                'filters' : [
+                    {
+                        'filterType' : 'PRICE_FILTER',
+                        'minPrice' : '0.1',
+                        'maxPrice' : '100',
+                        'tickSize' : '0.1',
+                    }
+                ],
+            })
+        return { 'symbols' : symbols }
+
+    def get_open_orders(self):
+        return [
+            {
+                'symbol' : 'XLMETH',
+                'orderId' : 1,
+                'time' : 1514764800000,
+                'origQty' : '10',
+                'executedQty' : '4',
+                'price' : '0.5',
+                'side' : 'BUY',
+            }
+        ]
+
+    def get_order_book(self, symbol, limit=100):
+        self.calls.append('get_order_book')
+        return {
+            'lastUpdateId' : 100,
+            'bids' : [['0.04500000', '1.00000000', []], ['0.04490000', '3.00000000', []]],
+            'asks' : [['0.04520000', '2.00000000', []], ['0.04530000', '4.00000000', []]],
+        }
+
+    def get_account(self):
+        return {
+            'balances' : [
+                { 'asset' : 'XLM', 'free' : '10', 'locked' : '0' },
+                { 'asset' : 'LTC', 'free' : '0', 'locked' : '0' },
+            ]
+        }
+
+    def get_my_trades(self, symbol, fromId, limit):
+        self.calls.append(('get_my_trades', symbol, fromId))
+        if symbol != 'XLMETH':
+            return []
+        trades = [
+            { 'id' : 0, 'orderId' : 5, 'time' : 1514764800000, 'price' : '0.5', 'qty' : '3',
+              'isBuyer' : True },
+            { 'id' : 1, 'orderId' : 6, 'time' : 1514764900000, 'price' : '0.6', 'qty' : '1',
+              'isBuyer' : False },
+        ]
+        return trades[fromId:]
+
+    def get_ticker(self, symbol):
+        self.calls.append('get_ticker')
+        return { 'askPrice' : '2.0', 'bidPrice' : '1.0', 'lastPrice' : '1.5' }
+
+    def get_all_tickers(self):
+        self.calls.append('get_all_tickers')
+        return [{ 'symbol' : market + base, 'price' : '1.5' } for base, market in FakeClient.SYMBOLS]
+
+    def get_orderbook_tickers(self):
+        self.calls.append('get_orderbook_tickers')
+        return [
+            { 'symbol' : market + base, 'askPrice' : '2.0', 'bidPrice' : '1.0' }
+            for base, market in FakeClient.SYMBOLS
+        ]
+
+class FakeBinanceWrapper(BinanceWrapper):
+    def _load_names(self):
+        return {}
+
+    def _load_withdraw_info(self):
+        return {}
+
+class TestBinanceWrapper(unittest.TestCase):
+    def setUp(self):
+        self._original_client = binance_wrapper.Client
+        binance_wrapper.Client = FakeClient
+        self.wrapper = FakeBinanceWrapper(None, None)
+        self.client = self.wrapper._handle
+
+    def tearDown(self):
+        binance_wrapper.Client = self._original_client
+
+    def test_market_state_single_symbol(self):
+        state = self.wrapper.get_market_state('BTC', 'ETH')
+        self.assertEqual(2.0, state.ask)
+        self.assertEqual(1.0, state.bid)
+        self.assertEqual(1.5, state.last)
+        self.assertEqual(['get_ticker'], self.client.calls)
+
+    def test_market_state_uses_snapshot(self):
+        self.wrapper.get_market_state('BTC', 'ETH')
+        self.wrapper.get_market_state('BTC', 'XLM')
+        self.wrapper.get_market_state('ETH', 'XLM')
+        # Fourth symbol: fetching everything is now cheaper
+        self.wrapper.get_market_state('BTC', 'LTC')
+        self.assertEqual(
+            ['get_ticker'] * 3 + ['get_all_tickers', 'get_orderbook_tickers'],
+            self.client.calls
+        )
+        # Served from the snapshot
+        state = self.wrapper.get_market_state('USDT', 'BTC')
+        self.assertEqual(1.5, state.last)
+        self.assertEqual(5, len(self.client.calls))
+
+    def test_open_orders_symbol_decoding(self):
+        orders = self.wrapper.get_open_orders()
+        self.assertEqual(1, len(orders))
+        self.assertEqual('ETH', orders[0].base_currency.code)
+        self.assertEqual('XLM', orders[0].market_currency.code)
+        self.assertEqual(6.0, orders[0].remaining)
+
+    def test_metadata_roundtrip(self):
+        metadata = self.wrapper.export_metadata()
+        other = FakeBinanceWrapper(None, None, metadata=metadata)
+        self.assertEqual(metadata, other.export_metadata())
+        self.assertEqual(0.1, other._filters['ETHBTC'].price_tick)
+
+    def test_trade_ledger(self):
+        self.assertTrue(self.wrapper.order_history_needs_asset())
+        ledger = TradeLedger(Storage(':memory:'), 'binance', min_sync_interval=0)
+        self.wrapper.set_trade_ledger(ledger)
+        self.assertFalse(self.wrapper.order_history_needs_asset())
+        self.assertEqual({}, self.wrapper.sync_trades())
+        # Only symbols for currencies we hold are synced
+        symbols = sorted(map(lambda i: i[1], self.client.calls))
+        self.assertEqual(['XLMBTC', 'XLMETH'], symbols)
+        orders = self.wrapper.get_order_history()
+        self.assertEqual(['5', '6'], map(lambda i: i.order_id, orders))
+        self.assertEqual('ETH', orders[0].base_currency.code)
+        self.assertEqual(0.6, orders[1].price_per_unit)
+        # Symbols in the ledger are synced from their last trade
+        ledger.wait_for_background_sync()
+        self.assertTrue(('get_my_trades', 'XLMETH', 2) in self.client.calls)
+        # Symbols that were just checked and have no trades aren't synced again
+        self.assertEqual(1, self.client.calls.count(('get_my_trades', 'XLMBTC', 0)))
+
+    def test_trade_ledger_new_currency(self):
+        ledger = TradeLedger(Storage(':memory:'), 'binance')
+        self.wrapper.set_trade_ledger(ledger)
+        self.wrapper.sync_trades()
+        del self.client.calls[:]
+        get_account = self.client.get_account
+        def get_account_with_ltc():
+            output = get_account()
+            output['balances'][1]['free'] = '2'
+            return output
+        self.client.get_account = get_account_with_ltc
+        self.wrapper.sync_trades()
+        # Only the symbols for the currency we just started holding are checked
+        symbols = sorted(map(lambda i: i[1], self.client.calls))
+        self.assertEqual(['LTCBTC', 'XLMETH'], symbols)
+
+    def test_unknown_symbol(self):
+        self.assertRaises(ExchangeAPIException, lambda: self.wrapper._split_symbol('FOOBAR'))
+
+if __name__ == "__main__":
+    unittest.main()
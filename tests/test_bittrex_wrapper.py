@@ -0,0 +1,68 @@
+import unittest
+import requests
+from ces.transport import get_transport
+from ces.exchanges.resilience import ResilientClient
+from ces.exchanges.bittrex_wrapper import BittrexWrapper
+from ces.exceptions import ExchangeAPIException
+
+METADATA = {
+    'currencies' : [['BTC', 'Bitcoin', 2, 0.001], ['ETH', 'Ethereum', 36, 0.006]],
+    'markets' : [['BTC', 'ETH', None]],
+}
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+class TestBittrexWrapper(unittest.TestCase):
+    def setUp(self):
+        self._original_delay = ResilientClient.BASE_DELAY
+        ResilientClient.BASE_DELAY = 0.01
+        self.failures = 0
+        self.urls = []
+        get_transport().get = self.get
+        self.wrapper = BittrexWrapper('key', 'secret', METADATA)
+        # Don't let the client space out the calls
+        self.wrapper._handle._handle.call_rate = 0
+
+    def tearDown(self):
+        ResilientClient.BASE_DELAY = self._original_delay
+        del get_transport().get
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        if len(self.urls) <= self.failures:
+            raise requests.ConnectionError('connection reset')
+        return FakeResponse({
+            'success' : True,
+            'message' : '',
+            'result' : { 'Ask' : 2, 'Bid' : 1, 'Last' : 1.5 },
+        })
+
+    def test_retries_dispatch_errors(self):
+        self.failures = 2
+        state = self.wrapper.get_market_state('BTC', 'ETH')
+        self.assertEqual((2, 1), (state.ask, state.bid))
+        self.assertEqual(3, len(self.urls))
+
+    def test_gives_up(self):
+        self.failures = 10
+        self.assertRaises(
+            ExchangeAPIException,
+            lambda: self.wrapper.get_market_state('BTC', 'ETH')
+        )
+        self.assertEqual(ResilientClient.MAX_RETRIES + 1, len(self.urls))
+
+    def test_trades_are_not_retried(self):
+        self.failures = 1
+        self.assertRaises(
+            ExchangeAPIException,
+            lambda: self.wrapper.buy('BTC', 'ETH', 1, 0.5)
+        )
+        self.assertEqual(1, len(self.urls))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+import unittest
+import threading
+import time
+from ces.exchanges.cached_handle import CachedExchangeHandle
+
+class FakeHandle:
+    def __init__(self):
+        self.calls = []
+        self.exposes_confirmations = True
+        # If set, the next get_wallets call flags started and waits for release
+        self.started = None
+        self.release = None
+        # get_candles calls wait for it
+        self.candles_release = threading.Event()
+
+    def get_wallet(self, currency_code):
+        self.calls.append(('get_wallet', currency_code))
+        return len(self.calls)
+
+    def get_wallets(self):
+        self.calls.append(('get_wallets', ))
+        value = len(self.calls)
+        release, self.release = self.release, None
+        if release is not None:
+            self.started.set()
+            release.wait()
+        return value
+
+    def get_open_orders(self):
+        self.calls.append(('get_open_orders', ))
+        return len(self.calls)
+
+    def get_market_state(self, base_currency_code, market_currency_code):
+        self.calls.append(('get_market_state', base_currency_code, market_currency_code))
+        return len(self.calls)
+
+    def get_orderbook(self, base_currency_code, market_currency_code):
+        self.calls.append(('get_orderbook', ))
+        return len(self.calls)
+
+    def get_candles(self, base_currency_code, market_currency_code, interval, limit):
+        self.calls.append(('get_candles', ))
+        self.candles_release.wait()
+        if market_currency_code == 'FAIL':
+            raise Exception('boom')
+        return len(self.calls)
+
+    def buy(self, base_currency_code, market_currency_code, amount, rate):
+        raise Exception('boom')
+
+    def withdraw(self, currency_code, amount, address, address_tag):
+        return 'ok'
+
+class TestCachedExchangeHandle(unittest.TestCase):
+    def setUp(self):
+        self.handle = FakeHandle()
+        self.cached = CachedExchangeHandle(self.handle)
+
+    def get_stats(self, name):
+        return dict(self.cached.get_cache_stats())[name]
+
+    def test_hits(self):
+        self.assertEqual(1, self.cached.get_wallet('BTC'))
+        self.assertEqual(1, self.cached.get_wallet('BTC'))
+        self.assertEqual(2, self.cached.get_wallet('ETH'))
+        # Methods that aren't cached always reach the handle
+        self.assertEqual(3, self.cached.get_orderbook('BTC', 'ETH'))
+        self.assertEqual(4, self.cached.get_orderbook('BTC', 'ETH'))
+        self.assertTrue(self.cached.exposes_confirmations)
+        stats = self.get_stats('get_wallet')
+        self.assertEqual((1, 2), (stats.hits, stats.misses))
+
+    def test_expiration(self):
+        self.cached = CachedExchangeHandle(self.handle, { 'get_open_orders' : 0.1 })
+        self.cached.get_open_orders()
+        time.sleep(0.2)
+        self.assertEqual(2, self.cached.get_open_orders())
+        stats = self.get_stats('get_open_orders')
+        self.assertEqual((2, 1), (stats.misses, stats.stale))
+
+    def test_eviction(self):
+        self.cached = CachedExchangeHandle(self.handle, max_entries=2)
+        self.cached.get_wallet('A')
+        self.cached.get_wallet('B')
+        self.cached.get_wallet('A')
+        self.cached.get_wallet('C')
+        # B was the least recently used one
+        self.assertEqual(1, self.cached.get_wallet('A'))
+        self.assertEqual(4, self.cached.get_wallet('B'))
+        self.assertEqual(2, self.get_stats('get_wallet').evictions)
+
+    def test_invalidation(self):
+        self.cached.get_wallet('BTC')
+        self.cached.get_wallet('XLM')
+        self.cached.get_wallets()
+        self.cached.get_open_orders()
+        self.cached.get_market_state('BTC', 'ETH')
+        # Entries are dropped even if the order fails
+        self.assertRaises(Exception, lambda: self.cached.buy('BTC', 'ETH', 1, 1))
+        self.handle.calls = []
+        self.cached.get_wallet('BTC')
+        self.cached.get_wallet('XLM')
+        self.cached.get_wallets()
+        self.cached.get_open_orders()
+        self.cached.get_market_state('BTC', 'ETH')
+        self.assertEqual(
+            [('get_wallet', 'BTC'), ('get_wallets', ), ('get_open_orders', )],
+            self.handle.calls
+        )
+
+        self.handle.calls = []
+        self.assertEqual('ok', self.cached.withdraw('XLM', 1, 'address', None))
+        self.cached.get_wallet('BTC')
+        self.cached.get_wallet('XLM')
+        self.cached.get_open_orders()
+        self.assertEqual([('get_wallet', 'XLM')], self.handle.calls)
+
+    def test_invalidation_during_call(self):
+        release = threading.Event()
+        self.handle.started = threading.Event()
+        self.handle.release = release
+        results = []
+        thread = threading.Thread(target=lambda: results.append(self.cached.get_wallets()))
+        thread.start()
+        self.handle.started.wait()
+        self.cached.withdraw('XLM', 1, 'address', None)
+        # Calls made after the invalidation don't wait for the one that started before it
+        self.assertEqual(2, self.cached.get_wallets())
+        release.set()
+        thread.join()
+        self.assertEqual([1], results)
+        # The outdated result doesn't replace the new one
+        self.assertEqual(2, self.cached.get_wallets())
+        self.assertEqual(2, len(self.handle.calls))
+
+    # Lets the get_candles call go once all the others are waiting for it
+    def run_concurrently(self, functor, count):
+        results = []
+        def run():
+            try:
+                results.append(functor())
+            except Exception as ex:
+                results.append(ex)
+        coalesced = self.get_stats('get_candles').coalesced + count - 1
+        calls = len(self.handle.calls) + count
+        self.handle.candles_release = threading.Event()
+        threads = [threading.Thread(target=run) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        # If they're not coalesced, every one of them reaches the handle instead
+        while self.get_stats('get_candles').coalesced < coalesced and \
+              len(self.handle.calls) < calls:
+            time.sleep(0.01)
+        self.handle.candles_release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_coalescing(self):
+        results = self.run_concurrently(lambda: self.cached.get_candles('BTC', 'ETH', 1, 10), 4)
+        self.assertEqual([1] * 4, results)
+        self.assertEqual(3, self.get_stats('get_candles').coalesced)
+        # Errors are shared as well
+        results = self.run_concurrently(lambda: self.cached.get_candles('BTC', 'FAIL', 1, 10), 3)
+        self.assertEqual(1, len(set(map(id, results))))
+        self.assertTrue(isinstance(results[0], Exception))
+        self.assertEqual(2, len(self.handle.calls))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import time
+from ces.storage import Storage
+from ces.models import CandleSeries, CandleTicks, CANDLE_TICK_SECONDS
+from ces.exchanges.base_exchange_wrapper import BaseExchangeWrapper
+from ces.exchanges.candle_cache import CandleCache
+
+class FakeWrapper(BaseExchangeWrapper):
+    INTERVAL_MAP = {
+        CandleTicks.one_minute : '1m',
+        CandleTicks.five_minutes : '5m',
+        CandleTicks.one_hour : '1h',
+    }
+
+    def __init__(self):
+        BaseExchangeWrapper.__init__(self)
+        self.requests = []
+        self.fetched_intervals = []
+        self.close_price = 1
+
+    # Returns candles up to the one that's still open
+    def _fetch_candles(self, base_currency_code, market_currency_code, interval, limit,
+                       since=None):
+        self.requests.append(since)
+        self.fetched_intervals.append(interval)
+        seconds = CANDLE_TICK_SECONDS[interval]
+        last = int(time.time() / seconds) * seconds
+        start = last - (limit - 1) * seconds if since is None else since
+        output = CandleSeries()
+        output.add_candles(
+            (i, 1, 2, 0, self.close_price, 10) for i in range(int(start), last + 1, seconds)
+        )
+        return output
+
+class TestCandleCache(unittest.TestCase):
+    def setUp(self):
+        self.storage = Storage(':memory:')
+        self.wrapper = FakeWrapper()
+        self.wrapper.set_candle_cache(CandleCache(self.storage, 'test'))
+
+    def get_candles(self, limit=5):
+        return self.wrapper.get_candles('BTC', 'ETH', CandleTicks.one_minute, limit)
+
+    def test_incremental_fetch(self):
+        candles = self.get_candles()
+        self.assertEqual(5, len(candles))
+        # The open candle isn't stored
+        rows = self.storage.load_candles('test', 'BTC/ETH', 'one_minute')
+        self.assertEqual(4, len(rows))
+        self.wrapper.close_price = 3
+        candles = self.get_candles()
+        self.assertEqual(5, len(candles))
+        self.assertEqual([None, rows[-1][0] + 60], self.wrapper.requests)
+        # Stored candles are used for the old ones while the open one is fetched again
+        self.assertEqual(1, candles.close_prices[0])
+        self.assertEqual(3, candles.close_prices[-1])
+        self.assertEqual(60, candles.timestamps[1] - candles.timestamps[0])
+
+    def test_window_not_covered(self):
+        self.get_candles(3)
+        self.assertEqual(10, len(self.get_candles(10)))
+        self.assertEqual([None, None], self.wrapper.requests)
+
+    def test_gap_in_stored(self):
+        last = int(time.time() / 60) * 60
+        # Some old candles and some recent ones with a gap in between
+        rows = [(last - i * 60, 1, 2, 0, 1, 10) for i in range(1000, 996, -1) + range(4, 0, -1)]
+        self.storage.save_candles('test', 'BTC/ETH', 'one_minute', rows, 1000)
+        candles = self.get_candles(8)
+        self.assertEqual([None], self.wrapper.requests)
+        self.assertEqual(8, len(candles))
+        self.assertEqual([60] * 7, [candles.timestamps[i + 1] - candles.timestamps[i]
+                                    for i in range(7)])
+
+    def test_separate_keys(self):
+        self.get_candles()
+        self.wrapper.get_candles('BTC', 'XLM', CandleTicks.one_minute, 5)
+        self.wrapper.get_candles('BTC', 'ETH', CandleTicks.five_minutes, 5)
+        self.assertEqual([None, None, None], self.wrapper.requests)
+
+    def test_resample_unsupported(self):
+        candles = self.wrapper.get_candles('BTC', 'ETH', CandleTicks.four_hours, 5)
+        self.assertEqual([CandleTicks.one_hour], self.wrapper.fetched_intervals)
+        self.assertEqual(5, len(candles))
+        self.assertEqual([0] * 5, map(lambda i: i % (4 * 3600), candles.timestamps))
+        self.assertEqual([40] * 4, list(candles.volumes)[:-1])
+
+    def test_resample_from_stored(self):
+        self.get_candles(60)
+        candles = self.wrapper.get_candles('BTC', 'ETH', CandleTicks.five_minutes, 10)
+        # The five minute candles are built out of the stored one minute ones
+        self.assertEqual([CandleTicks.one_minute] * 2, self.wrapper.fetched_intervals)
+        self.assertEqual(10, len(candles))
+        self.assertEqual(50, candles.volumes[0])
+        # Not enough of them stored for this one
+        self.wrapper.get_candles('BTC', 'ETH', CandleTicks.five_minutes, 20)
+        self.assertEqual(CandleTicks.five_minutes, self.wrapper.fetched_intervals[-1])
+
+    def test_resample_from_gapped(self):
+        last = int(time.time() / 60) * 60
+        # Plenty of one minute candles but most of them are before a gap
+        rows = [(last - i * 60, 1, 2, 0, 1, 10) for i in range(600, 540, -1) + range(10, 0, -1)]
+        self.storage.save_candles('test', 'BTC/ETH', 'one_minute', rows, 1000)
+        candles = self.wrapper.get_candles('BTC', 'ETH', CandleTicks.five_minutes, 10)
+        self.assertEqual([CandleTicks.five_minutes], self.wrapper.fetched_intervals)
+        self.assertEqual(10, len(candles))
+
+    def test_max_candles(self):
+        self.wrapper.set_candle_cache(CandleCache(self.storage, 'test', max_candles=3))
+        self.get_candles(10)
+        rows = self.storage.load_candles('test', 'BTC/ETH', 'one_minute')
+        self.assertEqual(3, len(rows))
+        self.assertEqual(int(time.time() / 60) * 60 - 60, rows[-1][0])
+
+if __name__ == "__main__":
+    unittest.main()
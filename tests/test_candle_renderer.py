@@ -0,0 +1,74 @@
+import unittest
+import re
+from StringIO import StringIO
+from ces.models import CandleSeries, CandleTicks
+from ces.candle_renderer import *
+
+ANSI_REGEX = re.compile(r'\033\[[0-9]+m')
+
+def make_series(count):
+    series = CandleSeries()
+    series.add_candles(
+        (i * 60, 10 + i % 7, 12 + i % 7, 9 + i % 5, 11 + i % 3, 1) for i in range(count)
+    )
+    return series
+
+class TestCandleRenderer(unittest.TestCase):
+    def test_group(self):
+        grouped = make_series(10).group(4)
+        self.assertEqual([0, 120, 360], list(grouped.timestamps))
+        self.assertEqual([10, 12, 16], list(grouped.open_prices))
+        self.assertEqual([13, 17, 18], list(grouped.highest_prices))
+        self.assertEqual([9, 9, 10], list(grouped.lowest_prices))
+        self.assertEqual([12, 13, 11], list(grouped.close_prices))
+        self.assertEqual([2, 4, 4], list(grouped.volumes))
+
+    def test_column(self):
+        # Rising candle with wicks above and below its body
+        column = CandleRenderer._build_column(0.25, 0.5, 0, 1, 8)
+        self.assertEqual(
+            [STICK_POS] * 3 + [UP_CANDLE] * 3 + [STICK_POS, ' '],
+            column
+        )
+        # Nothing fits between rows so it's drawn as a single stick
+        column = CandleRenderer._build_column(0.3, 0.3, 0.3, 0.3, 8)
+        self.assertEqual([' '] * 5 + [STICK_STABLE] + [' '] * 2, column)
+
+    def test_fits_terminal(self):
+        renderer = CandleRenderer(width=100, height=20)
+        output = StringIO()
+        renderer.display(make_series(5000), CandleTicks.one_minute, stream=output)
+        lines = output.getvalue().split('\n')[:-1]
+        self.assertEqual(23, len(lines))
+        for line in lines:
+            self.assertTrue(len(ANSI_REGEX.sub('', line)) <= 100)
+
+    def test_few_candles(self):
+        output = CandleRenderer(width=200, height=10).render(make_series(3), CandleTicks.one_day)
+        for line in output.split('\n')[1:11]:
+            chart = ANSI_REGEX.sub('', line).split(' | ')[1]
+            self.assertEqual(6, len(chart))
+
+    def test_title(self):
+        output = CandleRenderer(width=200, height=10).render(
+            make_series(3),
+            CandleTicks.one_day,
+            'BTC/XLM'
+        )
+        self.assertEqual('BTC/XLM, 1d candles', output.split('\n')[0])
+        # Merged candles show what they span rather than the requested interval
+        output = CandleRenderer(width=100, height=10).render(make_series(200), CandleTicks.thirty_minutes)
+        self.assertEqual(
+            '150m candles (5 thirty_minutes candles merged into each)',
+            output.split('\n')[0]
+        )
+
+    def test_format_span(self):
+        self.assertEqual('30m', CandleRenderer._format_span(60 * 30))
+        self.assertEqual('90m', CandleRenderer._format_span(60 * 90))
+        self.assertEqual('2h', CandleRenderer._format_span(60 * 60 * 2))
+        self.assertEqual('36h', CandleRenderer._format_span(60 * 60 * 36))
+        self.assertEqual('7d', CandleRenderer._format_span(60 * 60 * 24 * 7))
+
+if __name__ == "__main__":
+    unittest.main()
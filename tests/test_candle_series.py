@@ -0,0 +1,80 @@
+import unittest
+from ces.models import CandleSeries, CandleTicks
+
+def make_series(count, offset=0):
+    series = CandleSeries()
+    series.add_candles(
+        (i * 60, i + offset, i + offset + 2, i + offset - 1, i + offset + 1, i * 10)
+        for i in range(1, count + 1)
+    )
+    return series
+
+class TestCandleSeries(unittest.TestCase):
+    def test_columns(self):
+        series = make_series(3)
+        self.assertEqual(3, len(series))
+        self.assertEqual([60, 120, 180], list(series.timestamps))
+        self.assertEqual([2, 3, 4], list(series.close_prices))
+        self.assertEqual([10, 20, 30], list(series.volumes))
+        self.assertEqual(0, series.get_lowest_price())
+        self.assertEqual(5, series.get_highest_price())
+        self.assertEqual(None, CandleSeries().get_lowest_price())
+
+    def test_candle_access(self):
+        series = make_series(3)
+        candle = series[-1]
+        self.assertEqual((2, 5, 3, 4, 30), (
+            candle.lowest_price,
+            candle.highest_price,
+            candle.open_price,
+            candle.close_price,
+            candle.volume
+        ))
+        self.assertEqual(series.get_datetime(2), candle.timestamp)
+        self.assertEqual([1, 2, 3], map(lambda i: i.open_price, series))
+
+    def test_slicing(self):
+        series = make_series(5)
+        output = series[-2:]
+        self.assertTrue(isinstance(output, CandleSeries))
+        self.assertEqual([240, 300], list(output.timestamps))
+        self.assertEqual([4, 5], list(output.open_prices))
+        self.assertEqual(5, len(series[-10:]))
+
+    def test_resample(self):
+        series = CandleSeries()
+        # One minute candles starting at 00:02 with a gap at 00:06
+        series.add_candles(
+            (i * 60, i, i + 1, i - 1, i + 0.5, 1) for i in [2, 3, 4, 5, 7, 8, 9, 10]
+        )
+        output = series.resample(CandleTicks.five_minutes)
+        self.assertEqual([0, 300, 600], list(output.timestamps))
+        self.assertEqual([2, 5, 10], list(output.open_prices))
+        self.assertEqual([5, 10, 11], list(output.highest_prices))
+        self.assertEqual([1, 4, 9], list(output.lowest_prices))
+        self.assertEqual([4.5, 9.5, 10.5], list(output.close_prices))
+        self.assertEqual([3, 4, 1], list(output.volumes))
+        # Weeks start on mondays
+        series = CandleSeries()
+        series.add_candles((i * 86400, 1, 1, 1, 1, 1) for i in range(4, 12))
+        output = series.resample(CandleTicks.one_week)
+        self.assertEqual([4 * 86400, 11 * 86400], list(output.timestamps))
+        self.assertEqual([7, 1], list(output.volumes))
+
+    def test_normalize(self):
+        output = make_series(3).normalize(0, 5)
+        self.assertEqual([0.2, 0.4, 0.6], list(output.open_prices))
+        self.assertEqual([1.0], list(output.highest_prices)[-1:])
+        self.assertEqual([60, 120, 180], list(output.timestamps))
+
+    def test_arithmetic(self):
+        source = make_series(2, offset=4)
+        target = make_series(2, offset=1)
+        output = source / target
+        self.assertEqual([2.5, 2.0], list(output.open_prices))
+        self.assertEqual([60, 120], list(output.timestamps))
+        self.assertEqual([10, 12], list((source * 2).open_prices))
+        self.assertRaises(ValueError, lambda: source / make_series(3))
+
+if __name__ == "__main__":
+    unittest.main()
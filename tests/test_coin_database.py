@@ -0,0 +1,89 @@
+import unittest
+import threading
+import time
+from ces.storage import Storage
+from ces.coin_database import CoinDatabase
+
+API_DATA = [{
+    'symbol' : 'BTC',
+    'name' : 'Bitcoin',
+    'price_usd' : '6500.5',
+    'rank' : '1',
+    '24h_volume_usd' : '4000000000',
+    'market_cap_usd' : '110000000000',
+    'available_supply' : '17000000',
+    'total_supply' : '17000000',
+    'max_supply' : '21000000',
+    'percent_change_1h' : '0.5',
+    'percent_change_24h' : '-1.2',
+    'percent_change_7d' : '3.4',
+}]
+
+class FakeCoinDatabase(CoinDatabase):
+    def __init__(self, storage, api_data, web_event=None):
+        self.fake_api_data = api_data
+        self.web_event = web_event
+        self.web_started = threading.Event()
+        CoinDatabase.__init__(self, 'usd', storage=storage)
+
+    def _fetch_api_data(self):
+        if self.fake_api_data is None:
+            raise Exception('unreachable')
+        return self.fake_api_data
+
+    def _load_from_web(self, api_data):
+        self.web_started.set()
+        if self.web_event is not None:
+            self.web_event.wait()
+        raise Exception('unreachable')
+
+class TestCoinDatabase(unittest.TestCase):
+    def setUp(self):
+        self.storage = Storage(':memory:')
+
+    def test_snapshot(self):
+        coin_db = FakeCoinDatabase(self.storage, API_DATA)
+        coin_db.wait_for_data(1)
+        coin_db.stop()
+        self.assertEqual(6500.5, coin_db.get_currency_price('BTC').fiat_currency_price)
+
+        # The next one starts with the stored data even if it can't fetch anything
+        coin_db = FakeCoinDatabase(self.storage, None)
+        self.assertTrue(coin_db.has_coin('BTC'))
+        coin_db.stop()
+        metadata = coin_db.get_currency_metadata('BTC')
+        self.assertEqual(['Bitcoin', 1, 21000000.0], [metadata.name, metadata.rank,
+                                                       metadata.max_supply])
+        self.assertTrue(coin_db.get_data_age() < 5)
+
+    def test_no_data(self):
+        coin_db = FakeCoinDatabase(self.storage, None)
+        coin_db.wait_for_data(0.1)
+        coin_db.stop()
+        self.assertEqual(None, coin_db.get_data_age())
+        self.assertFalse(coin_db.has_coin('BTC'))
+
+    def test_reads_during_poll(self):
+        coin_db = FakeCoinDatabase(self.storage, API_DATA)
+        coin_db.wait_for_data(1)
+        coin_db.stop()
+
+        new_data = [dict(API_DATA[0], price_usd='7000')]
+        web_event = threading.Event()
+        coin_db = FakeCoinDatabase(self.storage, new_data, web_event)
+        # The poll is stuck but the stored data can be used
+        coin_db.web_started.wait()
+        metadata = coin_db.get_currency_metadata('BTC')
+        coins = coin_db.get_coins()
+        self.assertTrue(coin_db.has_coin('BTC'))
+        web_event.set()
+        while coin_db.get_currency_price('BTC').fiat_currency_price != 7000:
+            time.sleep(0.01)
+        coin_db.stop()
+        # Whatever was handed out before isn't modified
+        self.assertEqual(6500.5, metadata.price)
+        self.assertEqual([metadata], coins)
+        self.assertEqual(7000, coin_db.get_coins()[0].price)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from ces.coin_table_parser import CoinTableParser
+
+PAGE = '''<html><head><script>var x = "<tr>";</script></head><body>
+<table class="table" id="currencies-all">
+<thead><tr><th class="col-symbol">Symbol</th></tr></thead>
+<tbody>
+<tr id="id-bitcoin" class="">
+<td class="text-center">
+1
+</td>
+<td class="no-wrap currency-name" data-sort="Bitcoin">
+<span class="currency-symbol"><a href="/currencies/bitcoin/">BTC</a></span>
+<br>
+<a class="currency-name-container" href="/currencies/bitcoin/">Bitcoin</a>
+</td>
+<td class="text-left col-symbol">BTC</td>
+<td class="no-wrap market-cap text-right" data-usd="113453234133.0">
+$113,453,234,133
+</td>
+<td class="no-wrap text-right" data-sort="6627.05">
+<a href="/currencies/bitcoin/#markets" class="price" data-usd="6627.05">$6627.05</a>
+</td>
+<td class="no-wrap text-right circulating-supply" data-sort="17119675.0">
+<a href="/currencies/bitcoin/"><span data-supply="17119675.0">17,119,675</span></a>
+</td>
+<td class="no-wrap text-right " data-sort="4140450000.0">
+<a href="/currencies/bitcoin/#markets" class="volume" data-usd="4140450000.0">$4,140,450,000</a>
+</td>
+<td class="no-wrap percent-change  text-right positive_change" data-timespan="1h">0.22%</td>
+<td class="no-wrap percent-change  text-right negative_change" data-timespan="24h">-1.5%</td>
+<td class="no-wrap percent-change  text-right positive_change" data-timespan="7d">10.03%</td>
+</tr>
+<tr id="id-foo" class="">
+<td class="text-center">2</td>
+<td class="text-left col-symbol">FOO</td>
+<td class="no-wrap percent-change  text-right" data-timespan="1h"> </td>
+</tr>
+</tbody>
+</table>
+<table><tr><td class="text-center">3</td></tr></table>
+</body></html>'''
+
+BITCOIN = {
+    'rank' : '1',
+    'name' : 'Bitcoin',
+    'code' : 'BTC',
+    'market-cap' : '$113,453,234,133',
+    'price' : '$6627.05',
+    'circulating-supply' : '17,119,675',
+    'volume' : '$4,140,450,000',
+    'change-1h' : '0.22%',
+    'change-24h' : '-1.5%',
+    'change-7d' : '10.03%',
+}
+
+class TestCoinTableParser(unittest.TestCase):
+    def parse(self, chunk_size):
+        parser = CoinTableParser()
+        rows = []
+        for i in range(0, len(PAGE), chunk_size):
+            rows += parser.feed(PAGE[i:i + chunk_size])
+        self.assertTrue(parser.done)
+        return rows
+
+    def test_parse(self):
+        rows = self.parse(len(PAGE))
+        self.assertEqual(3, len(rows))
+        self.assertEqual({ 'code' : 'Symbol' }, rows[0])
+        self.assertEqual(BITCOIN, rows[1])
+        self.assertEqual({ 'rank' : '2', 'code' : 'FOO', 'change-1h' : None }, rows[2])
+
+    def test_chunks(self):
+        expected = self.parse(len(PAGE))
+        for chunk_size in [1, 7, 64, 1000]:
+            self.assertEqual(expected, self.parse(chunk_size))
+
+    def test_done(self):
+        parser = CoinTableParser()
+        table_end = PAGE.find('</table>') + len('</table>')
+        self.assertEqual(3, len(parser.feed(PAGE[:table_end])))
+        self.assertTrue(parser.done)
+        self.assertEqual([], parser.feed(PAGE[table_end:]))
+
+if __name__ == "__main__":
+    unittest.main()
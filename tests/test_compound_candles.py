@@ -0,0 +1,100 @@
+import unittest
+import threading
+from ces.models import CandleSeries, CandleTicks, Currency
+from ces.exceptions import *
+from ces.exchanges.request_scheduler import request_priority, get_request_priority, \
+                                            RequestPriority
+from ces.exchanges.compound_candles import get_compound_candles, find_leg
+
+def make_series(timestamps, price):
+    series = CandleSeries()
+    series.add_candles((i, price, price * 2, price / 2.0, price, 1) for i in timestamps)
+    return series
+
+class FakeHandle:
+    # If concurrent_calls is set, get_candles fails unless that many calls are running at
+    # the same time
+    def __init__(self, candles, concurrent_calls=None):
+        # (base, market) -> CandleSeries
+        self.candles = candles
+        self.concurrent_calls = concurrent_calls
+        self.started = []
+        self.all_started = threading.Event()
+        self.priorities = []
+
+    def get_markets(self, base_currency_code):
+        markets = [i[1] for i in self.candles.keys() if i[0] == base_currency_code]
+        if len(markets) == 0:
+            raise UnknownBaseCurrencyException(base_currency_code)
+        return map(lambda i: Currency(i, i, 0, 0), markets)
+
+    def get_candles(self, base_currency_code, market_currency_code, interval, limit):
+        if self.concurrent_calls is not None:
+            self.started.append(market_currency_code)
+            if len(self.started) == self.concurrent_calls:
+                self.all_started.set()
+            if not self.all_started.wait(5):
+                raise Exception('Markets fetched sequentially')
+        self.priorities.append(get_request_priority())
+        return self.candles[(base_currency_code, market_currency_code)]
+
+class TestCompoundCandles(unittest.TestCase):
+    def test_find_leg(self):
+        handle = FakeHandle({ ('BTC', 'ETH') : CandleSeries() })
+        self.assertEqual(('BTC', 'ETH', False), find_leg(handle, 'ETH', 'BTC'))
+        self.assertEqual(('BTC', 'ETH', True), find_leg(handle, 'BTC', 'ETH'))
+        self.assertRaises(UnknownMarketException, lambda: find_leg(handle, 'ETH', 'XLM'))
+
+    def test_two_markets(self):
+        handle = FakeHandle({
+            ('BTC', 'DOGE') : make_series([60, 120, 180], 4.0),
+            ('BTC', 'XLM') : make_series([60, 120, 180], 2.0),
+        })
+        output = get_compound_candles(handle, ['DOGE', 'BTC', 'XLM'], CandleTicks.one_minute, 10)
+        self.assertEqual([60, 120, 180], list(output.timestamps))
+        self.assertEqual([2.0] * 3, list(output.close_prices))
+        # The lowest price uses the highest one of the inverted market
+        self.assertEqual([0.5] * 3, list(output.lowest_prices))
+        self.assertEqual([8.0] * 3, list(output.highest_prices))
+
+    def test_gaps(self):
+        source = make_series([60, 120, 240], 4.0)
+        source.close_prices[1] = 8.0
+        handle = FakeHandle({
+            ('BTC', 'DOGE') : source,
+            ('BTC', 'XLM') : make_series([120, 180, 240], 2.0),
+        })
+        output = get_compound_candles(handle, ['DOGE', 'BTC', 'XLM'], CandleTicks.one_minute, 10)
+        # Starts when both markets have data and the missing candle uses the last close
+        self.assertEqual([120, 180, 240], list(output.timestamps))
+        self.assertEqual([4.0, 4.0, 2.0], list(output.close_prices))
+        self.assertEqual([2.0, 4.0, 2.0], list(output.open_prices))
+
+    def test_multi_hop(self):
+        timestamps = [60, 120]
+        handle = FakeHandle({
+            ('BTC', 'DOGE') : make_series(timestamps, 0.001),
+            ('BTC', 'ETH') : make_series(timestamps, 0.1),
+            ('ETH', 'XLM') : make_series(timestamps, 0.0001),
+        }, concurrent_calls=3)
+        # The markets are fetched at the same time
+        output = get_compound_candles(
+            handle,
+            ['DOGE', 'BTC', 'ETH', 'XLM'],
+            CandleTicks.one_minute,
+            1
+        )
+        self.assertEqual([120], list(output.timestamps))
+        self.assertAlmostEqual(100, output.close_prices[0])
+
+    def test_caller_priority(self):
+        handle = FakeHandle({
+            ('BTC', 'DOGE') : make_series([60], 4.0),
+            ('BTC', 'XLM') : make_series([60], 2.0),
+        })
+        with request_priority(RequestPriority.background):
+            get_compound_candles(handle, ['DOGE', 'BTC', 'XLM'], CandleTicks.one_minute, 10)
+        self.assertEqual([RequestPriority.background] * 2, handle.priorities)
+
+if __name__ == "__main__":
+    unittest.main()
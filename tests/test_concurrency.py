@@ -0,0 +1,35 @@
+import unittest
+import ces.concurrency as concurrency
+from ces.exchanges.request_scheduler import request_priority, get_request_priority, \
+                                            RequestPriority
+
+class TestConcurrency(unittest.TestCase):
+    def setUp(self):
+        self.pool = concurrency.make_thread_pool(2)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_fan_out(self):
+        def functor(item):
+            if item == 'b':
+                raise ValueError(item)
+            return (item, get_request_priority())
+        with request_priority(RequestPriority.background):
+            results, errors = concurrency.fan_out(self.pool, functor, ['a', 'b', 'c'])
+        # Workers use the caller's priority
+        self.assertEqual(
+            [('a', RequestPriority.background), ('c', RequestPriority.background)],
+            results.values()
+        )
+        self.assertEqual(['a', 'c'], results.keys())
+        self.assertEqual(['b'], errors.keys())
+        self.assertTrue(isinstance(errors['b'], ValueError))
+
+    def test_apply_async(self):
+        with request_priority(RequestPriority.trade):
+            result = concurrency.apply_async(self.pool, get_request_priority)
+        self.assertEqual(RequestPriority.trade, concurrency.get_result(result))
+
+if __name__ == "__main__":
+    unittest.main()
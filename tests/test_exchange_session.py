@@ -0,0 +1,90 @@
+import unittest
+import time
+from ces.exchanges.exchange_session import ExchangeSession
+from ces.exceptions import *
+from ces.models import Currency
+
+class FakeHandle:
+    def __init__(self, wallets, delay=0, markets=None, error=None, currencies=None):
+        self.wallets = wallets
+        self.currencies = currencies or []
+        self.delay = delay
+        self.markets = markets or {}
+        self.error = error
+
+    def get_wallets(self):
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.wallets
+
+    def get_markets(self, base_currency_code):
+        if base_currency_code not in self.markets:
+            raise UnknownBaseCurrencyException(base_currency_code)
+        return map(lambda i: Currency(i, i, 0, 0), self.markets[base_currency_code])
+
+    def get_market_state(self, base_currency_code, market_currency_code):
+        return (base_currency_code, market_currency_code)
+
+    def get_currency(self, currency_code):
+        if currency_code not in self.currencies:
+            raise UnknownCurrencyException(currency_code)
+        return (self, currency_code)
+
+class TestExchangeSession(unittest.TestCase):
+    def test_wallets_are_fetched_concurrently(self):
+        session = ExchangeSession({
+            'a' : FakeHandle([1, 2], delay=0.3),
+            'b' : FakeHandle([3], delay=0.3),
+            'c' : FakeHandle([4], delay=0.3),
+        }, 'a')
+        start = time.time()
+        result = session.aggregate.get_wallets()
+        # Close to the slowest exchange rather than the sum of them
+        self.assertTrue(time.time() - start < 0.6)
+        self.assertEqual([('a', 1), ('a', 2), ('b', 3), ('c', 4)], result.rows)
+        self.assertEqual(0, len(result.errors))
+
+    def test_errors_are_captured(self):
+        error = ExchangeAPIException('boom')
+        session = ExchangeSession({
+            'a' : FakeHandle([1]),
+            'b' : FakeHandle([2], error=error),
+        }, 'b')
+        result = session.aggregate.get_wallets()
+        self.assertEqual([('a', 1)], result.rows)
+        self.assertEqual({ 'b' : error }, dict(result.errors))
+
+    def test_market_state_only_listed_exchanges(self):
+        session = ExchangeSession({
+            'a' : FakeHandle([], markets={ 'BTC' : ['ETH'] }),
+            'b' : FakeHandle([], markets={ 'ETH' : ['XLM'] }),
+        }, 'a')
+        result = session.aggregate.get_market_state('BTC', 'ETH')
+        self.assertEqual([('a', ('BTC', 'ETH'))], result.rows)
+        self.assertRaises(
+            UnknownMarketException,
+            lambda: session.aggregate.get_market_state('BTC', 'LTC')
+        )
+
+    def test_active_exchange(self):
+        session = ExchangeSession({ 'a' : FakeHandle([]), 'b' : FakeHandle([]) }, 'b')
+        self.assertEqual(['a', 'b'], session.get_exchange_names())
+        self.assertTrue(session.get_active_handle() is session.get_handle('b'))
+        session.set_active_exchange('a')
+        self.assertTrue(session.get_active_handle() is session.get_handle('a'))
+        self.assertRaises(UnknownExchangeException, lambda: session.set_active_exchange('c'))
+        self.assertEqual('a', session.active_exchange_name)
+
+    def test_currency_from_any_exchange(self):
+        session = ExchangeSession({
+            'a' : FakeHandle([], currencies=['BTC', 'ETH']),
+            'b' : FakeHandle([], currencies=['BTC', 'XLM']),
+        }, 'b')
+        # The active exchange goes first
+        self.assertEqual((session.get_handle('b'), 'BTC'), session.get_currency('BTC'))
+        self.assertEqual((session.get_handle('a'), 'ETH'), session.get_currency('ETH'))
+        self.assertRaises(UnknownCurrencyException, lambda: session.get_currency('LTC'))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import requests
+import threading
+import time
+import ces.exchanges.kucoin_wrapper as kucoin_wrapper
+from ces.exchanges.kucoin_wrapper import KucoinWrapper
+
+EMPTY_METADATA = { 'currencies' : [], 'markets' : [] }
+
+class FakeClient:
+    def __init__(self, api_key, api_secret):
+        self.session = requests.session()
+
+class FakePagedEndpoint:
+    def __init__(self, entry_count, report_total=True, delay=0):
+        self.entry_count = entry_count
+        self.report_total = report_total
+        self.delay = delay
+        self.requested_pages = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, limit, page):
+        with self._lock:
+            self.requested_pages.append(page)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        start = (page - 1) * limit
+        data = { 'datas' : range(start, min(start + limit, self.entry_count)) }
+        if self.report_total:
+            data['total'] = self.entry_count
+        return data
+
+class TestKucoinPaging(unittest.TestCase):
+    def setUp(self):
+        self._original_client = kucoin_wrapper.Client
+        kucoin_wrapper.Client = FakeClient
+
+    def tearDown(self):
+        kucoin_wrapper.Client = self._original_client
+
+    def make_wrapper(self, max_page_requests=KucoinWrapper.MAX_PAGE_REQUESTS):
+        return KucoinWrapper(None, None, EMPTY_METADATA, max_page_requests)
+
+    def test_known_total(self):
+        endpoint = FakePagedEndpoint(420, delay=0.05)
+        output = []
+        self.make_wrapper()._process_paged_request(endpoint, output.append)
+        self.assertEqual(range(420), output)
+        self.assertEqual(range(1, 10), sorted(endpoint.requested_pages))
+        self.assertTrue(endpoint.max_active > 1)
+        self.assertTrue(endpoint.max_active <= KucoinWrapper.MAX_PAGE_REQUESTS)
+
+    def test_unknown_total(self):
+        endpoint = FakePagedEndpoint(100, report_total=False)
+        output = []
+        self.make_wrapper(2)._process_paged_request(endpoint, output.append)
+        self.assertEqual(range(100), output)
+        self.assertTrue(3 in endpoint.requested_pages)
+
+    def test_early_stop(self):
+        endpoint = FakePagedEndpoint(1000)
+        output = []
+        self.make_wrapper(1)._process_paged_request(
+            endpoint,
+            output.append,
+            lambda entry: entry >= 75
+        )
+        self.assertEqual(range(75), output)
+        self.assertEqual([1, 2], endpoint.requested_pages)
+
+if __name__ == "__main__":
+    unittest.main()
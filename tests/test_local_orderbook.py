@@ -0,0 +1,69 @@
+import unittest
+import threading
+import time
+from ces.exchanges.local_orderbook import LocalOrderbook
+
+class FakeSnapshots:
+    def __init__(self, snapshots):
+        self.snapshots = snapshots
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self):
+        self.release.wait(5)
+        snapshot = self.snapshots[min(self.calls, len(self.snapshots) - 1)]
+        self.calls += 1
+        return snapshot
+
+class TestLocalOrderbook(unittest.TestCase):
+    def wait_until_synced(self, book):
+        deadline = time.time() + 5
+        while not book.is_synced() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(book.is_synced())
+
+    def test_buffered_diffs(self):
+        snapshots = FakeSnapshots([(10, [(1.0, 5), (0.9, 3)], [(1.1, 2), (1.2, 4)])])
+        snapshots.release.clear()
+        book = LocalOrderbook(snapshots)
+        # Arrives while the snapshot is being fetched, older than it
+        book.apply_diff(5, 8, [(1.0, 100)], [])
+        # Straddles the snapshot's update id
+        book.apply_diff(9, 12, [(0.9, 0)], [(1.15, 1)])
+        snapshots.release.set()
+        self.wait_until_synced(book)
+        book.apply_diff(13, 13, [(1.05, 7)], [(1.1, 0)])
+        self.assertEqual(
+            ([(1.05, 7), (1.0, 5)], [(1.15, 1), (1.2, 4)]),
+            book.get_levels()
+        )
+        self.assertEqual(([(1.05, 7)], [(1.15, 1)]), book.get_levels(1))
+        self.assertEqual(1, snapshots.calls)
+
+    def test_gap_triggers_resync(self):
+        snapshots = FakeSnapshots([
+            (10, [(1.0, 5)], [(1.1, 2)]),
+            (20, [(0.8, 1)], [(1.3, 1)]),
+        ])
+        book = LocalOrderbook(snapshots)
+        book.apply_diff(11, 11, [], [])
+        self.wait_until_synced(book)
+        # 12-14 were missed
+        book.apply_diff(15, 21, [(0.7, 2)], [])
+        self.wait_until_synced(book)
+        self.assertEqual(2, snapshots.calls)
+        self.assertEqual(2, book.resync_count)
+        self.assertEqual(([(0.8, 1), (0.7, 2)], [(1.3, 1)]), book.get_levels())
+
+    def test_orderbooks(self):
+        book = LocalOrderbook(FakeSnapshots([(1, [(1.0, 5)], [(1.1, 2)])]))
+        book.apply_diff(2, 2, [], [])
+        self.wait_until_synced(book)
+        self.assertTrue(book.is_live(10))
+        buy_orderbook, sell_orderbook = book.to_orderbooks()
+        self.assertEqual([(1.0, 5)], map(lambda i: (i.rate, i.quantity), buy_orderbook.orders))
+        self.assertEqual([(1.1, 2)], map(lambda i: (i.rate, i.quantity), sell_orderbook.orders))
+
+if __name__ == "__main__":
+    unittest.main()
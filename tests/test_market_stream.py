@@ -0,0 +1,84 @@
+import unittest
+import os
+import time
+import ces.exchanges.binance_wrapper as binance_wrapper
+from ces.exchanges.market_stream import BinanceMarketStream
+from tests.test_binance_wrapper import FakeClient, FakeBinanceWrapper
+from tests.websocket_stand_in import WebSocketStandIn
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), 'data')
+FRAMES_PATH = os.path.join(DATA_PATH, 'binance_market_stream.jsonl')
+DEPTH_FRAMES_PATH = os.path.join(DATA_PATH, 'binance_depth_stream.jsonl')
+
+class TestBinanceMarketStream(unittest.TestCase):
+    def setUp(self):
+        self._original_client = binance_wrapper.Client
+        binance_wrapper.Client = FakeClient
+        self.server = WebSocketStandIn(
+            WebSocketStandIn.load_frames(FRAMES_PATH) +
+            WebSocketStandIn.load_frames(DEPTH_FRAMES_PATH)
+        )
+        self.wrapper = FakeBinanceWrapper(None, None)
+        self.wrapper.enable_market_stream(self.server.url)
+        self.client = self.wrapper._handle
+
+    def tearDown(self):
+        self.wrapper._market_stream.close()
+        self.server.close()
+        binance_wrapper.Client = self._original_client
+
+    def wait_for_stream(self, symbol):
+        stream = self.wrapper._market_stream
+        deadline = time.time() + 5
+        while stream.get_market_state(symbol) is None and time.time() < deadline:
+            time.sleep(0.05)
+
+    def test_streamed_market_state(self):
+        # The first lookup uses the REST API and subscribes to the streams
+        state = self.wrapper.get_market_state('BTC', 'ETH')
+        self.assertEqual(1.5, state.last)
+        self.assertEqual(['get_ticker'], self.client.calls)
+        self.wait_for_stream('ETHBTC')
+        self.assertEqual(['/stream?streams=ethbtc@ticker/ethbtc@bookTicker'], self.server.paths)
+
+        state = self.wrapper.get_market_state('BTC', 'ETH')
+        # Bid/ask come from the last book ticker frame, last price from the ticker one
+        self.assertEqual(0.04512340, state.ask)
+        self.assertEqual(0.04512260, state.bid)
+        self.assertEqual(0.04512300, state.last)
+        self.assertEqual(['get_ticker'], self.client.calls)
+
+    def test_stale_stream_falls_back_to_rest(self):
+        self.wrapper.get_market_state('BTC', 'ETH')
+        self.wait_for_stream('ETHBTC')
+        original_stale_after = BinanceMarketStream.STALE_AFTER
+        BinanceMarketStream.STALE_AFTER = 0
+        try:
+            state = self.wrapper.get_market_state('BTC', 'ETH')
+        finally:
+            BinanceMarketStream.STALE_AFTER = original_stale_after
+        self.assertEqual(1.5, state.last)
+        self.assertEqual(['get_ticker', 'get_ticker'], self.client.calls)
+
+    def test_local_orderbook(self):
+        self.wrapper.get_orderbook('BTC', 'ETH')
+        self.assertEqual(['get_order_book'], self.client.calls)
+        stream = self.wrapper._market_stream
+        deadline = time.time() + 5
+        while stream.get_orderbook('ETHBTC') is None and time.time() < deadline:
+            time.sleep(0.05)
+        # Give it time to apply every diff
+        time.sleep(0.2)
+        buy_orderbook, sell_orderbook = self.wrapper.get_orderbook('BTC', 'ETH')
+        self.assertEqual(['get_order_book', 'get_order_book'], self.client.calls)
+        self.assertEqual(
+            [(0.04511, 2.5), (0.0449, 3.0)],
+            map(lambda i: (i.rate, i.quantity), buy_orderbook.orders)
+        )
+        self.assertEqual(
+            [(0.04513, 1.0), (0.0453, 4.0)],
+            map(lambda i: (i.rate, i.quantity), sell_orderbook.orders)
+        )
+
+if __name__ == "__main__":
+    unittest.main()
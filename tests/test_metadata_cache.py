@@ -0,0 +1,63 @@
+import unittest
+import time
+from ces.storage import Storage
+from ces.models import Currency
+from ces.exchanges.base_exchange_wrapper import BaseExchangeWrapper
+from ces.exchanges.metadata_cache import ExchangeMetadataCache
+
+class FakeWrapper(BaseExchangeWrapper):
+    def __init__(self, markets, metadata=None):
+        BaseExchangeWrapper.__init__(self)
+        self.markets = markets
+        self._init_metadata(metadata)
+
+    def _load_markets(self):
+        for base_code, market_code in self.markets:
+            self.add_currency(Currency(base_code, base_code.lower(), 1, 0.1))
+            self.add_currency(Currency(market_code, market_code.lower(), 2, 0.2))
+            self.add_market(base_code, market_code, '{0}-{1}'.format(base_code, market_code))
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self):
+        self.storage = Storage(':memory:')
+
+    def test_export_import(self):
+        wrapper = FakeWrapper([('BTC', 'ETH'), ('BTC', 'XLM')])
+        metadata = wrapper.export_metadata()
+        other = FakeWrapper([], metadata)
+        self.assertEqual(metadata, other.export_metadata())
+        self.assertEqual(('BTC', 'XLM'), other._split_symbol('BTC-XLM'))
+        self.assertEqual('eth', other.get_currency('ETH').name)
+        self.assertEqual(set(['ETH', 'XLM']), set(map(lambda i: i.code, other.get_markets('BTC'))))
+
+    def test_save_load(self):
+        cache = ExchangeMetadataCache(self.storage, 'test')
+        self.assertEqual(None, cache.load())
+        metadata = FakeWrapper([('BTC', 'ETH')]).export_metadata()
+        cache.save(metadata)
+        self.assertEqual(metadata, cache.load())
+        # Other exchanges don't see it
+        self.assertEqual(None, ExchangeMetadataCache(self.storage, 'other').load())
+
+    def test_expired(self):
+        cache = ExchangeMetadataCache(self.storage, 'test', ttl=-1)
+        cache.save(FakeWrapper([('BTC', 'ETH')]).export_metadata())
+        self.assertEqual(None, cache.load())
+
+    def test_version_mismatch(self):
+        self.storage.save_exchange_metadata('test', ExchangeMetadataCache.VERSION + 1,
+                                            time.time(), '{}')
+        self.assertEqual(None, ExchangeMetadataCache(self.storage, 'test').load())
+
+    def test_refresh(self):
+        cache = ExchangeMetadataCache(self.storage, 'test')
+        cache.save(FakeWrapper([('BTC', 'ETH')]).export_metadata())
+        wrapper = FakeWrapper([('BTC', 'ETH'), ('ETH', 'XLM')], cache.load())
+        self.assertEqual(['BTC'], map(lambda i: i.code, wrapper.get_base_currencies()))
+        cache.revalidate_in_background(wrapper).join()
+        self.assertEqual(('ETH', 'XLM'), wrapper._split_symbol('ETH-XLM'))
+        self.assertEqual(wrapper.export_metadata(), cache.load())
+        self.assertFalse(wrapper.refresh_metadata())
+
+if __name__ == "__main__":
+    unittest.main()
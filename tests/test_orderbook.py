@@ -0,0 +1,45 @@
+import unittest
+from ces.models import Order, Orderbook, get_mid_price
+
+class TestOrderbook(unittest.TestCase):
+    def make_orderbook(self, levels):
+        orderbook = Orderbook()
+        for price, quantity in levels:
+            orderbook.add_level(price, quantity)
+        return orderbook
+
+    def test_orders_compatibility(self):
+        orderbook = self.make_orderbook([(10, 1)])
+        orderbook.add_order(Order(9.5, 2))
+        self.assertEqual(2, len(orderbook.orders))
+        self.assertEqual([(10.0, 1.0), (9.5, 2.0)],
+                         [(i.rate, i.quantity) for i in orderbook.orders])
+        self.assertEqual(9.5, orderbook.orders[1].rate)
+
+    def test_cumulative_values(self):
+        orderbook = self.make_orderbook([(10, 1), (9, 2), (8, 3)])
+        self.assertEqual([1, 3, 6], list(orderbook.cumulative_quantities))
+        self.assertEqual([10, 28, 52], list(orderbook.cumulative_notionals))
+
+    def test_fill_price(self):
+        asks = self.make_orderbook([(10, 1), (11, 2), (12, 3)])
+        self.assertEqual((10, 10), asks.get_fill_price(0.5))
+        self.assertEqual((10.5, 11), asks.get_fill_price(2))
+        self.assertEqual((32 / 3.0, 11), asks.get_fill_price(3))
+        self.assertEqual((68 / 6.0, 12), asks.get_fill_price(6))
+        self.assertEqual(None, asks.get_fill_price(6.5))
+        self.assertEqual(None, Orderbook().get_fill_price(1))
+
+    def test_quantity_within(self):
+        bids = self.make_orderbook([(99, 1), (98, 2), (90, 4)])
+        asks = self.make_orderbook([(101, 3), (103, 5), (120, 1)])
+        mid_price = get_mid_price(bids, asks)
+        self.assertEqual(100, mid_price)
+        self.assertEqual(3, bids.get_quantity_within(mid_price, 2))
+        self.assertEqual(8, asks.get_quantity_within(mid_price, 3))
+        self.assertEqual(0, asks.get_quantity_within(mid_price, 0.5))
+        self.assertEqual(9, asks.get_quantity_within(mid_price, 50))
+        self.assertEqual(None, get_mid_price(Orderbook(), asks))
+
+if __name__ == "__main__":
+    unittest.main()
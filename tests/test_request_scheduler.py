@@ -0,0 +1,100 @@
+import unittest
+import threading
+import time
+from ces.exchanges.request_scheduler import *
+
+class TestRequestScheduler(unittest.TestCase):
+    def run_in_thread(self, functor):
+        output = []
+        thread = threading.Thread(target=lambda: output.append(functor()))
+        thread.daemon = True
+        thread.start()
+        return thread, output
+
+    def test_waits_for_window(self):
+        scheduler = RequestScheduler(10, window=0.3)
+        scheduler.acquire(8)
+        start = time.time()
+        scheduler.acquire(5)
+        self.assertTrue(time.time() - start >= 0.25)
+
+    def test_trades_never_wait(self):
+        scheduler = RequestScheduler(10, window=60)
+        scheduler.acquire(9)
+        start = time.time()
+        with request_priority(RequestPriority.trade):
+            self.assertEqual(1, scheduler.run(lambda: 1, 5))
+        self.assertTrue(time.time() - start < 0.1)
+        self.assertEqual(14, scheduler.get_used_weight())
+
+    def test_background_uses_part_of_budget(self):
+        scheduler = RequestScheduler(10, window=0.3)
+        scheduler.acquire(5)
+        start = time.time()
+        with request_priority(RequestPriority.background):
+            scheduler.acquire(1)
+        self.assertTrue(time.time() - start >= 0.25)
+
+    def test_reported_weight(self):
+        scheduler = RequestScheduler(10, window=60)
+        scheduler.update_used_weight(7)
+        self.assertEqual(7, scheduler.get_used_weight())
+        scheduler.acquire(2)
+        self.assertEqual(7, scheduler.get_used_weight())
+
+    def test_block_for(self):
+        scheduler = RequestScheduler(10, window=60)
+        scheduler.block_for(0.3)
+        start = time.time()
+        scheduler.acquire(1)
+        self.assertTrue(time.time() - start >= 0.25)
+
+    def test_coalescing(self):
+        scheduler = RequestScheduler(10, window=60)
+        release = threading.Event()
+        calls = []
+        def slow_call():
+            calls.append(1)
+            release.wait(5)
+            return 'result'
+        first, first_output = self.run_in_thread(lambda: scheduler.run(slow_call, 1, 'key'))
+        while len(calls) == 0:
+            time.sleep(0.01)
+        second, second_output = self.run_in_thread(lambda: scheduler.run(slow_call, 1, 'key'))
+        time.sleep(0.1)
+        release.set()
+        first.join()
+        second.join()
+        self.assertEqual(['result'], first_output)
+        self.assertEqual(['result'], second_output)
+        self.assertEqual(1, len(calls))
+        self.assertEqual(1, scheduler.get_used_weight())
+
+    def test_interrupted_call(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        def interrupted_call():
+            started.set()
+            release.wait(5)
+            raise KeyboardInterrupt()
+        def run_owner():
+            try:
+                flight.run('key', interrupted_call)
+            except KeyboardInterrupt:
+                return 'interrupted'
+        first, first_output = self.run_in_thread(run_owner)
+        started.wait(5)
+        second, second_output = self.run_in_thread(lambda: flight.run('key', lambda: 'result'))
+        while flight.saved_calls == 0:
+            time.sleep(0.01)
+        release.set()
+        first.join()
+        second.join()
+        # The waiting call performs its own request instead of getting nothing
+        self.assertEqual(['interrupted'], first_output)
+        self.assertEqual(['result'], second_output)
+        self.assertEqual(0, flight.saved_calls)
+
+if __name__ == "__main__":
+    unittest.main()
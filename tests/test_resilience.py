@@ -0,0 +1,100 @@
+import unittest
+import time
+import requests
+from ces.exchanges.resilience import ResilientClient
+from ces.exchanges.request_scheduler import request_priority, RequestPriority, \
+                                            RequestScheduler
+from ces.exceptions import ExchangeAPIException
+
+class FakeClient:
+    def __init__(self, failures=0, error=None, delays=None):
+        self.failures = failures
+        self.error = error or requests.ConnectionError('connection reset')
+        self.delays = delays or []
+        self.calls = 0
+
+    def get_ticker(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        if len(self.delays) > 0:
+            time.sleep(self.delays.pop(0))
+        return self.calls
+
+class TestResilientClient(unittest.TestCase):
+    def setUp(self):
+        self._original_delay = ResilientClient.BASE_DELAY
+        ResilientClient.BASE_DELAY = 0.01
+
+    def tearDown(self):
+        ResilientClient.BASE_DELAY = self._original_delay
+
+    def get_stats(self, client):
+        return dict(client.get_request_stats())['get_ticker']
+
+    def test_retries_transient_errors(self):
+        client = ResilientClient(FakeClient(failures=2))
+        self.assertEqual(3, client.get_ticker())
+        self.assertEqual(2, self.get_stats(client).retries)
+
+    def test_gives_up(self):
+        client = ResilientClient(FakeClient(failures=10))
+        self.assertRaises(requests.ConnectionError, client.get_ticker)
+        self.assertEqual(ResilientClient.MAX_RETRIES + 1, client.calls)
+
+    def test_permanent_errors_are_not_retried(self):
+        client = ResilientClient(FakeClient(failures=1, error=ValueError('bad symbol')))
+        self.assertRaises(ValueError, client.get_ticker)
+        self.assertEqual(1, client.calls)
+        # Unless the caller says so
+        client = ResilientClient(FakeClient(failures=1, error=ValueError('bad json')), (ValueError,))
+        self.assertEqual(2, client.get_ticker())
+
+    def test_trades_are_not_retried(self):
+        client = ResilientClient(FakeClient(failures=1))
+        with request_priority(RequestPriority.trade):
+            self.assertRaises(requests.ConnectionError, client.get_ticker)
+        self.assertEqual(1, client.calls)
+
+    def test_circuit_breaker(self):
+        client = ResilientClient(FakeClient(failures=100), max_retries=0)
+        for i in range(ResilientClient.FAILURE_THRESHOLD):
+            self.assertRaises(requests.ConnectionError, client.get_ticker)
+        self.assertRaises(ExchangeAPIException, client.get_ticker)
+        self.assertEqual(ResilientClient.FAILURE_THRESHOLD, client.calls)
+        self.assertTrue(self.get_stats(client).is_circuit_open())
+
+    def test_hedging(self):
+        samples = ResilientClient.HEDGE_MIN_SAMPLES
+        # The last call is much slower than the rest so a second one is sent
+        fake = FakeClient(delays=[0.01] * samples + [1, 0])
+        client = ResilientClient(fake)
+        for i in range(samples):
+            client.get_ticker()
+        start = time.time()
+        self.assertEqual(samples + 2, client.get_ticker())
+        self.assertTrue(time.time() - start < 0.5)
+        stats = self.get_stats(client)
+        self.assertEqual(1, stats.hedges)
+        self.assertEqual(1, stats.hedge_wins)
+
+    def test_attempts_are_scheduled(self):
+        scheduler = RequestScheduler(100, window=60)
+        client = ResilientClient(FakeClient(failures=2))
+        self.assertEqual(3, scheduler.run(client.get_ticker, 10))
+        # Every retry is charged like the original request
+        self.assertEqual(30, scheduler.get_used_weight())
+
+    def test_hedges_are_scheduled(self):
+        samples = ResilientClient.HEDGE_MIN_SAMPLES
+        fake = FakeClient(delays=[0] * samples + [1, 0])
+        client = ResilientClient(fake)
+        for i in range(samples):
+            client.get_ticker()
+        scheduler = RequestScheduler(100, window=60)
+        scheduler.run(client.get_ticker, 10)
+        self.assertEqual(1, self.get_stats(client).hedges)
+        self.assertEqual(20, scheduler.get_used_weight())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import threading
+from ces.startup import StartupPipeline
+from ces.exceptions import StartupException
+
+class TestStartupPipeline(unittest.TestCase):
+    def test_dependencies(self):
+        pipeline = StartupPipeline()
+        pipeline.add_stage('a', lambda: 1)
+        pipeline.add_stage('b', lambda: 2)
+        pipeline.add_stage('c', lambda a, b: a + b, ['a', 'b'])
+        pipeline.add_stage('d', lambda c: c * 10, ['c'])
+        results = pipeline.run()
+        self.assertEqual({ 'a' : 1, 'b' : 2, 'c' : 3, 'd' : 30 }, results)
+
+    def test_independent_stages_run_concurrently(self):
+        barrier = threading.Event()
+        def first():
+            # This only finishes if the second stage runs while we're waiting
+            if not barrier.wait(5):
+                raise Exception('Stages ran sequentially')
+        pipeline = StartupPipeline()
+        pipeline.add_stage('first', first)
+        pipeline.add_stage('second', barrier.set)
+        pipeline.run()
+
+    def test_failure(self):
+        def fail():
+            raise ValueError('nope')
+        executed = []
+        pipeline = StartupPipeline()
+        pipeline.add_stage('a', fail)
+        pipeline.add_stage('b', lambda a: executed.append(a), ['a'])
+        try:
+            pipeline.run()
+            self.fail('Expected exception')
+        except StartupException as ex:
+            self.assertEqual('a', ex.stage)
+            self.assertTrue(isinstance(ex.error, ValueError))
+        self.assertEqual([], executed)
+
+    def test_optional_failure(self):
+        error = ValueError('nope')
+        def fail():
+            raise error
+        pipeline = StartupPipeline()
+        pipeline.add_stage('a', lambda: 1, optional=True)
+        pipeline.add_stage('b', fail, optional=True)
+        pipeline.add_stage('c', lambda a, b: [a, b], ['a', 'b'])
+        results = pipeline.run()
+        self.assertEqual([1, None], results['c'])
+        self.assertTrue(pipeline.get_error('b') is error)
+        self.assertEqual(None, pipeline.get_error('a'))
+
+    def test_unknown_dependency(self):
+        pipeline = StartupPipeline()
+        self.assertRaises(ValueError, lambda: pipeline.add_stage('a', lambda: 1, ['b']))
+
+if __name__ == "__main__":
+    unittest.main()
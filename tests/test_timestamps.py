@@ -0,0 +1,45 @@
+import unittest
+import datetime
+import ces.timestamps as timestamps
+
+class TestTimestamps(unittest.TestCase):
+    def test_epoch_seconds(self):
+        self.assertEqual(1518000000, timestamps.to_epoch_seconds(1518000000))
+        self.assertEqual(1518000000, timestamps.to_epoch_seconds(1518000000000))
+        self.assertEqual(1518000000.5, timestamps.to_epoch_seconds('1518000000500'))
+        self.assertEqual(1518000000, timestamps.to_epoch_seconds('1518000000'))
+
+    def test_iso_8601(self):
+        self.assertEqual(1518000000, timestamps.to_epoch_seconds('2018-02-07T10:40:00'))
+        self.assertEqual(1518000000, timestamps.to_epoch_seconds('2018-02-07 10:40:00Z'))
+        self.assertAlmostEqual(
+            1518000000.123456,
+            timestamps.to_epoch_seconds('2018-02-07T10:40:00.1234567'),
+            places=5
+        )
+        self.assertEqual(
+            1518000000,
+            timestamps.to_epoch_seconds('2018-02-07T12:40:00+02:00')
+        )
+        self.assertEqual(
+            1518000000,
+            timestamps.to_epoch_seconds('2018-02-07T07:10:00-0330')
+        )
+
+    def test_fallback(self):
+        self.assertEqual(1518000000, timestamps.to_epoch_seconds('7 February 2018 10:40'))
+
+    def test_local_time(self):
+        expected = datetime.datetime.fromtimestamp(1518000000)
+        self.assertEqual(expected, timestamps.from_epoch(1518000000000))
+        self.assertEqual(expected, timestamps.from_utc_time('2018-02-07T10:40:00').replace(
+            tzinfo=None
+        ))
+        self.assertEqual(
+            datetime.datetime.fromtimestamp(1531000000),
+            timestamps.from_epoch(1531000000)
+        )
+        self.assertTrue(timestamps.from_utc_time(1518000000).tzinfo is not None)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import threading
+import time
+from ces.storage import Storage
+from ces.exchanges.trade_ledger import TradeLedger
+
+class FakeTrades:
+    def __init__(self, trade_counts, failing=(), release=None):
+        self.trade_counts = trade_counts
+        self.failing = failing
+        # If set, requests wait for it before returning
+        self.release = release
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def __call__(self, symbol, from_id, limit):
+        with self._lock:
+            self.requests.append((symbol, from_id))
+        if self.release is not None:
+            self.release.wait()
+        if symbol in self.failing:
+            raise Exception('boom')
+        trade_ids = range(from_id, min(from_id + limit, self.trade_counts[symbol]))
+        return [(i, str(i / 2), 1000 + i, 1.5, 2.0, i % 2 == 0) for i in trade_ids]
+
+class TestTradeLedger(unittest.TestCase):
+    def setUp(self):
+        self.ledger = TradeLedger(Storage(':memory:'), 'test')
+
+    def test_incremental_sync(self):
+        fetch = FakeTrades({ 'ETHBTC' : 2500, 'XLMBTC' : 3 })
+        self.assertEqual({}, self.ledger.sync(['ETHBTC', 'XLMBTC'], fetch))
+        self.assertEqual(
+            [('ETHBTC', 0), ('ETHBTC', 1000), ('ETHBTC', 2000), ('XLMBTC', 0)],
+            sorted(fetch.requests)
+        )
+        self.assertEqual({ 'ETHBTC' : 2499, 'XLMBTC' : 2 }, self.ledger.get_cursors())
+        self.assertEqual(2503, len(self.ledger.get_trades()))
+
+        fetch.requests = []
+        fetch.trade_counts['XLMBTC'] = 5
+        self.ledger.sync(['ETHBTC', 'XLMBTC'], fetch)
+        # Only trades after the last stored one are requested
+        self.assertEqual([('ETHBTC', 2500), ('XLMBTC', 3)], sorted(fetch.requests))
+        self.assertEqual(2505, len(self.ledger.get_trades()))
+
+    def test_concurrent_symbols(self):
+        symbols = ['A', 'B', 'C', 'D']
+        started = []
+        all_started = threading.Event()
+        fetch = FakeTrades(dict((i, 1) for i in symbols))
+        def fetch_concurrently(symbol, from_id, limit):
+            started.append(symbol)
+            if len(started) == len(symbols):
+                all_started.set()
+            # This only finishes if every symbol is being synced at the same time
+            if not all_started.wait(5):
+                raise Exception('Symbols synced sequentially')
+            return fetch(symbol, from_id, limit)
+        self.assertEqual({}, self.ledger.sync(symbols, fetch_concurrently))
+        self.assertEqual(4, len(self.ledger.get_trades()))
+
+    def test_errors(self):
+        fetch = FakeTrades({ 'A' : 1, 'B' : 1 }, failing=['B'])
+        errors = self.ledger.sync(['A', 'B'], fetch)
+        self.assertEqual(['B'], errors.keys())
+        self.assertEqual({ 'A' : 0 }, self.ledger.get_cursors())
+
+    def test_unchecked_symbols(self):
+        fetch = FakeTrades({ 'A' : 1, 'B' : 0, 'C' : 0 }, failing=['C'])
+        self.ledger.sync(['A', 'B', 'C'], fetch)
+        # Symbols are checked even if they have no trades, unless syncing them failed
+        self.assertEqual(['C', 'D'], self.ledger.get_unchecked_symbols(['A', 'B', 'C', 'D']))
+
+    def test_stale_checks(self):
+        storage = Storage(':memory:')
+        ledger = TradeLedger(storage, 'test')
+        storage.save_trade_check('test', 'A', time.time() - TradeLedger.RECHECK_INTERVAL - 1)
+        storage.save_trade_check('test', 'B', time.time())
+        self.assertEqual(['A'], ledger.get_unchecked_symbols(['A', 'B']))
+
+    def test_throttled_background_sync(self):
+        fetch = FakeTrades({ 'A' : 1 })
+        self.ledger.sync(['A'], fetch)
+        # The last sync was too recent
+        self.assertFalse(self.ledger.sync_in_background(lambda: ['A'], fetch))
+        self.assertEqual([('A', 0)], fetch.requests)
+
+    def test_background_sync(self):
+        self.ledger = TradeLedger(Storage(':memory:'), 'test', min_sync_interval=0)
+        release = threading.Event()
+        fetch = FakeTrades({ 'A' : 1 }, release=release)
+        self.assertTrue(self.ledger.sync_in_background(lambda: ['A'], fetch))
+        # Only one sync at a time
+        self.assertFalse(self.ledger.sync_in_background(lambda: ['A'], fetch))
+        release.set()
+        self.ledger.wait_for_background_sync()
+        self.assertEqual(1, len(self.ledger.get_trades()))
+        self.assertTrue(self.ledger.sync_in_background(lambda: ['A'], fetch))
+        self.ledger.wait_for_background_sync()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import threading
+from ces.storage import Storage
+from ces.models import Currency, Wallet, TransferType
+from ces.exchanges.base_exchange_wrapper import BaseExchangeWrapper
+from ces.exchanges.transfer_ledger import TransferLedger
+
+# Every currency gets one transfer per timestamp in the given list
+# If concurrent_requests is set, requests fail unless that many of them are running at the
+# same time
+class FakeWrapper(BaseExchangeWrapper):
+    def __init__(self, transfer_times, needs_asset=False, concurrent_requests=None):
+        BaseExchangeWrapper.__init__(self)
+        self.transfer_times = transfer_times
+        self.needs_asset = needs_asset
+        self.concurrent_requests = concurrent_requests
+        self.all_started = threading.Event()
+        self.balances = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        for code in transfer_times.keys():
+            self.add_currency(Currency(code, code, 0, 0))
+
+    def get_wallets(self):
+        return [
+            Wallet(self._currencies[code], balance, balance, 0)
+            for code, balance in self.balances.items()
+        ]
+
+    def _transfer_needs_asset(self):
+        return self.needs_asset
+
+    def _fetch_transfers(self, transfer_type, currency_code, since=None):
+        with self._lock:
+            self.requests.append((transfer_type, currency_code, since))
+            if len(self.requests) == self.concurrent_requests:
+                self.all_started.set()
+        if self.concurrent_requests is not None and not self.all_started.wait(5):
+            raise Exception('Currencies synced sequentially')
+        if currency_code is None:
+            currency_codes = self.transfer_times.keys()
+        else:
+            currency_codes = [currency_code]
+        output = []
+        for code in currency_codes:
+            for timestamp in self.transfer_times[code]:
+                if since is None or timestamp >= since:
+                    transfer_id = '{0}-{1}-{2}'.format(transfer_type.name, code, timestamp)
+                    output.append((transfer_id, code, 1.5, 'tx', 1, 0, False, timestamp))
+        return output
+
+class TestTransferLedger(unittest.TestCase):
+    def make_wrapper(self, transfer_times, needs_asset=False, concurrent_requests=None):
+        wrapper = FakeWrapper(transfer_times, needs_asset, concurrent_requests)
+        wrapper.set_transfer_ledger(TransferLedger(Storage(':memory:'), 'test'))
+        return wrapper
+
+    def test_incremental_sync(self):
+        day = TransferLedger.RESYNC_SECONDS
+        wrapper = self.make_wrapper({ 'BTC' : [day * 10, day * 20], 'ETH' : [day * 15] })
+        self.assertEqual(3, len(wrapper.get_deposit_history()))
+        wrapper.transfer_times['ETH'].append(day * 30)
+        deposits = wrapper.get_deposit_history()
+        self.assertEqual([1.5] * 4, map(lambda i: i.amount, deposits))
+        self.assertEqual(
+            [(TransferType.deposit, None, None), (TransferType.deposit, None, day * 19)],
+            wrapper.requests
+        )
+        # Withdrawals are kept apart
+        self.assertEqual(4, len(wrapper.get_withdrawal_history()))
+        self.assertEqual((TransferType.withdrawal, None, None), wrapper.requests[-1])
+        self.assertEqual(2, len(wrapper.get_deposit_history('ETH')))
+
+    def test_fan_out_over_held_currencies(self):
+        wrapper = self.make_wrapper(
+            { 'BTC' : [100], 'ETH' : [200], 'XLM' : [300] },
+            needs_asset=True,
+            concurrent_requests=2
+        )
+        self.assertFalse(wrapper.transfers_needs_asset())
+        wrapper.balances = { 'BTC' : 1, 'ETH' : 2, 'XLM' : 0 }
+        # Both currencies are synced at the same time
+        deposits = wrapper.get_deposit_history()
+        self.assertEqual({}, wrapper.get_transfer_sync_errors(TransferType.deposit))
+        self.assertEqual(['BTC', 'ETH'], map(lambda i: i.currency.code, deposits))
+
+        # Currencies already in the ledger are still synced after they're spent
+        wrapper.concurrent_requests = None
+        wrapper.balances = {}
+        wrapper.requests = []
+        wrapper.get_deposit_history()
+        self.assertEqual(['BTC', 'ETH'], sorted(map(lambda i: i[1], wrapper.requests)))
+
+    def test_without_ledger(self):
+        wrapper = FakeWrapper({ 'BTC' : [200, 100] }, needs_asset=True)
+        self.assertTrue(wrapper.transfers_needs_asset())
+        deposits = wrapper.get_deposit_history('BTC')
+        self.assertEqual([(TransferType.deposit, 'BTC', None)], wrapper.requests)
+        self.assertEqual(2, len(deposits))
+        self.assertTrue(deposits[0].timestamp < deposits[1].timestamp)
+
+    def test_errors(self):
+        wrapper = self.make_wrapper({ 'BTC' : [100] }, needs_asset=True)
+        wrapper.balances = { 'BTC' : 1, 'ETH' : 1 }
+        wrapper.add_currency(Currency('ETH', 'ETH', 0, 0))
+        errors = wrapper.sync_transfers(TransferType.deposit)
+        self.assertEqual(['ETH'], errors.keys())
+        # The currencies that did sync are still listed
+        self.assertEqual(['BTC'], map(lambda i: i.currency.code, wrapper.get_deposit_history()))
+        errors = wrapper.get_transfer_sync_errors(TransferType.deposit)
+        self.assertEqual(['ETH'], errors.keys())
+        self.assertTrue(isinstance(errors['ETH'], KeyError))
+        self.assertEqual(1, len(wrapper.get_deposit_history('BTC')))
+        self.assertEqual({}, wrapper.get_transfer_sync_errors(TransferType.deposit))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import threading
+import requests
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from ces.transport import Transport
+
+class CountingHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = []
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        CountingHandler.connections.append(self.client_address)
+
+    def _respond(self, body):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        return body
+
+    def do_GET(self):
+        self.wfile.write(self._respond('{"path": "' + self.path + '"}'))
+
+    def do_HEAD(self):
+        self._respond('')
+
+    def log_message(self, *args):
+        pass
+
+class ThreadedServer(HTTPServer):
+    def process_request(self, request, client_address):
+        thread = threading.Thread(
+            target=self._handle,
+            args=(request, client_address)
+        )
+        thread.daemon = True
+        thread.start()
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+class TestTransport(unittest.TestCase):
+    def setUp(self):
+        CountingHandler.connections = []
+        self.server = ThreadedServer(('127.0.0.1', 0), CountingHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{0}'.format(self.server.server_address[1])
+        self.transport = Transport()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        self.assertEqual({ 'path' : '/a' }, self.transport.get_json(self.url + '/a'))
+        self.assertEqual({ 'path' : '/b' }, self.transport.get_json(self.url + '/b'))
+        self.assertEqual(1, len(CountingHandler.connections))
+
+    def test_attached_session_shares_pool(self):
+        self.transport.warm(self.url + '/some/path')
+        session = requests.session()
+        self.transport.attach(session)
+        self.assertEqual({ 'path' : '/a' }, session.get(self.url + '/a').json())
+        self.assertEqual(1, len(CountingHandler.connections))
+
+    def test_warm_is_throttled(self):
+        self.transport.warm(self.url)
+        self.transport.warm_in_background(self.url).join()
+        self.assertEqual(1, len(CountingHandler.connections))
+
+if __name__ == "__main__":
+    unittest.main()
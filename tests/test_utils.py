@@ -139,3 +139,10 @@ class TestUtils(unittest.TestCase):
             InvalidAmountException,
             lambda: utils.OrderAmount('-1').compute_sell_units(wallet)
         )
+
+    def test_format_age(self):
+        self.assertEqual('0s', utils.format_age(0.4))
+        self.assertEqual('59s', utils.format_age(59))
+        self.assertEqual('5m', utils.format_age(330))
+        self.assertEqual('2h', utils.format_age(60 * 60 * 2 + 1))
+        self.assertEqual('3d', utils.format_age(60 * 60 * 24 * 3))
@@ -0,0 +1,94 @@
+import socket
+import threading
+import base64
+import hashlib
+import struct
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+# A local websocket server that sends the same recorded text frames to every client
+# that connects and then keeps the connection open
+class WebSocketStandIn:
+    def __init__(self, frames):
+        self.frames = frames
+        self.paths = []
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(('127.0.0.1', 0))
+        self._socket.listen(5)
+        self._clients = []
+        self._running = True
+        self.url = 'ws://127.0.0.1:{0}/'.format(self._socket.getsockname()[1])
+        self._thread = threading.Thread(target=self._accept)
+        self._thread.daemon = True
+        self._thread.start()
+
+    @staticmethod
+    def load_frames(path):
+        return filter(lambda i: len(i) > 0, open(path).read().split('\n'))
+
+    def _read_request(self, client):
+        data = ''
+        while '\r\n\r\n' not in data:
+            chunk = client.recv(4096)
+            if not chunk:
+                return None
+            data += chunk
+        lines = data.split('\r\n')
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+        return lines[0].split(' ')[1], headers
+
+    def _make_frame(self, payload):
+        if len(payload) < 126:
+            header = struct.pack('!BB', 0x81, len(payload))
+        else:
+            header = struct.pack('!BBH', 0x81, 126, len(payload))
+        return header + payload
+
+    def _accept(self):
+        while self._running:
+            try:
+                client, _ = self._socket.accept()
+            except socket.error:
+                return
+            self._clients.append(client)
+            thread = threading.Thread(target=self._serve, args=(client,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, client):
+        try:
+            request = self._read_request(client)
+            if request is None:
+                return
+            path, headers = request
+            self.paths.append(path)
+            accept = base64.b64encode(
+                hashlib.sha1(headers['sec-websocket-key'] + WEBSOCKET_GUID).digest()
+            )
+            client.sendall(
+                'HTTP/1.1 101 Switching Protocols\r\n'
+                'Upgrade: websocket\r\n'
+                'Connection: Upgrade\r\n'
+                'Sec-WebSocket-Accept: {0}\r\n\r\n'.format(accept)
+            )
+            for frame in self.frames:
+                client.sendall(self._make_frame(frame))
+            # Ignore whatever the client sends until it goes away
+            while client.recv(4096):
+                pass
+        except socket.error:
+            pass
+
+    def close(self):
+        self._running = False
+        self._socket.close()
+        for client in self._clients:
+            try:
+                client.close()
+            except socket.error:
+                pass